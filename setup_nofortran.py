@@ -8,7 +8,8 @@ if __name__ == '__main__':
   setup(
      name='SlipPy',
      packages=['slippy'],
-     scripts=['exec/slippy','exec/plot_slippy'],
+     scripts=['exec/slippy','exec/plot_slippy','exec/slippy_convert',
+              'exec/slippy_bench_kernel'],
      version='0.1.0',
      description='module for inverting coseismic slip from GPS and InSAR data',
      author='Trever Hines',
@@ -1,8 +1,14 @@
 import numpy as np
-try:
-  from mpl_toolkits.basemap import Basemap
-except ImportError as error:
-  print("It appears you cannot import Basemap on your computer (a depricated library). \nYou may have trouble plotting with Basemap. \nTry plotting with GMT instead. ")
+
+def _import_basemap():
+  # Basemap is slow to import, so it is only imported when a basemap 
+  # is created
+  try:
+    from mpl_toolkits.basemap import Basemap
+  except ImportError as error:
+    raise ImportError("It appears you cannot import Basemap on your computer (a depricated library). \nTry plotting with GMT instead. ")
+
+  return Basemap
 
 def geodetic_to_cartesian(pos_geo,basemap):
   ''' 
@@ -56,6 +62,7 @@ def create_default_basemap(lon_lst,lat_lst,**kwargs):
   creates a basemap that bounds lat_lst and lon_lst
   '''
   print("Creating basemap for plotting with basemap")
+  Basemap = _import_basemap()
   if (len(lon_lst) == 0) | (len(lat_lst) == 0):
     return Basemap(projection='tmerc',
                    lon_0 = -90.0,
@@ -8,6 +8,7 @@ from libc.math cimport log
 from libc.math cimport fabs
 from libc.math cimport atan
 from libc.stdlib cimport malloc, free
+from libc.string cimport memset
 
 DEF TOL = 1e-8
 
@@ -16,33 +17,37 @@ cdef struct vector:
   double y
   double z
 
-# internal function for Okada92
+# quantities from Okada 1992 which only depend on the position relative
+# to one corner of the dislocation. They are shared by every term,
+# slip direction, and output type
+cdef struct corner:
+  double eps,eta,zeta,q,R,y_bar,d_bar,c_bar,theta,logReps,logReta
+  double X11,X32,X53,Y11,Y32,Y53,I1,I2,I3,I4,Y0,Z32,Z0,D11
+  double J1,J2,J3,J4,J5,J6,K1,K2,K3,K4
+  double E,F,G,H,P,Q,Ep,Fp,Gp,Hp,Pp,Qp
+
+# computes the quantities in corner. The quantities which are only 
+# used by the displacement gradients are computed if gradients is True
 @wraparound(False)
 @boundscheck(False)
 @cdivision(True)
-cdef vector _f(double eps,
-               double eta,
-               double zeta,
-               double delta,
-               double alpha,
-               double c,
-               double y,
-               unsigned int output,
-               unsigned int term,
-               unsigned int direction) nogil:
+cdef void _corner(corner* out,
+                  double eps,
+                  double eta,
+                  double zeta,
+                  double sindel,
+                  double cosdel,
+                  double c,
+                  double y,
+                  bint gradients) noexcept nogil:
   cdef:
-    vector out
-    double sindel = sin(delta)
-    double cosdel = cos(delta)
     double X=0,R=0,y_bar=0,c_bar=0,d_bar=0,X11=0,X32=0,\
            X53=0,Y11=0,Y32=0,Y53=0,h=0,theta=0,logReps=0,\
            logReta=0,I1=0,I2=0,I3=0,I4=0,K1=0,K2=0,K3=0,K4=0,\
-           D11=0,J1=0,J2=0,J3=0,J4=0,J5=0,J6=0,E=0,F=0,G=0,H=0,P=0,\
-           Q=0,Ep=0,Fp=0,Gp=0,Hp=0,Pp=0,Qp=0,d=0,p=0,q=0,f1=0,f2=0,\
-           f3 = 0
-    
+           D11=0,J1=0,J2=0,J3=0,J4=0,J5=0,J6=0,d=0,q=0,\
+           Y0=0,Z32=0,Z53=0,Z0=0
+
   d = c - zeta
-  p = y*cosdel + d*sindel
   q = y*sindel - d*cosdel
   R = sqrt(eps**2 + eta**2 + q**2)
 
@@ -60,7 +65,8 @@ cdef vector _f(double eps,
   else:
     X11 = 1.0/(R*(R + eps))
     X32 = (2*R + eps)/(R**3*(R + eps)**2)
-    X53 = (8*R**2 + 9*R*eps + 3*eps**2)/(R**5*(R + eps)**3)
+    if gradients:
+      X53 = (8*R**2 + 9*R*eps + 3*eps**2)/(R**5*(R + eps)**3)
     logReps = log(R + eps) 
 
   if fabs(R + eta) < TOL:
@@ -68,7 +74,8 @@ cdef vector _f(double eps,
   else:
     Y11 = 1.0/(R*(R + eta))
     Y32 = (2*R + eta)/(R**3*(R + eta)**2)
-    Y53 = (8*R**2 + 9*R*eta + 3*eta**2)/(R**5*((R + eta)**3))
+    if gradients:
+      Y53 = (8*R**2 + 9*R*eta + 3*eta**2)/(R**5*((R + eta)**3))
     logReta = log(R + eta)
 
   if fabs(cosdel) >= TOL:
@@ -88,8 +95,32 @@ cdef vector _f(double eps,
 
   I2 = log(R + d_bar) + I3*sindel
   I1 = -eps/(R + d_bar)*cosdel - I4*sindel
-  Y0 = Y11 - eps**2*Y32
   Z32 = sindel/R**3 - h*Y32
+
+  out.eps = eps
+  out.eta = eta
+  out.zeta = zeta
+  out.q = q
+  out.R = R
+  out.y_bar = y_bar
+  out.d_bar = d_bar
+  out.c_bar = c_bar
+  out.theta = theta
+  out.logReps = logReps
+  out.logReta = logReta
+  out.X11 = X11
+  out.X32 = X32
+  out.Y11 = Y11
+  out.Y32 = Y32
+  out.I1 = I1
+  out.I2 = I2
+  out.I3 = I3
+  out.I4 = I4
+  out.Z32 = Z32
+  if not gradients:
+    return
+
+  Y0 = Y11 - eps**2*Y32
   Z53 = 3*sindel/R**5 - h*Y53
   Z0 = Z32 - eps**2*Z53
 
@@ -115,19 +146,59 @@ cdef vector _f(double eps,
   K2 = 1.0/R + K3*sindel
   J4 = -eps*Y11 - J2*cosdel + J3*sindel
   J1 = J5*cosdel - J6*sindel
-  E = sindel/R - y_bar*q/R**3
-  F = d_bar/R**3 + eps**2*Y32*sindel
-  G = 2.0*X11*sindel - y_bar*q*X32
-  H = d_bar*q*X32 + eps*q*Y32*sindel
-  P = cosdel/R**3 + q*Y32*sindel
-  Q = 3*c_bar*d_bar/R**5 - (zeta*Y32 + Z32 + Z0)*sindel
-  Ep = cosdel/R + d_bar*q/R**3
-  Fp = y_bar/R**3 + eps**2*Y32*cosdel
-  Gp = 2.0*X11*cosdel + d_bar*q*X32
-  Hp = y_bar*q*X32 + eps*q*Y32*cosdel
-  Pp = sindel/R**3 - q*Y32*cosdel
-  Qp = (3*c_bar*y_bar/R**5 + 
-       q*Y32 - (zeta*Y32 + Z32 + Z0)*cosdel)
+  out.X53 = X53
+  out.Y53 = Y53
+  out.Y0 = Y0
+  out.Z0 = Z0
+  out.D11 = D11
+  out.J1 = J1
+  out.J2 = J2
+  out.J3 = J3
+  out.J4 = J4
+  out.J5 = J5
+  out.J6 = J6
+  out.K1 = K1
+  out.K2 = K2
+  out.K3 = K3
+  out.K4 = K4
+  out.E = sindel/R - y_bar*q/R**3
+  out.F = d_bar/R**3 + eps**2*Y32*sindel
+  out.G = 2.0*X11*sindel - y_bar*q*X32
+  out.H = d_bar*q*X32 + eps*q*Y32*sindel
+  out.P = cosdel/R**3 + q*Y32*sindel
+  out.Q = 3*c_bar*d_bar/R**5 - (zeta*Y32 + Z32 + Z0)*sindel
+  out.Ep = cosdel/R + d_bar*q/R**3
+  out.Fp = y_bar/R**3 + eps**2*Y32*cosdel
+  out.Gp = 2.0*X11*cosdel + d_bar*q*X32
+  out.Hp = y_bar*q*X32 + eps*q*Y32*cosdel
+  out.Pp = sindel/R**3 - q*Y32*cosdel
+  out.Qp = (3*c_bar*y_bar/R**5 + 
+            q*Y32 - (zeta*Y32 + Z32 + Z0)*cosdel)
+  return
+
+
+# evaluates one term of Okada 1992 from the quantities for one corner
+@wraparound(False)
+@boundscheck(False)
+@cdivision(True)
+cdef inline vector _f(corner* s,
+                      double alpha,
+                      double sindel,
+                      double cosdel,
+                      unsigned int output,
+                      unsigned int term,
+                      unsigned int direction) noexcept nogil:
+  cdef:
+    vector out
+    double eps=s.eps,eta=s.eta,zeta=s.zeta,q=s.q,R=s.R,\
+           y_bar=s.y_bar,d_bar=s.d_bar,c_bar=s.c_bar,theta=s.theta,\
+           logReps=s.logReps,logReta=s.logReta,X11=s.X11,X32=s.X32,\
+           X53=s.X53,Y11=s.Y11,Y32=s.Y32,I1=s.I1,I2=s.I2,I3=s.I3,\
+           I4=s.I4,Y0=s.Y0,Z32=s.Z32,Z0=s.Z0,D11=s.D11,J1=s.J1,\
+           J2=s.J2,J3=s.J3,J4=s.J4,J5=s.J5,J6=s.J6,K1=s.K1,K2=s.K2,\
+           K3=s.K3,K4=s.K4,E=s.E,F=s.F,G=s.G,H=s.H,P=s.P,Q=s.Q,\
+           Ep=s.Ep,Fp=s.Fp,Gp=s.Gp,Hp=s.Hp,Pp=s.Pp,Qp=s.Qp,\
+           f1=0,f2=0,f3=0
 
   if output == 0:
     if direction == 0:
@@ -405,39 +476,47 @@ cdef vector _f(double eps,
   return out
   
 
+# evaluates Okada 1992 for one observation point. The quantities for 
+# each corner of the dislocation and its image are computed once and 
+# then used for every slip direction, term, and output type. The 
+# displacements are written to out[0:3] and, if gradients is True, 
+# the x, y, and z derivatives of the displacements are written to 
+# out[3:6], out[6:9], and out[9:12]. If unit is True then U is 
+# ignored and the solution for unit slip in slip direction i is 
+# written to out[12*i:12*i + 12]
 @wraparound(False)
 @boundscheck(False)
 @cdivision(True)
-cdef vector _dc3d_k(double alpha,
-                    vector pos, 
-                    double c,
-                    double delta,
-                    double[:] strike_width,
-                    double[:] dip_width,
-                    double[:] U,
-                    unsigned int out_type):
+cdef void _dc3d_k(double alpha,
+                  vector pos, 
+                  double c,
+                  double sindel,
+                  double cosdel,
+                  double[:] strike_width,
+                  double[:] dip_width,
+                  double[:] U,
+                  bint gradients,
+                  bint unit,
+                  double* out) noexcept nogil:
   cdef:
-    vector out
-    vector fI,fII,fIII,fIV
-    unsigned int itr
+    corner s
+    vector f
+    unsigned int itr,k,o,t,Nout
     double x = pos.x
     double y = pos.y
     double z = pos.z
-    double L,W
-    double ux=0,uy=0,uz=0
+    double L,W,sign,eps,eta,zeta,pp
+    double ux=0,uy=0,uz=0,Ui
     double pi = 3.141592653589793
-    double sindel,cosdel
-    double p,p_,\
-           uA1,uA2,uA3,\
-           uhatA1,uhatA2,uhatA3,\
-           uB1,uB2,uB3,\
-           uC1,uC2,uC3,\
-           uD1,uD2,uD3
-
-  delta *= pi/180
-  sindel = sin(delta)
-  cosdel = cos(delta)
-  
+    double p,p_
+    # sums over the corners for each output type, slip direction, and 
+    # term, where the terms are A, B, C, D, and the image A
+    double u[4][3][5][3]
+
+  Nout = 4 if gradients else 1
+  # the gradient quantities in s are not computed when they are not 
+  # needed, but they are still read by _f
+  memset(&s,0,sizeof(corner))
   # convert the strike_width, and dip_width to L and W
   L = strike_width[1] - strike_width[0]
   W = dip_width[1] - dip_width[0]
@@ -447,67 +526,99 @@ cdef vector _dc3d_k(double alpha,
   # find the new depth of the bottom left corner
   c -= dip_width[0]*sindel
 
-  # iterate over slip directions
-  for itr in range(3):
-    p  = y*cosdel + (c - z)*sindel
-    p_ = y*cosdel + (c + z)*sindel 
-
-    fI = _f(x,p,z,delta,alpha,c,y,out_type,0,itr)     
-    fII = _f(x,p - W,z,delta,alpha,c,y,out_type,0,itr)
-    fIII = _f(x-L,p,z,delta,alpha,c,y,out_type,0,itr)
-    fIV = _f(x-L,p - W,z,delta,alpha,c,y,out_type,0,itr)
-    uA1 = fI.x - fII.x - fIII.x + fIV.x  
-    uA2 = fI.y - fII.y - fIII.y + fIV.y  
-    uA3 = fI.z - fII.z - fIII.z + fIV.z  
-  
-    fI = _f(x,p_,-z,delta,alpha,c,y,out_type,0,itr)
-    fII = _f(x,p_ - W,-z,delta,alpha,c,y,out_type,0,itr)
-    fIII = _f(x-L,p_,-z,delta,alpha,c,y,out_type,0,itr)
-    fIV = _f(x-L,p_ - W,-z,delta,alpha,c,y,out_type,0,itr)
-    uhatA1 = fI.x - fII.x - fIII.x + fIV.x  
-    uhatA2 = fI.y - fII.y - fIII.y + fIV.y  
-    uhatA3 = fI.z - fII.z - fIII.z + fIV.z  
-  
-    fI = _f(x,p,z,delta,alpha,c,y,out_type,1,itr)
-    fII = _f(x,p - W,z,delta,alpha,c,y,out_type,1,itr)
-    fIII = _f(x-L,p,z,delta,alpha,c,y,out_type,1,itr)
-    fIV = _f(x-L,p - W,z,delta,alpha,c,y,out_type,1,itr)
-    uB1 = fI.x - fII.x - fIII.x + fIV.x  
-    uB2 = fI.y - fII.y - fIII.y + fIV.y  
-    uB3 = fI.z - fII.z - fIII.z + fIV.z  
-  
-    fI = _f(x,p,z,delta,alpha,c,y,out_type,2,itr)
-    fII = _f(x,p - W,z,delta,alpha,c,y,out_type,2,itr)
-    fIII = _f(x-L,p,z,delta,alpha,c,y,out_type,2,itr)
-    fIV = _f(x-L,p - W,z,delta,alpha,c,y,out_type,2,itr)
-    uC1 = fI.x - fII.x - fIII.x + fIV.x  
-    uC2 = fI.y - fII.y - fIII.y + fIV.y  
-    uC3 = fI.z - fII.z - fIII.z + fIV.z  
-  
-    if out_type == 3:
-      fI = _f(x,p,z,delta,alpha,c,y,out_type,3,itr)
-      fII = _f(x,p - W,z,delta,alpha,c,y,out_type,3,itr)
-      fIII = _f(x-L,p,z,delta,alpha,c,y,out_type,3,itr)
-      fIV = _f(x-L,p - W,z,delta,alpha,c,y,out_type,3,itr)
-      uD1 = fI.x - fII.x - fIII.x + fIV.x  
-      uD2 = fI.y - fII.y - fIII.y + fIV.y  
-      uD3 = fI.z - fII.z - fIII.z + fIV.z  
-      ux += U[itr]/(2*pi)*(uA1 + uhatA1 + uB1 + uD1 + z*uC1)
-      uy += (U[itr]/(2*pi)*((uA2 + uhatA2 + uB2 + uD2 + z*uC2)*cosdel - 
-             (uA3 + uhatA3 + uB3 + uD3 + z*uC3)*sindel))
-      uz += (U[itr]/(2*pi)*((uA2 + uhatA2 + uB2 - uD2 - z*uC2)*sindel + 
-             (uA3 + uhatA3 + uB3 - uD3 - z*uC3)*cosdel))
+  p  = y*cosdel + (c - z)*sindel
+  p_ = y*cosdel + (c + z)*sindel 
+
+  # the corners are summed with the signs +, -, -, +
+  for k in range(8):
+    sign = 1.0 if (k % 4 == 0) or (k % 4 == 3) else -1.0
+    eps = x if (k % 4 < 2) else x - L
+    if k < 4:
+      zeta = z
+      pp = p
     else:
-      ux += U[itr]/(2*pi)*(uA1 - uhatA1 + uB1 + z*uC1)
-      uy += (U[itr]/(2*pi)*((uA2 - uhatA2 + uB2 + z*uC2)*cosdel - 
-             (uA3 - uhatA3 + uB3 + z*uC3)*sindel))
-      uz += (U[itr]/(2*pi)*((uA2 - uhatA2 + uB2 - z*uC2)*sindel + 
-             (uA3 - uhatA3 + uB3 - z*uC3)*cosdel))
-
-  out.x = ux
-  out.y = uy
-  out.z = uz
-  return out
+      zeta = -z
+      pp = p_
+
+    eta = pp if (k % 2 == 0) else pp - W
+    _corner(&s,eps,eta,zeta,sindel,cosdel,c,y,gradients)
+    for o in range(Nout):
+      for itr in range(3):
+        # slip directions which do not contribute are skipped
+        if (not unit) and (U[itr] == 0.0):
+          continue
+
+        for t in range(5):
+          if (k < 4) and (t == 4):
+            continue
+          if (k >= 4) and (t != 4):
+            continue
+          if (t == 3) and (o != 3):
+            continue
+
+          f = _f(&s,alpha,sindel,cosdel,o,t if t < 4 else 0,itr)
+          if (k == 0) or (k == 4):
+            u[o][itr][t][0] = f.x
+            u[o][itr][t][1] = f.y
+            u[o][itr][t][2] = f.z
+          elif sign > 0.0:
+            u[o][itr][t][0] = u[o][itr][t][0] + f.x
+            u[o][itr][t][1] = u[o][itr][t][1] + f.y
+            u[o][itr][t][2] = u[o][itr][t][2] + f.z
+          else:
+            u[o][itr][t][0] = u[o][itr][t][0] - f.x
+            u[o][itr][t][1] = u[o][itr][t][1] - f.y
+            u[o][itr][t][2] = u[o][itr][t][2] - f.z
+
+  for o in range(Nout):
+    ux = 0.0
+    uy = 0.0
+    uz = 0.0
+    for itr in range(3):
+      if unit:
+        Ui = 1.0
+        ux = 0.0
+        uy = 0.0
+        uz = 0.0
+      elif U[itr] == 0.0:
+        continue
+      else:
+        Ui = U[itr]
+
+      if o == 3:
+        ux += Ui/(2*pi)*(u[o][itr][0][0] + u[o][itr][4][0] + 
+              u[o][itr][1][0] + u[o][itr][3][0] + z*u[o][itr][2][0])
+        uy += (Ui/(2*pi)*((u[o][itr][0][1] + u[o][itr][4][1] + 
+               u[o][itr][1][1] + u[o][itr][3][1] + z*u[o][itr][2][1])*cosdel - 
+               (u[o][itr][0][2] + u[o][itr][4][2] + u[o][itr][1][2] + 
+               u[o][itr][3][2] + z*u[o][itr][2][2])*sindel))
+        uz += (Ui/(2*pi)*((u[o][itr][0][1] + u[o][itr][4][1] + 
+               u[o][itr][1][1] - u[o][itr][3][1] - z*u[o][itr][2][1])*sindel + 
+               (u[o][itr][0][2] + u[o][itr][4][2] + u[o][itr][1][2] - 
+               u[o][itr][3][2] - z*u[o][itr][2][2])*cosdel))
+      else:
+        ux += Ui/(2*pi)*(u[o][itr][0][0] - u[o][itr][4][0] + 
+              u[o][itr][1][0] + z*u[o][itr][2][0])
+        uy += (Ui/(2*pi)*((u[o][itr][0][1] - u[o][itr][4][1] + 
+               u[o][itr][1][1] + z*u[o][itr][2][1])*cosdel - 
+               (u[o][itr][0][2] - u[o][itr][4][2] + u[o][itr][1][2] + 
+               z*u[o][itr][2][2])*sindel))
+        uz += (Ui/(2*pi)*((u[o][itr][0][1] - u[o][itr][4][1] + 
+               u[o][itr][1][1] - z*u[o][itr][2][1])*sindel + 
+               (u[o][itr][0][2] - u[o][itr][4][2] + u[o][itr][1][2] - 
+               z*u[o][itr][2][2])*cosdel))
+
+      if unit:
+        out[12*itr + 3*o] = ux
+        out[12*itr + 3*o + 1] = uy
+        out[12*itr + 3*o + 2] = uz
+
+    if not unit:
+      out[3*o] = ux
+      out[3*o + 1] = uy
+      out[3*o + 2] = uz
+
+  return
 
 
 @wraparound(False)
@@ -519,35 +630,175 @@ cpdef tuple dc3d(double alpha,
                  double delta,
                  double[:] strike_width,
                  double[:] dip_width,
-                 double[:] U):
+                 double[:] U,
+                 bint want_gradients=True):
   cdef: 
-    vector vec_in,vec_out
+    vector vec_in
+    double out[12]
+    double pi = 3.141592653589793
+    double sindel,cosdel
     double[:] out_disp = np.empty((3))
-    double[:,:] out_derr = np.empty((3,3))
+    double[:,:] out_derr
   
   vec_in.x = pos[0]    
   vec_in.y = pos[1]   
   vec_in.z = pos[2]    
 
-  vec_out = _dc3d_k(alpha,vec_in,c,delta,strike_width,dip_width,U,0)
-  out_disp[0] = vec_out.x
-  out_disp[1] = vec_out.y
-  out_disp[2] = vec_out.z
-
-  vec_out = _dc3d_k(alpha,vec_in,c,delta,strike_width,dip_width,U,1)
-  out_derr[0,0] = vec_out.x
-  out_derr[0,1] = vec_out.y
-  out_derr[0,2] = vec_out.z
-
-  vec_out = _dc3d_k(alpha,vec_in,c,delta,strike_width,dip_width,U,2)
-  out_derr[1,0] = vec_out.x
-  out_derr[1,1] = vec_out.y
-  out_derr[1,2] = vec_out.z
-
-  vec_out = _dc3d_k(alpha,vec_in,c,delta,strike_width,dip_width,U,3)
-  out_derr[2,0] = vec_out.x
-  out_derr[2,1] = vec_out.y
-  out_derr[2,2] = vec_out.z
-  
+  delta *= pi/180
+  sindel = sin(delta)
+  cosdel = cos(delta)
+  # the displacement gradients take three quarters of the work
+  _dc3d_k(alpha,vec_in,c,sindel,cosdel,strike_width,dip_width,U,
+          want_gradients,False,out)
+  out_disp[0] = out[0]
+  out_disp[1] = out[1]
+  out_disp[2] = out[2]
+  if not want_gradients:
+    return 0,np.asarray(out_disp),None
+
+  out_derr = np.empty((3,3))
+  out_derr[0,0] = out[3]
+  out_derr[0,1] = out[4]
+  out_derr[0,2] = out[5]
+  out_derr[1,0] = out[6]
+  out_derr[1,1] = out[7]
+  out_derr[1,2] = out[8]
+  out_derr[2,0] = out[9]
+  out_derr[2,1] = out[10]
+  out_derr[2,2] = out[11]
   return 0,np.asarray(out_disp),np.asarray(out_derr)
-  
+
+
+@wraparound(False)
+@boundscheck(False)
+@cdivision(True)
+cpdef int dc3d_batch(double alpha,
+                     double[:,:] pos,
+                     double c,
+                     double delta,
+                     double[:] strike_width,
+                     double[:] dip_width,
+                     double[:] U,
+                     double[:,:] out_disp,
+                     double[:,:,:] out_derr=None):
+  ''' 
+  evaluates dc3d for every observation point in pos and writes the 
+  results into the preallocated output buffers.
+
+  Parameters
+  ----------
+    pos : (N,3) array
+      observation points
+
+    out_disp : (N,3) array
+      displacements are written here
+
+    out_derr : (N,3,3) array, optional
+      displacement gradients are written here, where the second axis 
+      is the displacement direction and the third axis is the 
+      derivative direction. The gradients are not computed if this is 
+      not given
+
+  Returns
+  -------
+    status : int
+      always 0
+  '''
+  cdef:
+    vector vec_in
+    double out[12]
+    double pi = 3.141592653589793
+    double sindel,cosdel
+    Py_ssize_t i,j
+    Py_ssize_t N = pos.shape[0]
+    bint want_derr = out_derr is not None
+
+  if out_disp.shape[0] != N:
+    raise ValueError('out_disp must have the same length as pos')
+
+  if want_derr and (out_derr.shape[0] != N):
+    raise ValueError('out_derr must have the same length as pos')
+
+  # the dip is the same for every point
+  delta *= pi/180
+  sindel = sin(delta)
+  cosdel = cos(delta)
+  with nogil:
+    for i in range(N):
+      vec_in.x = pos[i,0]
+      vec_in.y = pos[i,1]
+      vec_in.z = pos[i,2]
+      _dc3d_k(alpha,vec_in,c,sindel,cosdel,strike_width,dip_width,U,
+              want_derr,False,out)
+      out_disp[i,0] = out[0]
+      out_disp[i,1] = out[1]
+      out_disp[i,2] = out[2]
+      if not want_derr:
+        continue
+
+      for j in range(3):
+        out_derr[i,0,j] = out[3*j + 3]
+        out_derr[i,1,j] = out[3*j + 4]
+        out_derr[i,2,j] = out[3*j + 5]
+
+  return 0
+
+
+@wraparound(False)
+@boundscheck(False)
+@cdivision(True)
+cpdef int dc3d_unit_batch(double alpha,
+                          double[:,:] pos,
+                          double c,
+                          double delta,
+                          double[:] strike_width,
+                          double[:] dip_width,
+                          double[:,:,:] out_disp):
+  ''' 
+  evaluates the displacements for unit slip in each of the three slip 
+  directions at every observation point in pos. This is faster than 
+  calling dc3d_batch for each slip direction because the quantities 
+  which only depend on the geometry are shared by the slip directions
+
+  Parameters
+  ----------
+    pos : (N,3) array
+      observation points
+
+    out_disp : (N,3,3) array
+      displacements are written here, where the second axis is the 
+      displacement direction and the third axis is the slip direction
+
+  Returns
+  -------
+    status : int
+      always 0
+  '''
+  cdef:
+    vector vec_in
+    double out[36]
+    double pi = 3.141592653589793
+    double sindel,cosdel
+    double[:] U = np.ones(3)
+    Py_ssize_t i,j
+    Py_ssize_t N = pos.shape[0]
+
+  if out_disp.shape[0] != N:
+    raise ValueError('out_disp must have the same length as pos')
+
+  delta *= pi/180
+  sindel = sin(delta)
+  cosdel = cos(delta)
+  with nogil:
+    for i in range(N):
+      vec_in.x = pos[i,0]
+      vec_in.y = pos[i,1]
+      vec_in.z = pos[i,2]
+      _dc3d_k(alpha,vec_in,c,sindel,cosdel,strike_width,dip_width,U,
+              False,True,out)
+      for j in range(3):
+        out_disp[i,0,j] = out[12*j]
+        out_disp[i,1,j] = out[12*j + 1]
+        out_disp[i,2,j] = out[12*j + 2]
+
+  return 0
@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+'''
+Data covariance for InSAR observations. InSAR errors are spatially
+correlated, mostly because of atmospheric delays, so the pixels are
+not independent. Given a data covariance C = L L^T, the InSAR rows of
+the system matrix and the data are whitened by multiplying them by
+L^-1. The least squares misfit of the whitened system is then the
+generalized misfit (Gm - d)^T C^-1 (Gm - d).
+
+The covariance is either supplied as an (N,N) .npy file or generated
+from the exponential covariogram
+
+  C_ij = sill*exp(-r_ij/length_scale) + delta_ij*sigma_i^2
+
+where r_ij is the distance between pixels i and j and sigma_i is the
+uncertainty of pixel i. The Cholesky factor is computed in place by
+LAPACK, so only one N by N array is ever held in memory. The factor
+can be cached on disk with the system matrices.
+'''
+import numpy as np
+import scipy.linalg
+import scipy.spatial.distance
+import hashlib
+import os
+import slippy.gbuild
+import slippy.gcache
+
+
+def exponential_covariance(pos,sigma,sill,length_scale):
+  '''
+  builds the covariance matrix for an exponential covariogram. The
+  matrix is filled in a block of rows at a time
+
+  Parameters
+  ----------
+    pos : (N,3) array
+      cartesian pixel positions
+
+    sigma : (N,) array
+      uncertainty of each pixel, which is added to the diagonal
+
+    sill : float
+      variance of the correlated noise [m^2]
+
+    length_scale : float
+      distance over which the correlation decays by a factor of e [m]
+
+  Returns
+  -------
+    C : (N,N) array
+
+  '''
+  pos = np.asarray(pos,dtype=float)
+  sigma = np.asarray(sigma,dtype=float)
+  N = len(pos)
+  C = np.empty((N,N))
+  for rows in slippy.gbuild.row_blocks(N,N):
+    block = scipy.spatial.distance.cdist(pos[rows],pos)
+    block *= -1.0/length_scale
+    np.exp(block,out=block)
+    block *= sill
+    C[rows] = block
+
+  C[np.diag_indices(N)] += sigma**2
+  return C
+
+
+def load_covariance(file_name,N):
+  '''
+  reads an (N,N) covariance matrix from a .npy file
+  '''
+  C = np.load(file_name)
+  if C.shape != (N,N):
+    raise ValueError(
+      'the covariance matrix in %s has shape %s but there are %d InSAR '
+      'observations' % (file_name,C.shape,N))
+
+  return np.ascontiguousarray(C,dtype=float)
+
+
+def cholesky(C):
+  '''
+  returns the lower triangular Cholesky factor of C. If C is a C
+  contiguous double precision array then it is overwritten by the
+  factor. LAPACK factors the matrix in blocks with the threads of the
+  BLAS library
+  '''
+  C = np.ascontiguousarray(C,dtype=float)
+  # C is symmetric, so its transpose is the same matrix in Fortran
+  # order, which LAPACK can factor without a copy
+  U = scipy.linalg.cholesky(C.T,lower=False,overwrite_a=True,
+                            check_finite=False)
+  return U.T
+
+
+def covariance_hash(pos,sigma,options):
+  '''
+  returns a hex digest which identifies the covariance described by
+  options for the given pixels. A supplied covariance file is
+  identified by its path, size, and modification time
+  '''
+  h = hashlib.sha1()
+  h.update(b'covariance\n')
+  file_name = options.get('file')
+  if file_name is not None:
+    stat = os.stat(file_name)
+    h.update(('%s %d %r\n' % (os.path.abspath(file_name),stat.st_size,
+                              stat.st_mtime)).encode())
+    h.update(('%d\n' % len(pos)).encode())
+  else:
+    h.update(('%r %r\n' % (float(options['sill']),
+                           float(options['length_scale']))).encode())
+    for a in (pos,sigma):
+      a = np.ascontiguousarray(a,dtype=float)
+      h.update(('%s\n' % (a.shape,)).encode())
+      h.update(a.tobytes())
+
+  return h.hexdigest()
+
+
+def insar_cholesky(pos,sigma,options,cache_dir=None,max_size=None):
+  '''
+  returns the Cholesky factor of the InSAR data covariance
+
+  Parameters
+  ----------
+    pos : (N,3) array
+      cartesian pixel positions
+
+    sigma : (N,) array
+
+    options : dict
+      either {"file":<.npy file>} for a supplied covariance or
+      {"sill":<float>,"length_scale":<float>} for an exponential
+      covariogram
+
+    cache_dir : str, optional
+      if given then the factor is loaded from, or saved to, this
+      directory
+
+    max_size : int, optional
+      maximum size of the cache in bytes
+
+  Returns
+  -------
+    L : (N,N) array
+
+    hit : bool
+      whether L was found in the cache
+
+  '''
+  if ('file' not in options) & (('sill' not in options) |
+                                ('length_scale' not in options)):
+    raise ValueError(
+      'the InSAR covariance needs either "file" or "sill" and '
+      '"length_scale"')
+
+  key = None
+  if cache_dir is not None:
+    key = 'chol_%s' % covariance_hash(pos,sigma,options)
+    L = slippy.gcache.load(key,cache_dir)
+    if L is not None:
+      return L,True
+
+  if 'file' in options:
+    C = load_covariance(options['file'],len(pos))
+  else:
+    C = exponential_covariance(pos,sigma,options['sill'],
+                               options['length_scale'])
+
+  L = cholesky(C)
+  del C
+  if key is not None:
+    slippy.gcache.save(L,key,cache_dir,max_size=max_size)
+
+  return L,False
+
+
+def whiten(L,G,d,rows):
+  '''
+  multiplies the rows of G and d indicated by rows by L^-1 in place.
+  G is whitened a block of columns at a time so that only one block
+  is copied, and the block is whitened in double precision
+
+  Parameters
+  ----------
+    L : (K,K) array
+      lower triangular Cholesky factor
+
+    G : (N,M) array
+
+    d : (N,) array
+
+    rows : slice
+      the K rows of G and d which are whitened
+
+  '''
+  K,M = G[rows].shape
+  d[rows] = scipy.linalg.solve_triangular(L,d[rows],lower=True,
+                                          check_finite=False)
+  for cols in slippy.gbuild.row_blocks(M,K):
+    block = np.array(G[rows,cols].T,dtype=float).T
+    block = scipy.linalg.solve_triangular(L,block,lower=True,
+                                          overwrite_b=True,
+                                          check_finite=False)
+    G[rows,cols] = block
+
+  return
+
+
+def unwhiten(L,x):
+  '''
+  returns L x, which undoes the whitening of x
+  '''
+  return L.dot(x)
@@ -1 +1 @@
-from okada_wrapper import dc3d0wrapper, dc3dwrapper
+from .okada_wrapper import dc3d0wrapper, dc3dwrapper
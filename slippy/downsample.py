@@ -0,0 +1,313 @@
+#!/usr/bin/env python
+'''
+Downsampling of InSAR data before the inversion. Nearby pixels in an
+interferogram are highly redundant, so the pixels are grouped into
+the cells of a quadtree and each cell is used as one observation. The
+quadtree is refined either where the displacements vary the most
+(Jonsson et al. 2002) or where the data resolution is the highest
+(Lohman and Simons 2005).
+'''
+import numpy as np
+import collections
+
+# pos, disp, sigma, and basis are the aggregated observations for
+# each cell. footprint contains xmin, xmax, ymin, and ymax for each
+# cell and count is the number of pixels in each cell. index maps
+# each pixel to its cell and it is -1 for pixels that are not used
+# because their displacement or uncertainty is not finite
+DownsampledData = collections.namedtuple('DownsampledData',
+                                         ['pos','disp','sigma','basis',
+                                          'footprint','count','index'])
+
+
+def _aggregate(pos,disp,sigma,basis,index,K):
+  '''
+  averages the pixels in each of the K cells. The uncertainty of a
+  cell is the uncertainty of the mean of independent pixels and the
+  look vector of a cell is the normalized mean look vector
+  '''
+  count = np.bincount(index,minlength=K).astype(float)
+  cell_pos = np.empty((K,3))
+  cell_basis = np.empty((K,3))
+  for i in range(3):
+    cell_pos[:,i] = np.bincount(index,pos[:,i],minlength=K)/count
+    cell_basis[:,i] = np.bincount(index,basis[:,i],minlength=K)/count
+
+  cell_basis /= np.linalg.norm(cell_basis,axis=1)[:,None]
+  cell_disp = np.bincount(index,disp,minlength=K)/count
+  cell_sigma = np.sqrt(np.bincount(index,sigma**2,minlength=K))/count
+  return cell_pos,cell_disp,cell_sigma,cell_basis
+
+
+def _subdivide(x,y,criterion,min_size,min_pixels):
+  '''
+  recursively splits the square cells of a quadtree into quadrants
+
+  Parameters
+  ----------
+    x,y : (N,) arrays of pixel positions
+
+    criterion : function
+      takes the cell index of each pixel, the number of cells, and the
+      size of each cell, and returns a boolean array identifying the
+      cells that should be split
+
+    min_size : float
+      cells are not split if their quadrants would be smaller than
+      this
+
+    min_pixels : int
+      cells with this many pixels or fewer are not split
+
+  Returns
+  -------
+    index : (N,) int array
+      cell index for each pixel
+
+    corner : (K,2) array
+      lower left corner of each cell
+
+    size : (K,) array
+      side length of each cell
+
+  '''
+  N = len(x)
+  index = np.zeros(N,dtype=int)
+  if N == 0:
+    return index,np.zeros((0,2)),np.zeros((0,))
+
+  corner = np.array([[x.min(),y.min()]])
+  size = np.array([max(x.max() - x.min(),y.max() - y.min())])
+  if size[0] == 0.0:
+    size[0] = 1.0
+
+  # limit the depth of the tree so that it terminates when there are
+  # pixels with the same position
+  min_size = max(min_size,size[0]*2.0**-30)
+  while True:
+    K = len(size)
+    count = np.bincount(index,minlength=K)
+    split = criterion(index,K,size)
+    split &= (count > min_pixels) & (size/2.0 >= min_size)
+    if not np.any(split):
+      break
+
+    # the children of split cells are appended to the list of cells and
+    # each pixel in a split cell is moved to the child which contains it
+    parents = np.nonzero(split)[0]
+    first_child = np.full(K,-1)
+    first_child[parents] = K + 4*np.arange(len(parents))
+    half = size[parents]/2.0
+    offsets = np.array([[0.0,0.0],[1.0,0.0],[0.0,1.0],[1.0,1.0]])
+    child_corner = corner[parents,None,:] + half[:,None,None]*offsets
+    corner = np.vstack((corner,child_corner.reshape((-1,2))))
+    size = np.hstack((size,half.repeat(4)))
+
+    moved = split[index]
+    parent_of_pixel = index[moved]
+    center = corner[parent_of_pixel] + size[parent_of_pixel,None]/2.0
+    quadrant = ((x[moved] >= center[:,0]).astype(int) +
+                2*(y[moved] >= center[:,1]))
+    index[moved] = first_child[parent_of_pixel] + quadrant
+
+    # remove the split cells and empty children
+    used,index = np.unique(index,return_inverse=True)
+    index = index.ravel()
+    corner = corner[used]
+    size = size[used]
+
+  return index,corner,size
+
+
+def _finish(pos,disp,sigma,basis,keep,index,corner,size):
+  K = len(size)
+  cell_pos,cell_disp,cell_sigma,cell_basis = _aggregate(
+    pos[keep],disp[keep],sigma[keep],basis[keep],index,K)
+  footprint = np.array([corner[:,0],corner[:,0] + size,
+                        corner[:,1],corner[:,1] + size]).T
+  count = np.bincount(index,minlength=K)
+  full_index = np.full(len(pos),-1)
+  full_index[keep] = index
+  return DownsampledData(cell_pos,cell_disp,cell_sigma,cell_basis,
+                         footprint,count,full_index)
+
+
+def quadtree(pos,disp,sigma,basis,max_std,min_size=0.0,max_size=np.inf,
+             min_pixels=1):
+  '''
+  downsamples InSAR data by splitting quadtree cells until the
+  standard deviation of the displacements in each cell is at most
+  max_std
+
+  Parameters
+  ----------
+    pos : (N,3) array
+      cartesian pixel positions
+
+    disp : (N,) array
+
+    sigma : (N,) array
+
+    basis : (N,3) array
+
+    max_std : float
+      cells whose displacements have a larger standard deviation
+      than this are split
+
+    min_size : float, optional
+      cells are never smaller than this
+
+    max_size : float, optional
+      cells larger than this are always split
+
+    min_pixels : int, optional
+      cells with this many pixels or fewer are not split
+
+  Returns
+  -------
+    out : DownsampledData
+
+  '''
+  pos = np.asarray(pos,dtype=float)
+  disp = np.asarray(disp,dtype=float)
+  sigma = np.asarray(sigma,dtype=float)
+  basis = np.asarray(basis,dtype=float)
+  keep = np.isfinite(disp) & np.isfinite(sigma)
+  x = pos[keep,0]
+  y = pos[keep,1]
+  d = disp[keep]
+
+  def criterion(index,K,size):
+    count = np.bincount(index,minlength=K)
+    count = np.maximum(count,1)
+    mean = np.bincount(index,d,minlength=K)/count
+    var = np.bincount(index,d**2,minlength=K)/count - mean**2
+    return (var > max_std**2) | (size > max_size)
+
+  index,corner,size = _subdivide(x,y,criterion,min_size,min_pixels)
+  return _finish(pos,disp,sigma,basis,keep,index,corner,size)
+
+
+def data_resolution(G,damping):
+  '''
+  returns the diagonal of the data resolution matrix
+  G(G^T G + damping^2 I)^-1 G^T
+  '''
+  U,s,Vt = np.linalg.svd(G,full_matrices=False)
+  f = s**2/(s**2 + damping**2)
+  return np.einsum('ij,j,ij->i',U,f,U)
+
+
+def resolution_based(pos,disp,sigma,basis,greens,max_resolution,
+                     damping=1.0,min_size=0.0,max_size=np.inf,
+                     min_pixels=1,max_cells=np.inf):
+  '''
+  downsamples InSAR data by splitting the quadtree cells whose data
+  resolution is larger than max_resolution. The data resolution is
+  computed from the system matrix for the cell centroids, which is
+  weighted by the cell uncertainties. This places small cells where
+  the data constrain the slip the most, which is typically near the
+  fault
+
+  Parameters
+  ----------
+    pos : (N,3) array
+      cartesian pixel positions
+
+    disp : (N,) array
+
+    sigma : (N,) array
+
+    basis : (N,3) array
+
+    greens : function
+      takes (K,3) cell positions and (K,3) look vectors and returns
+      the (K,M) system matrix
+
+    max_resolution : float
+      cells with a larger data resolution are split
+
+    damping : float, optional
+      damping used to compute the data resolution
+
+    min_size : float, optional
+
+    max_size : float, optional
+
+    min_pixels : int, optional
+
+    max_cells : int, optional
+      cells are no longer split once there are this many
+
+  Returns
+  -------
+    out : DownsampledData
+
+  '''
+  pos = np.asarray(pos,dtype=float)
+  disp = np.asarray(disp,dtype=float)
+  sigma = np.asarray(sigma,dtype=float)
+  basis = np.asarray(basis,dtype=float)
+  keep = np.isfinite(disp) & np.isfinite(sigma)
+  p,d,s,b = pos[keep],disp[keep],sigma[keep],basis[keep]
+
+  def criterion(index,K,size):
+    if K >= max_cells:
+      return np.zeros(K,dtype=bool)
+
+    cell_pos,cell_disp,cell_sigma,cell_basis = _aggregate(p,d,s,b,index,K)
+    G = greens(cell_pos,cell_basis)/cell_sigma[:,None]
+    res = data_resolution(G,damping)
+    return (res > max_resolution) | (size > max_size)
+
+  index,corner,size = _subdivide(p[:,0],p[:,1],criterion,min_size,
+                                 min_pixels)
+  return _finish(pos,disp,sigma,basis,keep,index,corner,size)
+
+
+def downsample(pos,disp,sigma,basis,method='quadtree',greens=None,
+               **kwargs):
+  '''
+  downsamples InSAR data with either the 'quadtree' or the
+  'resolution' method. kwargs are passed to quadtree or
+  resolution_based
+  '''
+  if method == 'quadtree':
+    if 'max_std' not in kwargs:
+      raise ValueError('max_std must be given for the quadtree method')
+
+    return quadtree(pos,disp,sigma,basis,**kwargs)
+  elif method == 'resolution':
+    if greens is None:
+      raise ValueError('greens must be given for the resolution method')
+
+    if 'max_resolution' not in kwargs:
+      raise ValueError('max_resolution must be given for the resolution '
+                       'method')
+
+    return resolution_based(pos,disp,sigma,basis,greens,**kwargs)
+  else:
+    raise ValueError('method must be quadtree or resolution')
+
+
+def upsample(cell_values,index):
+  '''
+  maps values for each cell back to the original pixels. Pixels
+  that were not used are given nan
+
+  Parameters
+  ----------
+    cell_values : (K,...) array
+
+    index : (N,) int array
+
+  Returns
+  -------
+    out : (N,...) array
+
+  '''
+  cell_values = np.asarray(cell_values,dtype=float)
+  out = np.full((len(index),) + cell_values.shape[1:],np.nan)
+  used = index != -1
+  out[used] = cell_values[index[used]]
+  return out
@@ -1,8 +1,172 @@
 #!/usr/bin/env python
-from slippy.okada import dislocation
+from slippy.okada import unit_slip_dislocations
+import slippy.okada
+import slippy.patch
 import numpy as np
+import multiprocessing
 
-def build_system_matrix(pos,patches,disp_directions,slip_directions,Nleveling=0,leveling=False, leveling_offset_sign=1):
+def row_blocks(N,M,block_size=2**20):
+  ''' 
+  returns slices which split the N rows of an (N,M) matrix into blocks 
+  with about block_size elements
+  '''
+  step = max(block_size//max(M,1),1)
+  return [slice(i,min(i+step,N)) for i in range(0,N,step)]
+
+
+def _far_field_dislocations(pos,geometries,far_field_tol):
+  ''' 
+  unit_slip_dislocations for the patch geometries, except that the 
+  point source approximation is used for the observation points where 
+  its estimated relative error is at most far_field_tol. Returns the 
+  displacements, an (N,M) boolean array which is True where the 
+  approximation was used, and the estimated errors
+  '''
+  args = (geometries[:,:3],geometries[:,3],geometries[:,4],
+          geometries[:,5],geometries[:,6])
+  error = slippy.okada.point_source_error(pos,*args)
+  far = error <= far_field_tol
+  if not np.any(far):
+    return unit_slip_dislocations(pos,*args),far,error
+
+  disps = slippy.okada.unit_slip_point_sources(pos,*args)
+  for k in range(len(geometries)):
+    near = ~far[:,k]
+    if np.any(near):
+      disps[near,k] = unit_slip_dislocations(pos[near],
+                                             *[a[k:k+1] for a in args])[:,0]
+
+  return disps,far,error
+
+
+def _fill_columns(G,pos,pos_idx,disp_directions,slip_directions,groups,
+                  row_scale=None,block_size=2**16,far_field_tol=None,
+                  info=None):
+  ''' 
+  fills in the columns of G for each (patch geometry, column indices) 
+  pair in groups. The patch geometry is a row of PatchSet.geometry. 
+  The rows are multiplied by row_scale, if it is given. The 
+  displacements are computed for several patch geometries at once, so 
+  that there are about block_size unique observation points and patch 
+  pairs in each call to unit_slip_dislocations. If far_field_tol is 
+  given then the number of entries of G which used the point source 
+  approximation and their largest estimated error are added to the 
+  dictionary info as "far_field_entries" and "far_field_error"
+  '''
+  groups = list(groups)
+  if far_field_tol is not None:
+    # number of rows of G for each unique observation point
+    row_counts = np.bincount(pos_idx,minlength=len(pos))
+    if info is None:
+      info = {}
+
+    info.setdefault('far_field_entries',0)
+    info.setdefault('far_field_error',0.0)
+
+  step = max(block_size//max(len(pos),1),1)
+  for i in range(0,len(groups),step):
+    geometries = np.array([g for g,cols in groups[i:i+step]])
+    if far_field_tol is None:
+      disps = unit_slip_dislocations(pos,geometries[:,:3],geometries[:,3],
+                                     geometries[:,4],geometries[:,5],
+                                     geometries[:,6])
+    else:
+      disps,far,error = _far_field_dislocations(pos,geometries,
+                                                far_field_tol)
+      for k,(geometry,cols) in enumerate(groups[i:i+step]):
+        info['far_field_entries'] += int(np.sum(row_counts[far[:,k]]))*len(cols)
+
+      if np.any(far):
+        info['far_field_error'] = max(info['far_field_error'],
+                                      float(np.max(error[far])))
+
+    for k,(geometry,cols) in enumerate(groups[i:i+step]):
+      disp = disps[:,k][pos_idx]
+      block = np.einsum('ni,nij,mj->nm',disp_directions,disp,
+                        slip_directions[cols])
+      if row_scale is not None:
+        block *= row_scale[:,None]
+
+      G[:,cols] = block
+
+  return G
+
+
+# state which is shared by each worker process in the pool
+_worker_state = {}
+
+def _shared_array(buf,shape,dtype):
+  ''' 
+  returns an array with the given shape and dtype which uses the 
+  shared memory in buf
+  '''
+  return np.frombuffer(buf,dtype=dtype,
+                       count=int(np.prod(shape))).reshape(shape)
+
+
+def _init_worker(buf,shape,dtype,pos,pos_idx,disp_directions,
+                 slip_directions,row_scale,backend,far_field_tol):
+  ''' 
+  stores the arguments which are the same for each chunk of columns 
+  and uses the same Okada backend as the parent process
+  '''
+  slippy.okada.set_backend(backend)
+  _worker_state['G'] = _shared_array(buf,shape,dtype)
+  _worker_state['args'] = (pos,pos_idx,disp_directions,slip_directions)
+  _worker_state['row_scale'] = row_scale
+  _worker_state['far_field_tol'] = far_field_tol
+
+
+def _fill_columns_worker(groups):
+  ''' 
+  used by the worker processes in _fill_columns_parallel. Writes the 
+  columns for groups into the shared G and returns the far field 
+  statistics for the groups
+  '''
+  info = {}
+  _fill_columns(_worker_state['G'],*_worker_state['args'],groups=groups,
+                row_scale=_worker_state['row_scale'],
+                far_field_tol=_worker_state['far_field_tol'],info=info)
+  return info
+
+
+def _fill_columns_parallel(shape,dtype,pos,pos_idx,disp_directions,
+                           slip_directions,groups,workers,row_scale=None,
+                           far_field_tol=None,info=None):
+  ''' 
+  returns a matrix of zeros with the given shape and dtype whose 
+  columns are filled in by a pool of worker processes. The matrix is 
+  allocated in shared memory and each worker writes its columns in 
+  place, so there is only one copy of the matrix. The columns are 
+  computed exactly as they are in _fill_columns, so the result is 
+  identical to the serial build
+  '''
+  dtype = np.dtype(dtype)
+  # the memory is zeroed and it is freed when the array is garbage 
+  # collected
+  buf = multiprocessing.RawArray('b',max(int(np.prod(shape))*dtype.itemsize,1))
+  G = _shared_array(buf,shape,dtype)
+  groups = list(groups)
+  # use several chunks per worker so that the load is balanced
+  Nchunks = min(len(groups),4*workers)
+  chunks = [groups[i::Nchunks] for i in range(Nchunks)]
+  initargs = (buf,shape,dtype,pos,pos_idx,disp_directions,
+              slip_directions,row_scale,slippy.okada.get_backend().name,
+              far_field_tol)
+  with multiprocessing.Pool(workers,_init_worker,initargs) as pool:
+    chunk_info = pool.map(_fill_columns_worker,chunks)
+
+  if (far_field_tol is not None) and (info is not None):
+    info['far_field_entries'] = sum(c['far_field_entries'] for c in chunk_info)
+    info['far_field_error'] = max([c['far_field_error'] for c in chunk_info] + [0.0])
+
+  return G
+
+
+def build_system_matrix(pos,patches,disp_directions,slip_directions,
+                        Nleveling=0,leveling=False,leveling_offset_sign=1,
+                        workers=1,row_scale=None,dtype=float,
+                        far_field_tol=None,info=None):
   ''' 
   builds the system matrix 
 
@@ -10,7 +174,7 @@ def build_system_matrix(pos,patches,disp_directions,slip_directions,Nleveling=0,
   ----------
     pos : (N,3) array of surface observation points
     
-    patches : (M,) list of Patch instances
+    patches : (M,) PatchSet or list of Patch instances
     
     disp_direction : (N,3) array
       displacement direction
@@ -20,25 +184,93 @@ def build_system_matrix(pos,patches,disp_directions,slip_directions,Nleveling=0,
 
     Nleveling : Integer, how many of the observations are leveling 
       (assumed to be at the bottom of the vector)
+
+    workers : int, optional
+      number of processes used to build the matrix. The patches are 
+      divided between the processes. The result is identical to the 
+      serial build
+
+    row_scale : (N,) array, optional
+      each row of the matrix is multiplied by this as the matrix is 
+      built, which is how the rows are weighted by the data 
+      uncertainties without making a weighted copy of the matrix
+
+    dtype : data type, optional
+      data type of the returned matrix. The columns are computed in 
+      double precision and then stored as dtype. float32 halves the 
+      memory used by the matrix
+
+    far_field_tol : float, optional
+      if given then the displacements from a patch are approximated 
+      with a point source at the center of the patch for the surface 
+      observation points where the estimated relative error of the 
+      approximation is at most this. The point source is much cheaper 
+      to evaluate. The error is estimated as (d/r)**2, where d is the 
+      diagonal of the patch and r is the distance from its center, so 
+      the approximation is used beyond about 1/sqrt(far_field_tol) 
+      patch sizes. See slippy.okada.point_source_error
+
+    info : dict, optional
+      if given and far_field_tol is given then the fraction of the 
+      entries of the matrix which used the point source approximation 
+      is stored as "far_field_fraction", and the largest estimated 
+      relative error of those entries is stored as "far_field_error"
   
   Returns
   -------
     out : (N,M) array of dislocation greens functions
 
+  Notes
+  -----
+    Observation points are usually repeated for each displacement 
+    direction and patches are repeated for each slip direction. The 
+    dislocation solution is computed once for each unique observation 
+    point and unique patch geometry, and then it is projected onto the 
+    displacement and slip directions.
+
   '''
   pos = np.asarray(pos)
   slip_directions = np.asarray(slip_directions)
   disp_directions = np.asarray(disp_directions)
   ifleveling = Nleveling>0 or leveling
   
-  G = np.zeros((len(pos),len(patches)+ifleveling))  # one extra column if leveling
+  shape = (len(pos),len(patches)+ifleveling)  # one extra column if leveling
+  if row_scale is not None:
+    row_scale = np.asarray(row_scale,dtype=float)
+
+  # find the unique observation points
+  unique_pos,pos_idx = np.unique(pos,axis=0,return_inverse=True)
+  pos_idx = pos_idx.ravel()
+
+  # group the columns of G by the geometry of the patch they belong to
+  if not isinstance(patches,slippy.patch.PatchSet):
+    patches = slippy.patch.PatchSet.from_patches(patches)
+
+  unique_geometry,patch_idx = np.unique(patches.geometry(),axis=0,
+                                        return_inverse=True)
+  patch_idx = patch_idx.ravel()
+  cols = np.argsort(patch_idx,kind='stable')
+  bounds = np.searchsorted(patch_idx[cols],np.arange(len(unique_geometry)+1))
+  groups = [(g,cols[bounds[k]:bounds[k+1]]) 
+            for k,g in enumerate(unique_geometry)]
+
+  far_field_info = {}
+  if workers > 1:
+    G = _fill_columns_parallel(shape,dtype,unique_pos,pos_idx,
+                               disp_directions,slip_directions,groups,
+                               workers,row_scale=row_scale,
+                               far_field_tol=far_field_tol,
+                               info=far_field_info)
+  else:
+    G = np.zeros(shape,dtype=dtype)
+    _fill_columns(G,unique_pos,pos_idx,disp_directions,
+                  slip_directions,groups,row_scale=row_scale,
+                  far_field_tol=far_field_tol,info=far_field_info)
 
-  for i,p in enumerate(patches):
-    top_center = p.patch_to_user([0.5,1.0,0.0])
-    disp,derr = dislocation(pos,slip_directions[i],top_center,
-                            p.length,p.width,p.strike,p.dip)
-    disp = np.einsum('...j,...j',disp,disp_directions)
-    G[:,i] = disp
+  if (far_field_tol is not None) and (info is not None):
+    info['far_field_fraction'] = (far_field_info['far_field_entries']/
+                                  max(len(pos)*len(patches),1))
+    info['far_field_error'] = far_field_info['far_field_error']
 
   # Add an extra column containing the offset parameter for leveling
   if ifleveling:
@@ -46,7 +278,8 @@ def build_system_matrix(pos,patches,disp_directions,slip_directions,Nleveling=0,
     for i in range(Nleveling):
       vector_of_ones[i]=leveling_offset_sign;
     vector_of_ones=np.flipud(vector_of_ones);
+    if row_scale is not None:
+      vector_of_ones *= row_scale
     G[:,len(patches)]=vector_of_ones  
                                 
   return G  
-  
\ No newline at end of file
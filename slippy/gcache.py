@@ -0,0 +1,250 @@
+#!/usr/bin/env python
+'''
+On-disk cache of system matrices. A system matrix only depends on the
+observation points, the observation directions, the patch geometry,
+the slip directions, the elastic moduli, and the leveling setup. A
+hash of those inputs is used as the file name for the matrix, which
+is stored as a .npy file in the cache directory.
+'''
+import numpy as np
+import hashlib
+import os
+import tempfile
+import slippy.gbuild
+import slippy.patch
+import slippy.okada
+
+# change this whenever the way that G is computed changes
+CACHE_VERSION = 1
+
+def geometry_hash(pos,patches,disp_directions,slip_directions,
+                  Nleveling=0,leveling=False,leveling_offset_sign=1,
+                  lamb=3.2e10,mu=3.2e10,far_field_tol=None,
+                  backend=None):
+  '''
+  returns a hex digest which uniquely identifies the system matrix
+  built from the given arguments
+
+  Parameters
+  ----------
+    pos : (N,3) array of surface observation points
+
+    patches : (M,) PatchSet or list of Patch instances
+
+    disp_direction : (N,3) array
+
+    slip_direction : (M,3) array
+
+    backend : str, optional
+      name of the Okada backend which builds the matrix. Defaults to 
+      the current backend
+
+  Returns
+  -------
+    out : str
+
+  '''
+  if backend is None:
+    backend = slippy.okada.get_backend().name
+
+  if not isinstance(patches,slippy.patch.PatchSet):
+    patches = slippy.patch.PatchSet.from_patches(patches)
+
+  patch_geometry = patches.geometry()
+
+  h = hashlib.sha1()
+  h.update(('version %s\n' % CACHE_VERSION).encode())
+  for a in (pos,disp_directions,slip_directions,patch_geometry):
+    a = np.ascontiguousarray(a,dtype=float)
+    h.update(('%s\n' % (a.shape,)).encode())
+    h.update(a.tobytes())
+
+  h.update(('%s %s %s %r %r\n' % (Nleveling,bool(leveling),
+                                  leveling_offset_sign,
+                                  float(lamb),float(mu))).encode())
+  # only hashed when it is given so that the keys of exact matrices do 
+  # not change
+  if far_field_tol is not None:
+    h.update(('far field %r\n' % float(far_field_tol)).encode())
+
+  # the double precision backends agree to rounding error, so they share 
+  # the keys that were used before other backends were hashed. The 
+  # fortran backend is single precision
+  if backend not in slippy.okada.REFERENCE_BACKENDS:
+    h.update(('backend %s\n' % backend).encode())
+
+  return h.hexdigest()
+
+
+def _cache_file(key,cache_dir):
+  return os.path.join(cache_dir,'G_%s.npy' % key)
+
+
+def load(key,cache_dir):
+  '''
+  returns the cached matrix as a copy-on-write memory map, so that it
+  can be modified in memory without changing the file. None is
+  returned if the matrix is not in the cache
+  '''
+  file_name = _cache_file(key,cache_dir)
+  try:
+    G = np.load(file_name,mmap_mode='c')
+  except (IOError,OSError,ValueError):
+    return None
+
+  # record the access time for LRU eviction
+  os.utime(file_name,None)
+  return G
+
+
+def load_scaled(key,cache_dir,row_scale=None,dtype=float):
+  '''
+  returns a new array containing the cached matrix, with each row
+  multiplied by row_scale and converted to dtype. The file is read a
+  block of rows at a time, so the only large allocation is the
+  returned array. None is returned if the matrix is not in the cache
+  '''
+  file_name = _cache_file(key,cache_dir)
+  try:
+    fin = open(file_name,'rb')
+  except (IOError,OSError):
+    return None
+
+  with fin:
+    try:
+      version = np.lib.format.read_magic(fin)
+      if version == (1,0):
+        header = np.lib.format.read_array_header_1_0(fin)
+      else:
+        header = np.lib.format.read_array_header_2_0(fin)
+    except ValueError:
+      return None
+
+    shape,fortran_order,file_dtype = header
+    if fortran_order | (len(shape) != 2):
+      return None
+
+    if row_scale is not None:
+      row_scale = np.asarray(row_scale,dtype=float)
+
+    G = np.empty(shape,dtype=dtype)
+    for rows in slippy.gbuild.row_blocks(*shape):
+      block = np.fromfile(fin,dtype=file_dtype,
+                          count=(rows.stop - rows.start)*shape[1])
+      block = block.reshape((-1,shape[1]))
+      if row_scale is not None:
+        block *= row_scale[rows,None]
+
+      G[rows] = block
+
+  # record the access time for LRU eviction
+  os.utime(file_name,None)
+  return G
+
+
+def save(G,key,cache_dir,max_size=None):
+  '''
+  writes G to the cache and then evicts the least recently used
+  matrices until the cache is smaller than max_size bytes
+  '''
+  if not os.path.exists(cache_dir):
+    os.makedirs(cache_dir)
+
+  # write to a temporary file first so that a partially written
+  # matrix is never loaded
+  fd,tmp_name = tempfile.mkstemp(suffix='.npy.tmp',dir=cache_dir)
+  try:
+    with os.fdopen(fd,'wb') as fout:
+      np.save(fout,G)
+
+    os.replace(tmp_name,_cache_file(key,cache_dir))
+  except Exception:
+    os.remove(tmp_name)
+    raise
+
+  if max_size is not None:
+    evict(cache_dir,max_size,keep=key)
+
+  return
+
+
+def evict(cache_dir,max_size,keep=None):
+  '''
+  removes the least recently used matrices from the cache until its
+  total size is at most max_size bytes. The matrix for keep is never
+  removed
+  '''
+  entries = []
+  for name in os.listdir(cache_dir):
+    if not (name.startswith('G_') and name.endswith('.npy')):
+      continue
+
+    file_name = os.path.join(cache_dir,name)
+    stat = os.stat(file_name)
+    entries += [(stat.st_mtime,stat.st_size,file_name)]
+
+  total_size = sum(e[1] for e in entries)
+  keep_file = None if keep is None else _cache_file(keep,cache_dir)
+  for mtime,size,file_name in sorted(entries):
+    if total_size <= max_size:
+      break
+
+    if file_name == keep_file:
+      continue
+
+    os.remove(file_name)
+    total_size -= size
+
+  return
+
+
+def cached_system_matrix(cache_dir,pos,patches,disp_directions,
+                         slip_directions,Nleveling=0,leveling=False,
+                         leveling_offset_sign=1,workers=1,
+                         max_size=None,row_scale=None,dtype=float,
+                         far_field_tol=None,info=None):
+  '''
+  same as slippy.gbuild.build_system_matrix except that the matrix is
+  loaded from cache_dir when it has already been built for the same
+  geometry. The unscaled double precision matrix is cached, so the
+  same cached matrix is used for any row_scale and dtype. info is only 
+  filled in when the matrix is built.
+
+  Returns
+  -------
+    G : (N,M) array
+
+    hit : bool
+      whether G was found in the cache
+
+  '''
+  key = geometry_hash(pos,patches,disp_directions,slip_directions,
+                      Nleveling=Nleveling,leveling=leveling,
+                      leveling_offset_sign=leveling_offset_sign,
+                      far_field_tol=far_field_tol)
+  scaled = (row_scale is not None) | (np.dtype(dtype) != np.float64)
+  if scaled:
+    G = load_scaled(key,cache_dir,row_scale=row_scale,dtype=dtype)
+  else:
+    G = load(key,cache_dir)
+
+  if G is not None:
+    return G,True
+
+  G = slippy.gbuild.build_system_matrix(pos,patches,disp_directions,
+                                        slip_directions,Nleveling,
+                                        leveling=leveling,
+                                        leveling_offset_sign=leveling_offset_sign,
+                                        workers=workers,
+                                        far_field_tol=far_field_tol,
+                                        info=info)
+  save(G,key,cache_dir,max_size=max_size)
+  if np.dtype(dtype) != np.float64:
+    # read the matrix back rather than converting it so that the 
+    # double and single precision matrices are never both in memory
+    del G
+    G = load_scaled(key,cache_dir,row_scale=row_scale,dtype=dtype)
+  elif row_scale is not None:
+    G *= np.asarray(row_scale,dtype=float)[:,None]
+
+  return G,False
@@ -0,0 +1,409 @@
+#!/usr/bin/env python
+'''
+Hierarchical low-rank approximation of the system matrix. The system
+matrix for a million InSAR observations and tens of thousands of
+patches does not fit in memory, but the block of the matrix relating
+a cluster of observation points to a cluster of patches which is far
+from them is numerically low rank, because the displacements vary
+smoothly with the positions of the points and the patches.
+
+The observation points and the patch centers are each split into a
+cluster tree by recursively bisecting their bounding boxes. A block
+of the matrix relating an observation cluster and a patch cluster is
+admissible when
+
+  min(diam(rows),diam(columns)) <= eta*dist(rows,columns)
+
+where diam is the diagonal of a bounding box and dist is the distance
+between the bounding boxes. Admissible blocks are approximated as
+U V^T with adaptive cross approximation (ACA), which only evaluates
+the Okada solution for the rows and columns of the block that it
+samples. The other blocks are subdivided until they are small enough
+to be stored densely.
+'''
+import numpy as np
+import scipy.sparse.linalg
+import collections
+import slippy.okada
+import slippy.patch
+
+# a node of a cluster tree. The node contains the points
+# perm[start:stop] of the tree, lower and upper are the corners of
+# their bounding box, and children is a tuple of the child nodes,
+# which is empty for a leaf
+Cluster = collections.namedtuple('Cluster',
+                                 ['start','stop','lower','upper',
+                                  'children'])
+
+
+def cluster_tree(points,leaf_size=64):
+  '''
+  builds a cluster tree by recursively splitting the points in half
+  along the longest side of their bounding box
+
+  Parameters
+  ----------
+    points : (N,3) array
+
+    leaf_size : int, optional
+      clusters with at most this many points are not split
+
+  Returns
+  -------
+    perm : (N,) int array
+      the points sorted so that each cluster is contiguous
+
+    root : Cluster
+
+  '''
+  points = np.asarray(points,dtype=float)
+  perm = np.arange(len(points))
+
+  def build(start,stop):
+    x = points[perm[start:stop]]
+    if len(x) == 0:
+      lower = upper = np.zeros(points.shape[1])
+    else:
+      lower = x.min(axis=0)
+      upper = x.max(axis=0)
+
+    if (stop - start) <= leaf_size:
+      return Cluster(start,stop,lower,upper,())
+
+    axis = np.argmax(upper - lower)
+    order = np.argsort(x[:,axis],kind='stable')
+    perm[start:stop] = perm[start:stop][order]
+    middle = (start + stop)//2
+    return Cluster(start,stop,lower,upper,
+                   (build(start,middle),build(middle,stop)))
+
+  root = build(0,len(points))
+  return perm,root
+
+
+def admissible(rows,cols,eta=1.0):
+  '''
+  returns True if the block relating the clusters rows and cols can be
+  approximated with a low rank matrix
+  '''
+  diam = min(np.linalg.norm(rows.upper - rows.lower),
+             np.linalg.norm(cols.upper - cols.lower))
+  gap = np.maximum(0.0,np.maximum(rows.lower - cols.upper,
+                                  cols.lower - rows.upper))
+  return diam <= eta*np.linalg.norm(gap)
+
+
+def aca(row,col,shape,tol=1e-6,max_rank=None):
+  '''
+  adaptive cross approximation with partial pivoting. The block is
+  approximated as U.dot(V.T), where each term is built from one row
+  and one column of the block. The approximation stops when the last
+  term is less than tol times the Frobenius norm of the approximation
+
+  Parameters
+  ----------
+    row : function
+      row(i) returns row i of the block
+
+    col : function
+      col(j) returns column j of the block
+
+    shape : tuple
+
+    tol : float, optional
+
+    max_rank : int, optional
+      the approximation is abandoned if it needs more terms than this
+
+  Returns
+  -------
+    U : (m,k) array
+
+    V : (n,k) array
+
+    None is returned if the approximation needs more than max_rank
+    terms
+
+  '''
+  m,n = shape
+  if max_rank is None:
+    max_rank = min(m,n)
+
+  U = np.zeros((m,0))
+  V = np.zeros((n,0))
+  unused = np.ones(m,dtype=bool)
+  norm2 = 0.0
+  i = 0
+  while np.any(unused):
+    unused[i] = False
+    r = row(i) - U[i].dot(V.T)
+    j = np.argmax(np.abs(r))
+    if r[j] == 0.0:
+      # this row is already approximated. Try the next unused row
+      i = np.argmax(unused)
+      continue
+
+    if U.shape[1] == max_rank:
+      return None
+
+    v = r/r[j]
+    u = col(j) - U.dot(V[j])
+    # update the squared Frobenius norm of U V^T
+    norm2 += (2*np.sum(U.T.dot(u)*V.T.dot(v)) +
+              u.dot(u)*v.dot(v))
+    U = np.column_stack((U,u))
+    V = np.column_stack((V,v))
+    if np.sqrt(u.dot(u)*v.dot(v)) <= tol*np.sqrt(norm2):
+      break
+
+    score = np.abs(u)
+    score[~unused] = -1.0
+    i = np.argmax(score)
+
+  return U,V
+
+
+def recompress(U,V,tol=1e-6):
+  '''
+  reduces the rank of U.dot(V.T) by truncating its singular value
+  decomposition at tol times the largest singular value
+  '''
+  if U.shape[1] == 0:
+    return U,V
+
+  Qu,Ru = np.linalg.qr(U)
+  Qv,Rv = np.linalg.qr(V)
+  W,s,Zt = np.linalg.svd(Ru.dot(Rv.T))
+  k = max(np.sum(s > tol*s[0]),1)
+  return Qu.dot(W[:,:k]*s[:k]),Qv.dot(Zt[:k].T)
+
+
+class HMatrix:
+  '''
+  hierarchical matrix, which is a collection of low rank and dense
+  blocks. The rows and columns of each block are contiguous after
+  they are sorted by row_perm and col_perm
+  '''
+  def __init__(self,shape,row_perm,col_perm,low_rank,dense):
+    '''
+    Parameters
+    ----------
+      shape : tuple
+
+      row_perm : (N,) int array
+
+      col_perm : (M,) int array
+
+      low_rank : list
+        (rows,cols,U,V) for each low rank block, where rows and cols
+        are slices of the sorted rows and columns
+
+      dense : list
+        (rows,cols,D) for each dense block
+    '''
+    self.shape = shape
+    self.dtype = np.dtype(float)
+    self.row_perm = row_perm
+    self.col_perm = col_perm
+    self.low_rank = low_rank
+    self.dense = dense
+
+  @property
+  def nbytes(self):
+    '''
+    number of bytes used by the blocks
+    '''
+    return (sum(U.nbytes + V.nbytes for r,c,U,V in self.low_rank) +
+            sum(D.nbytes for r,c,D in self.dense))
+
+  def compression_ratio(self):
+    '''
+    returns the size of the dense matrix divided by the size of this
+    matrix
+    '''
+    return self.shape[0]*self.shape[1]*self.dtype.itemsize/max(self.nbytes,1)
+
+  def matvec(self,m):
+    '''
+    returns G.dot(m)
+    '''
+    m = np.asarray(m,dtype=float)[self.col_perm]
+    out = np.zeros(self.shape[0])
+    for rows,cols,U,V in self.low_rank:
+      out[rows] += U.dot(V.T.dot(m[cols]))
+
+    for rows,cols,D in self.dense:
+      out[rows] += D.dot(m[cols])
+
+    G_m = np.empty(self.shape[0])
+    G_m[self.row_perm] = out
+    return G_m
+
+  def rmatvec(self,d):
+    '''
+    returns G.T.dot(d)
+    '''
+    d = np.asarray(d,dtype=float)[self.row_perm]
+    out = np.zeros(self.shape[1])
+    for rows,cols,U,V in self.low_rank:
+      out[cols] += V.dot(U.T.dot(d[rows]))
+
+    for rows,cols,D in self.dense:
+      out[cols] += D.T.dot(d[rows])
+
+    Gt_d = np.empty(self.shape[1])
+    Gt_d[self.col_perm] = out
+    return Gt_d
+
+  def toarray(self):
+    '''
+    returns the dense matrix
+    '''
+    out = np.zeros(self.shape)
+    for rows,cols,U,V in self.low_rank:
+      out[rows,cols] = U.dot(V.T)
+
+    for rows,cols,D in self.dense:
+      out[rows,cols] = D
+
+    G = np.empty(self.shape)
+    G[np.ix_(self.row_perm,self.col_perm)] = out
+    return G
+
+  def aslinearoperator(self):
+    '''
+    returns a scipy LinearOperator, which can be used with the
+    iterative solvers in scipy.sparse.linalg
+    '''
+    return scipy.sparse.linalg.LinearOperator(self.shape,
+                                              matvec=self.matvec,
+                                              rmatvec=self.rmatvec,
+                                              dtype=self.dtype)
+
+
+def build_hmatrix(pos,patches,disp_directions,slip_directions,tol=1e-6,
+                  eta=1.0,leaf_size=64,row_scale=None,lamb=3.2e10,
+                  mu=3.2e10):
+  '''
+  builds a hierarchical approximation of the system matrix from
+  slippy.gbuild.build_system_matrix, without the leveling offset
+  column
+
+  Parameters
+  ----------
+    pos : (N,3) array of surface observation points
+
+    patches : (M,) PatchSet or list of Patch instances
+
+    disp_direction : (N,3) array
+      displacement direction
+
+    slip_direction : (M,3) array
+      slip directions
+
+    tol : float, optional
+      relative accuracy of each low rank block in the Frobenius norm
+
+    eta : float, optional
+      admissibility parameter. Smaller values only approximate blocks
+      which are further apart, which is more accurate and less
+      compressed
+
+    leaf_size : int, optional
+      number of rows or columns below which clusters are not split
+
+    row_scale : (N,) array, optional
+      each row of the matrix is multiplied by this
+
+  Returns
+  -------
+    out : HMatrix
+
+  '''
+  pos = np.asarray(pos,dtype=float)
+  disp_directions = np.asarray(disp_directions,dtype=float)
+  slip_directions = np.asarray(slip_directions,dtype=float)
+  if not isinstance(patches,slippy.patch.PatchSet):
+    patches = slippy.patch.PatchSet.from_patches(patches)
+
+  if row_scale is None:
+    row_scale = np.ones(len(pos))
+  else:
+    row_scale = np.asarray(row_scale,dtype=float)
+
+  # the displacements are computed once for each unique observation
+  # point and patch geometry in a block
+  unique_pos,pos_idx = np.unique(pos,axis=0,return_inverse=True)
+  pos_idx = pos_idx.ravel()
+  unique_geometry,patch_idx = np.unique(patches.geometry(),axis=0,
+                                        return_inverse=True)
+  patch_idx = patch_idx.ravel()
+
+  vectorized_backend = slippy.okada.load_backend('numpy')
+
+  def entries(rows,cols):
+    # returns the block of the matrix for the rows and columns
+    upos,uposi = np.unique(pos_idx[rows],return_inverse=True)
+    ugeo,ugeoi = np.unique(patch_idx[cols],return_inverse=True)
+    g = unique_geometry[ugeo]
+    # the compiled backends loop over the patches in python, which is 
+    # slow for the rows sampled by ACA, so the patches are evaluated at 
+    # once with the vectorized backend when there are more patches 
+    # than points
+    backend = slippy.okada.get_backend()
+    if (not backend.vectorized) and (len(ugeo) > len(upos)):
+      backend = vectorized_backend
+
+    disp = slippy.okada.unit_slip_dislocations(unique_pos[upos],g[:,:3],
+                                               g[:,3],g[:,4],g[:,5],
+                                               g[:,6],lamb=lamb,mu=mu,
+                                               backend=backend)
+    out = np.einsum('ni,nmij,mj->nm',disp_directions[rows],
+                    disp[uposi.ravel()][:,ugeoi.ravel()],
+                    slip_directions[cols])
+    out *= row_scale[rows,None]
+    return out
+
+  row_perm,row_root = cluster_tree(pos,leaf_size=leaf_size)
+  col_perm,col_root = cluster_tree(patches.centroids(),
+                                   leaf_size=leaf_size)
+  low_rank = []
+  dense = []
+
+  def build(r,c):
+    rows = slice(r.start,r.stop)
+    cols = slice(c.start,c.stop)
+    m,n = r.stop - r.start,c.stop - c.start
+    if (m == 0) | (n == 0):
+      return
+
+    if admissible(r,c,eta=eta):
+      rows_idx = row_perm[rows]
+      cols_idx = col_perm[cols]
+      # the low rank approximation is only kept if it is smaller than
+      # the dense block
+      out = aca(lambda i:entries(rows_idx[[i]],cols_idx)[0],
+                lambda j:entries(rows_idx,cols_idx[[j]])[:,0],
+                (m,n),tol=tol,max_rank=(m*n)//(m + n))
+      if out is not None:
+        U,V = recompress(*out,tol=tol)
+        low_rank.append((rows,cols,U,V))
+        return
+
+    if (len(r.children) > 0) | (len(c.children) > 0):
+      # split the larger of the clusters which can be split
+      if (len(c.children) == 0) | ((len(r.children) > 0) & (m >= n)):
+        for child in r.children:
+          build(child,c)
+
+      else:
+        for child in c.children:
+          build(r,child)
+
+      return
+
+    dense.append((rows,cols,entries(row_perm[rows],col_perm[cols])))
+
+  build(row_root,col_root)
+  return HMatrix((len(pos),len(patches)),row_perm,col_perm,low_rank,
+                 dense)
@@ -3,16 +3,53 @@ import slippy.io
 import slippy.basis
 import slippy.patch
 import slippy.gbuild
+import slippy.gcache
+import slippy.downsample
+import slippy.covariance
+import slippy.okada
 import slippy.tikhonov
-import matplotlib.pyplot as plt
 import numpy as np
 import scipy.optimize
 import scipy.linalg
+import scipy.sparse
 import sys
-
-def reg_nnls(G,L,alpha,d):
-  dext = np.concatenate((d,np.zeros(L.shape[0])))
-  Gext = np.vstack((G,L))
+import os
+try:
+  import resource
+except ImportError:
+  # not available on Windows
+  resource = None
+
+def reg_nnls(G,L,alpha,d,solver='stacked'):
+  ''' 
+  solves min ||Gm - d||^2 + ||Lm||^2 + alpha^2*||m||^2 subject to m >= 0
+
+  Parameters
+  ----------
+    solver : str, optional
+      'stacked' stacks G, L, and alpha*I into one matrix and solves 
+      the system with NNLS. G is first reduced to a triangular matrix 
+      with a QR factorization, so the stacked matrix is only as large 
+      as the number of model parameters and G is never copied. 
+      'normal' forms the normal equations and solves them with 
+      normal_nnls. 'normal' is faster, but it squares the condition 
+      number of G
+  '''
+  if solver == 'normal':
+    GtG,Gtd = _normal_products(G,d)
+    AtA = GtG + _gram(L)
+    AtA[np.diag_indices_from(AtA)] += alpha**2
+    return normal_nnls(AtA,Gtd)
+
+  elif solver != 'stacked':
+    raise ValueError('unknown solver "%s"' % solver)
+
+  if scipy.sparse.issparse(L):
+    L = L.toarray()
+
+  R,b = _reduce_rows(G,d)
+  dext = np.concatenate((b,np.zeros(L.shape[0])))
+  Gext = np.vstack((R,L))
   if alpha > 0:  # Minimum norm solution. Aster and Thurber, Equation 4.5.
     alphaI = alpha * np.identity(np.shape(Gext)[1])
     zero_vector = np.zeros( (np.shape(Gext)[1],) )
@@ -20,19 +57,151 @@ def reg_nnls(G,L,alpha,d):
     dext = np.concatenate( (dext, zero_vector) )
   return scipy.optimize.nnls(Gext,dext)[0]
 
+def _gram(L):
+  ''' 
+  returns L^T L as a dense array. L can be dense or sparse
+  '''
+  LtL = L.T.dot(L)
+  if scipy.sparse.issparse(LtL):
+    LtL = LtL.toarray()
+
+  return LtL
+
+def _reduce_rows(G,d):
+  ''' 
+  returns R and b such that ||Gm - d||^2 - ||Rm - b||^2 is the same 
+  for every m, where R has at most one more row than G has columns. 
+  [G d] is factored with QR one block of rows at a time, and the 
+  triangular factor of each block is stacked on the next block
+  '''
+  M = G.shape[1]
+  Rb = np.zeros((0,M+1))
+  # each block has at least as many rows as R so that the number of 
+  # factorizations, and their cost, is proportional to the rows of G
+  block_size = max(2**20,(M+1)**2)
+  for rows in slippy.gbuild.row_blocks(G.shape[0],M,block_size=block_size):
+    block = np.empty((Rb.shape[0] + rows.stop - rows.start,M+1),order='F')
+    block[:Rb.shape[0]] = Rb
+    block[Rb.shape[0]:,:M] = G[rows]
+    block[Rb.shape[0]:,M] = d[rows]
+    # the rows of R below the first M+1 are zero
+    Rb = np.array(scipy.linalg.qr(block,mode='r',overwrite_a=True)[0][:M+1])
+
+  return Rb[:,:M],Rb[:,M]
+
+def _normal_products(G,d):
+  ''' 
+  returns G^T G and G^T d in double precision. If G is stored in 
+  single precision then the products are accumulated over blocks of 
+  rows, so that G is never converted to double precision all at once
+  '''
+  if G.dtype == np.float64:
+    return G.T.dot(G),G.T.dot(d)
+
+  GtG = np.zeros((G.shape[1],G.shape[1]))
+  Gtd = np.zeros(G.shape[1])
+  for rows in slippy.gbuild.row_blocks(*G.shape):
+    block = np.asarray(G[rows],dtype=float)
+    GtG += block.T.dot(block)
+    Gtd += block.T.dot(d[rows])
+
+  return GtG,Gtd
+
+def _matvec(G,m):
+  ''' 
+  returns G.dot(m) in double precision without converting all of G to 
+  double precision
+  '''
+  if G.dtype == np.float64:
+    return G.dot(m)
+
+  out = np.empty(G.shape[0])
+  for rows in slippy.gbuild.row_blocks(*G.shape):
+    out[rows] = np.asarray(G[rows],dtype=float).dot(m)
+
+  return out
+
+def peak_memory():
+  ''' 
+  returns the largest resident set size of this process in bytes, or 
+  None if it is not available
+  '''
+  if resource is None:
+    return None
+
+  maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+  if sys.platform == 'darwin':
+    return maxrss
+  else:
+    return 1024*maxrss
+
+def reg_nnls_sweep(G,L,alpha,d,penalties):
+  ''' 
+  solves reg_nnls for the regularization matrix L scaled by each value 
+  in penalties. G^T G, G^T d, and L^T L are only computed once
+  '''
+  GtG,Gtd = _normal_products(G,d)
+  LtL = _gram(L)
+  alpha2I = alpha**2*np.identity(G.shape[1])
+  return [normal_nnls(GtG + p**2*LtL + alpha2I,Gtd) for p in penalties]
+
+def normal_nnls(AtA,Atb):
+  ''' 
+  solves min ||Ax - b|| subject to x >= 0 given only the normal 
+  equations, AtA and Atb. AtA is factored as R^T R and the equivalent 
+  problem min ||Rx - R^-T Atb||, which is only as large as the number 
+  of model parameters, is solved with NNLS.
+  '''
+  try:
+    R = scipy.linalg.cholesky(AtA)
+    b = scipy.linalg.solve_triangular(R,Atb,trans='T')
+
+  except np.linalg.LinAlgError:
+    # AtA is singular. Use its nonzero eigenvalues instead. Atb is in 
+    # the range of AtA so it has no component along the discarded 
+    # eigenvectors
+    val,vec = np.linalg.eigh(AtA)
+    keep = val > 1e-12*np.max(np.abs(val))
+    R = np.sqrt(val[keep])[:,None]*vec[:,keep].T
+    b = vec[:,keep].T.dot(Atb)/np.sqrt(val[keep])
+
+  return scipy.optimize.nnls(R,b)[0]
+
 def get_output_filenames(output_dir, filename):
   if filename==None:
     return None;
   else:
     return output_dir+filename;
 
+def get_sweep_filename(filename, penalty):
+  ''' 
+  adds the penalty to an output filename, e.g. predicted_slip.txt 
+  becomes predicted_slip_penalty10.txt
+  '''
+  if filename is sys.stdout:
+    return filename;
+  else:
+    root,ext = os.path.splitext(filename)
+    return '%s_penalty%g%s' % (root,penalty,ext);
+
 def main(config):
   ### load in all data
   ###################################################################
-  if config["plotter"] == "basemap":
+  # map projection used to convert between geodetic and cartesian 
+  # coordinates. Basemap is only used when it is asked for
+  projection = config.get('projection',None)
+  if projection is None:
+    projection = 'basemap' if config["plotter"] == "basemap" else 'tmerc'
+
+  if projection == "basemap":
     import slippy.bm as plotting_library
-  else:
+  elif projection == "flat":
     import slippy.xyz2geo as plotting_library
+  elif projection == "tmerc":
+    import slippy.tmerc as plotting_library
+  else:
+    raise ValueError('projection must be tmerc, flat, or basemap')
 
   # Repackage into a list of faults (each fault being a dict)
   fault_list = [];
@@ -57,106 +226,60 @@ def main(config):
   insar_output_file = get_output_filenames(config['output_dir'],config['insar_output_file'])
   leveling_output_file = get_output_filenames(config['output_dir'],config['leveling_output_file'])
   slip_output_file = get_output_filenames(config['output_dir'],config['slip_output_file'])
-  alpha = config['alpha']
+  lcurve_output_file = get_output_filenames(config['output_dir'],config.get('lcurve_output_file','lcurve.txt'))
+  alpha = float(config['alpha'])
   plotter = config['plotter']
   gps_strength = config['gps_strength']
   insar_strength = config['insar_strength']
   leveling_strength = config['leveling_strength']
   leveling_sign = config['leveling_sign']
-  
-  # The overall objects
-  obs_disp_f = np.zeros((0,))
-  obs_sigma_f = np.zeros((0,))
-  obs_pos_geo_f = np.zeros((0,3))  # going to contain gps and insar obs
-  obs_basis_f = np.zeros((0,3))
-  obs_pos_total = np.zeros((0,3))  # for the basemap
-  obs_weighting_f = np.zeros((0,))
+  workers = config.get('workers',1)
+  cache_dir = config.get('cache_dir',None)
+  cache_size = config.get('cache_size',None)
+  if cache_size is not None:
+    cache_size = int(cache_size*1e6)  # megabytes to bytes
+  penalty_values = config.get('penalty_values',None)
+  solver = config.get('solver','stacked')
+  insar_downsample = config.get('insar_downsample',None)
+  dtype = np.dtype(config.get('dtype','float64'))
+  insar_covariance = config.get('insar_covariance',None)
+  far_field_tol = config.get('far_field_tol',None)
+  okada_backend = config.get('okada_backend',None)
+  if okada_backend is None:
+    backend = slippy.okada.get_backend()
+  else:
+    backend = slippy.okada.set_backend(okada_backend)
 
+  print("using %s dc3d" % backend.name)
+  
   if gps_input_file is not None:
-    gps_input = slippy.io.read_gps_data(gps_input_file)    
-    Ngps = len(gps_input[0])
-    obs_gps_pos_geo = gps_input[0]
-    obs_gps_disp = gps_input[1]
-    obs_gps_sigma = gps_input[2]
-    obs_gps_basis = slippy.basis.cardinal_basis((Ngps,3))
-    
-    obs_disp_fi = obs_gps_disp.reshape((Ngps*3,))
-    obs_sigma_fi = obs_gps_sigma.reshape((Ngps*3,))
-    obs_basis_fi = obs_gps_basis.reshape((Ngps*3,3))
-    obs_pos_geo_fi = obs_gps_pos_geo[:,None,:].repeat(3,axis=1).reshape((Ngps*3,3))
-    obs_weighting_fi = (1/gps_strength) * np.ones((Ngps*3,));
-    
-    obs_disp_f = np.concatenate((obs_disp_f,obs_disp_fi),axis=0)
-    obs_sigma_f = np.concatenate((obs_sigma_f,obs_sigma_fi),axis=0)
-    obs_basis_f = np.concatenate((obs_basis_f,obs_basis_fi),axis=0)    
-    obs_pos_geo_f = np.concatenate((obs_pos_geo_f,obs_pos_geo_fi),axis=0)
-    obs_pos_total = np.concatenate((obs_pos_total,obs_pos_geo_fi),axis=0)
-    obs_weighting_f = np.concatenate((obs_weighting_f, obs_weighting_fi),axis=0)
+    (obs_gps_pos_geo,obs_gps_disp,
+     obs_gps_sigma) = slippy.io.read_gps_data(gps_input_file)
     
   else:
     obs_gps_pos_geo = np.zeros((0,3))
     obs_gps_disp = np.zeros((0,3))
     obs_gps_sigma = np.zeros((0,3))
-    obs_gps_basis = np.zeros((0,3,3))
-    Ngps = 0
 
   if insar_input_file is not None:
-    insar_input = slippy.io.read_insar_data(insar_input_file)    
-    Ninsar = len(insar_input[0])
-    obs_insar_pos_geo = insar_input[0]
-    obs_insar_disp = insar_input[1]
-    obs_insar_sigma = insar_input[2]
-    obs_insar_basis = insar_input[3]
-    obs_weighting_fi = (1/insar_strength)*np.ones((Ninsar,));
-
-    obs_disp_f = np.concatenate((obs_disp_f,obs_insar_disp),axis=0)
-    obs_sigma_f = np.concatenate((obs_sigma_f,obs_insar_sigma),axis=0)
-    obs_basis_f = np.concatenate((obs_basis_f,obs_insar_basis),axis=0)    
-    obs_pos_geo_f = np.concatenate((obs_pos_geo_f,obs_insar_pos_geo),axis=0)
-    obs_pos_total = np.concatenate((obs_pos_total,obs_insar_pos_geo),axis=0)
-    obs_weighting_f = np.concatenate((obs_weighting_f, obs_weighting_fi),axis=0)
+    (obs_insar_pos_geo,obs_insar_disp,obs_insar_sigma,
+     obs_insar_basis) = slippy.io.read_insar_data(insar_input_file)
   
   else:
     obs_insar_pos_geo = np.zeros((0,3))
     obs_insar_disp = np.zeros((0,))
     obs_insar_sigma = np.zeros((0,))
     obs_insar_basis = np.zeros((0,3))
-    Ninsar = 0
 
   if leveling_input_file is not None: 
-    leveling_input = slippy.io.read_insar_data(leveling_input_file)
-    Nleveling = len(leveling_input[0])
-    obs_leveling_pos_geo = leveling_input[0]
-    obs_leveling_disp = leveling_input[1]
-    obs_leveling_sigma = leveling_input[2]
-    obs_leveling_basis = leveling_input[3]
-    obs_weighting_fi = (1/leveling_strength) * np.ones((Nleveling,));
-
-    obs_pos_total = np.concatenate((obs_pos_total,obs_leveling_pos_geo),axis=0)
-    obs_disp_f = np.concatenate((obs_disp_f,obs_leveling_disp),axis=0)
-    obs_sigma_f = np.concatenate((obs_sigma_f,obs_leveling_sigma),axis=0)   
-    obs_basis_f = np.concatenate((obs_basis_f,obs_leveling_basis),axis=0)    
-    obs_pos_geo_f = np.concatenate((obs_pos_geo_f,obs_leveling_pos_geo),axis=0)
-    obs_weighting_f = np.concatenate((obs_weighting_f, obs_weighting_fi),axis=0)
+    (obs_leveling_pos_geo,obs_leveling_disp,obs_leveling_sigma,
+     obs_leveling_basis) = slippy.io.read_insar_data(leveling_input_file)
 
   else:
     obs_leveling_pos_geo = np.zeros((0,3))
     obs_leveling_disp = np.zeros((0,))
     obs_leveling_sigma = np.zeros((0,))
     obs_leveling_basis = np.zeros((0,3))
-    Nleveling = 0    
-
-  if gps_output_file is None:
-    gps_output_file = sys.stdout
-
-  if insar_output_file is None:
-    insar_output_file = sys.stdout
-
-  if leveling_output_file is None:
-    leveling_output_file = sys.stdout 
-
-  if slip_output_file is None:
-    slip_output_file = sys.stdout
 
   # ###################################################################
   ### set up basemap for calculation
@@ -164,17 +287,20 @@ def main(config):
   ### create slip basis vectors for each patch  
   ### build regularization matrix
   ###################################################################
-  patches = [];  # a growing list of fault patches. 
+  patch_sets = [];  # a growing list of the fault patches for each fault 
   slip_basis_f = np.zeros((0,3)) # a growing list of basis functions for slip patches
   total_fault_slip_basis=[];
-  patches_f = [];
+  patch_sets_f = [];
   L_array = [];
+  L_unit_array = [];  # regularization matrices without the penalty
   Ns_total = 0;
   fault_names_array = []; 
   
   # Set up the map for the calculation
-  bm = plotting_library.create_default_basemap(obs_pos_total[:,0],obs_pos_total[:,1]) 
-  obs_pos_cart_f = plotting_library.geodetic_to_cartesian(obs_pos_geo_f,bm)  
+  obs_lon = np.concatenate((obs_gps_pos_geo[:,0],obs_insar_pos_geo[:,0],obs_leveling_pos_geo[:,0]))
+  obs_lat = np.concatenate((obs_gps_pos_geo[:,1],obs_insar_pos_geo[:,1],obs_leveling_pos_geo[:,1]))
+  bm = plotting_library.create_default_basemap(obs_lon,obs_lat) 
+  del obs_lon,obs_lat
   
   # Fault processing
   for fault in fault_list:  
@@ -182,10 +308,10 @@ def main(config):
     fault["seg_pos_cart"] = plotting_library.geodetic_to_cartesian(fault["seg_pos_geo"],bm)
 
     # Discretize fault segment
-    seg = slippy.patch.Patch(fault["seg_pos_cart"],
-                             fault["length"],fault["width"],
-                             fault["strike"],fault["dip"])
-    single_fault_patches = np.array(seg.discretize(fault["Nlength"],fault["Nwidth"]))
+    seg = slippy.patch.PatchSet([fault["seg_pos_cart"]],
+                                [fault["length"]],[fault["width"]],
+                                [fault["strike"]],[fault["dip"]])
+    single_fault_patches = seg.discretize(fault["Nlength"],fault["Nwidth"])
     Ns = len(single_fault_patches);
 
     # Create slip basis vectors
@@ -198,53 +324,253 @@ def main(config):
     single_fault_silp_basis_f = single_fault_slip_basis.reshape((Ns*Ds,3))
 
     # Packaging of slip_basis_f and fault patch naming
-    single_fault_patches_f = single_fault_patches[:,None].repeat(Ds,axis=1).reshape((Ns*Ds,))
-    patches=np.concatenate((patches,single_fault_patches),axis=0)
-    patches_f=np.concatenate((patches_f,single_fault_patches_f),axis=0)
+    single_fault_patches_f = single_fault_patches[np.arange(Ns).repeat(Ds)]
+    patch_sets.append(single_fault_patches)
+    patch_sets_f.append(single_fault_patches_f)
     slip_basis_f=np.concatenate((slip_basis_f, single_fault_silp_basis_f),axis=0);
     name_for_patch = np.array([fault["name"]]);
     names_for_patch = name_for_patch.repeat(Ns);
     fault_names_array=np.concatenate((fault_names_array, names_for_patch), axis=0);
 
     ### build regularization matrix
-    L = np.zeros((0,Ns*Ds))
+    L_blocks = []
     indices = np.arange(Ns*Ds).reshape((Ns,Ds))
     for i in range(Ds): 
       connectivity = indices[:,i].reshape((fault["Nlength"],fault["Nwidth"]))
-      Li = slippy.tikhonov.tikhonov_matrix(connectivity,2,column_no=Ns*Ds)
-      L = np.vstack((Li,L))
+      Li = slippy.tikhonov.tikhonov_matrix(connectivity,2,column_no=Ns*Ds,sparse=True)
+      L_blocks.insert(0,Li)
 
-    L *= fault["penalty"] 
-    L_array.append(L)
+    L = scipy.sparse.vstack(L_blocks,format='csr')
+    L_unit_array.append(L)
+    L_array.append(L*fault["penalty"])
     Ns_total = Ns_total+Ns
 
-  # Build System Matrix
+  patches = slippy.patch.PatchSet.concatenate(patch_sets)
+  patches_f = slippy.patch.PatchSet.concatenate(patch_sets_f)
+
+  ### downsample the InSAR data
+  ###################################################################
+  insar_cells = None
+  if insar_downsample is not None:
+    # keep the original pixels so that the predicted displacements can 
+    # be written for each of them
+    insar_pixel_pos_geo = obs_insar_pos_geo
+    insar_pixel_basis = obs_insar_basis
+    options = dict(insar_downsample)
+    method = options.pop('method','quadtree')
+    cell_output_file = get_output_filenames(config['output_dir'],options.pop('output_file',None))
+
+    def greens(pos,basis):
+      return slippy.gbuild.build_system_matrix(pos,patches_f,basis,
+                                               slip_basis_f,
+                                               workers=workers)
+
+    insar_pixel_pos_cart = plotting_library.geodetic_to_cartesian(obs_insar_pos_geo,bm)
+    insar_cells = slippy.downsample.downsample(insar_pixel_pos_cart,
+                                               obs_insar_disp,
+                                               obs_insar_sigma,
+                                               obs_insar_basis,
+                                               method=method,
+                                               greens=greens,
+                                               **options)
+    del insar_pixel_pos_cart
+    print("Downsampled %d InSAR pixels to %d observations" % (len(insar_pixel_pos_geo),len(insar_cells.disp)))
+    obs_insar_pos_geo = plotting_library.cartesian_to_geodetic(insar_cells.pos,bm)
+    obs_insar_disp = insar_cells.disp
+    obs_insar_sigma = insar_cells.sigma
+    obs_insar_basis = insar_cells.basis
+    if cell_output_file is not None:
+      slippy.io.write_insar_data(obs_insar_pos_geo,obs_insar_disp,
+                                 obs_insar_sigma,obs_insar_basis,
+                                 cell_output_file)
+
+  Ngps = len(obs_gps_pos_geo)
+  Ninsar = len(obs_insar_pos_geo)
+  Nleveling = len(obs_leveling_pos_geo)
+
+  ### assemble the observation vectors. Each vector is allocated once 
+  ### and each GPS station is repeated for its three components
+  ###################################################################
+  Nobs = 3*Ngps + Ninsar + Nleveling
+  gps_slice = slice(0,3*Ngps)
+  insar_slice = slice(3*Ngps,3*Ngps + Ninsar)
+  leveling_slice = slice(3*Ngps + Ninsar,Nobs)
+
+  obs_disp_f = np.empty((Nobs,))
+  obs_sigma_f = np.empty((Nobs,))
+  obs_pos_geo_f = np.empty((Nobs,3))  # contains gps, insar, and leveling obs
+  obs_basis_f = np.empty((Nobs,3))
+  obs_weighting_f = np.empty((Nobs,))
+
+  obs_disp_f[gps_slice] = obs_gps_disp.ravel()
+  obs_sigma_f[gps_slice] = obs_gps_sigma.ravel()
+  obs_pos_geo_f[gps_slice] = obs_gps_pos_geo.repeat(3,axis=0)
+  obs_basis_f[gps_slice] = slippy.basis.cardinal_basis((Ngps,3)).reshape((Ngps*3,3))
+  obs_weighting_f[gps_slice] = 1/gps_strength
+
+  obs_disp_f[insar_slice] = obs_insar_disp
+  obs_sigma_f[insar_slice] = obs_insar_sigma
+  obs_pos_geo_f[insar_slice] = obs_insar_pos_geo
+  obs_basis_f[insar_slice] = obs_insar_basis
+  obs_weighting_f[insar_slice] = 1/insar_strength
+
+  obs_disp_f[leveling_slice] = obs_leveling_disp
+  obs_sigma_f[leveling_slice] = obs_leveling_sigma
+  obs_pos_geo_f[leveling_slice] = obs_leveling_pos_geo
+  obs_basis_f[leveling_slice] = obs_leveling_basis
+  obs_weighting_f[leveling_slice] = 1/leveling_strength
+
+  # replace the insar and leveling arrays with views of the assembled 
+  # arrays so that only one copy of the data is kept in memory
+  obs_insar_pos_geo = obs_pos_geo_f[insar_slice]
+  obs_insar_basis = obs_basis_f[insar_slice]
+  obs_leveling_pos_geo = obs_pos_geo_f[leveling_slice]
+  obs_leveling_basis = obs_basis_f[leveling_slice]
+  del (obs_insar_disp,obs_insar_sigma,
+       obs_leveling_disp,obs_leveling_sigma)
+
+  obs_pos_cart_f = plotting_library.geodetic_to_cartesian(obs_pos_geo_f,bm)  
+
+  if gps_output_file is None:
+    gps_output_file = sys.stdout
+
+  if insar_output_file is None:
+    insar_output_file = sys.stdout
+
+  if leveling_output_file is None:
+    leveling_output_file = sys.stdout 
+
+  if slip_output_file is None:
+    slip_output_file = sys.stdout
+
+  if lcurve_output_file is None:
+    lcurve_output_file = sys.stdout
+
+  ### weigh system matrix and data by the uncertainty. The rows of the 
+  ### system matrix are scaled as it is built, so that a weighted copy 
+  ### is never made, and row_scale is kept to undo the weighting for 
+  ### the predicted displacements
   ###################################################################  
-  G = slippy.gbuild.build_system_matrix(obs_pos_cart_f, 
-                                        patches_f,
-                                        obs_basis_f,
-                                        slip_basis_f, 
-                                        Nleveling, 
-                                        leveling_offset_sign=leveling_sign) 
-
-  ### weigh system matrix and data by the uncertainty
+  row_scale = 1.0/(obs_weighting_f*obs_sigma_f)
+  insar_chol = None
+  if (insar_covariance is not None) and (Ninsar > 0):
+    # the InSAR rows are weighted by the inverse Cholesky factor of the 
+    # data covariance, which includes the pixel uncertainties, rather 
+    # than by the uncertainties
+    insar_chol,hit = slippy.covariance.insar_cholesky(obs_pos_cart_f[insar_slice],
+                                                      obs_sigma_f[insar_slice],
+                                                      insar_covariance,
+                                                      cache_dir=cache_dir,
+                                                      max_size=cache_size)
+    if hit:
+      print("Loaded the InSAR covariance factor from %s" % cache_dir)
+    row_scale[insar_slice] = 1.0/obs_weighting_f[insar_slice]
+
+  obs_disp_f *= row_scale
+
+  # Build System Matrix
   ###################################################################  
-  G /= obs_weighting_f[:,None]
-  obs_disp_f /= obs_weighting_f
-  G /= obs_sigma_f[:,None]
-  obs_disp_f /= obs_sigma_f  
+  far_field_info = {}
+  if cache_dir is None:
+    G = slippy.gbuild.build_system_matrix(obs_pos_cart_f, 
+                                          patches_f,
+                                          obs_basis_f,
+                                          slip_basis_f, 
+                                          Nleveling, 
+                                          leveling_offset_sign=leveling_sign,
+                                          workers=workers,
+                                          row_scale=row_scale,
+                                          dtype=dtype,
+                                          far_field_tol=far_field_tol,
+                                          info=far_field_info) 
+  else:
+    G,hit = slippy.gcache.cached_system_matrix(cache_dir,
+                                               obs_pos_cart_f,
+                                               patches_f,
+                                               obs_basis_f,
+                                               slip_basis_f,
+                                               Nleveling,
+                                               leveling_offset_sign=leveling_sign,
+                                               workers=workers,
+                                               max_size=cache_size,
+                                               row_scale=row_scale,
+                                               dtype=dtype,
+                                               far_field_tol=far_field_tol,
+                                               info=far_field_info)
+    if hit:
+      print("Green's function cache hit: loaded system matrix from %s" % cache_dir)
+    else:
+      print("Green's function cache miss: saved system matrix to %s" % cache_dir)
+
+  if insar_chol is not None:
+    slippy.covariance.whiten(insar_chol,G,obs_disp_f,insar_slice)
+
+  print("System matrix is %d x %d (%.1f MB)" % (G.shape[0],G.shape[1],G.nbytes/1e6))
+  if 'far_field_fraction' in far_field_info:
+    print("Point source approximation used for %.1f%% of the system matrix "
+          "(estimated maximum relative error %.1e)" % 
+          (100*far_field_info['far_field_fraction'],
+           far_field_info['far_field_error']))
+
+  if insar_cells is not None:
+    # Green's functions for the three components of displacement at each 
+    # cell, so that the prediction for each pixel can be projected onto 
+    # its own look vector
+    Ncells = len(insar_cells.pos)
+    cell_G = slippy.gbuild.build_system_matrix(insar_cells.pos.repeat(3,axis=0),
+                                               patches_f,
+                                               slippy.basis.cardinal_basis((Ncells,3)).reshape((Ncells*3,3)),
+                                               slip_basis_f,
+                                               workers=workers,
+                                               far_field_tol=far_field_tol)
 
+  ### build regularization matrix
+  ###################################################################  
   if Nleveling>0:  # IF LEVELING: 
-    ### Leveling: build larger regularization matrix
-    L_array.append([0]);  # one more model parameter, for the leveling offset
-    L = scipy.linalg.block_diag(*L_array)   
+    L_array.append(scipy.sparse.csr_matrix((1,1)));  # one more model parameter, for the leveling offset
+    L_unit_array.append(scipy.sparse.csr_matrix((1,1)));
+  L = scipy.sparse.block_diag(L_array,format='csr')
 
-    ### estimate slip and compute predicted displacement
+  ### estimate slip
+  #####################################################################
+  output_files = (slip_output_file,gps_output_file,
+                  insar_output_file,leveling_output_file)
+  if penalty_values is None:
+    slip_f_list = [reg_nnls(G,L,alpha,obs_disp_f,solver=solver)]
+    output_files_list = [output_files]
+
+  else:
+    # the penalty for each fault is replaced by each value in penalty_values
+    L_unit = scipy.sparse.block_diag(L_unit_array,format='csr')
+    slip_f_list = reg_nnls_sweep(G,L_unit,alpha,obs_disp_f,penalty_values)
+    output_files_list = [[get_sweep_filename(f,pv) for f in output_files] 
+                         for pv in penalty_values]
+    misfit_norm = [np.linalg.norm(_matvec(G,m) - obs_disp_f) for m in slip_f_list]
+    roughness_norm = [np.linalg.norm(L_unit.dot(m)) for m in slip_f_list]
+    slippy.io.write_lcurve_data(penalty_values,misfit_norm,roughness_norm,
+                                lcurve_output_file)
+
+  ### get slip patch data for outputs
+  #####################################################################
+  patches_pos_cart = patches.top_centers()
+  patches_pos_geo = plotting_library.cartesian_to_geodetic(patches_pos_cart,bm)
+
+  for slip_f,output_files in zip(slip_f_list,output_files_list):
+    (slip_output_file,gps_output_file,
+     insar_output_file,leveling_output_file) = output_files
+
+    ### compute predicted displacement
     #####################################################################
-    slip_f = reg_nnls(G,L,alpha,obs_disp_f)
-    pred_disp_f = G.dot(slip_f)*obs_sigma_f*obs_weighting_f # multiply by sigma to counteract the division for weighting
-    slip_f = slip_f[0:-1];  # LEVELING: Will ignore the last model parameter, which is the leveling offset
-    leveling_offset = slip_f[-1];
+    pred_disp_f = _matvec(G,slip_f)
+    if insar_chol is not None:
+      pred_disp_f[insar_slice] = slippy.covariance.unwhiten(insar_chol,pred_disp_f[insar_slice])
+    pred_disp_f /= row_scale # undo the weighting
+    if insar_cells is not None:
+      pred_disp_cells = cell_G.dot(slip_f[:cell_G.shape[1]]).reshape((Ncells,3))
+    if Nleveling>0:
+      slip_f = slip_f[0:-1];  # LEVELING: Will ignore the last model parameter, which is the leveling offset
+      leveling_offset = slip_f[-1];
+
     slip = slip_f.reshape((Ns_total,Ds))  # THIS ASSUMES ALL FAULTS HAVE THE SAME NUMBER OF BASIS VECTORS
     cardinal_slip = slippy.basis.cardinal_components(slip,total_fault_slip_basis)
 
@@ -253,55 +579,44 @@ def main(config):
     pred_disp_gps = pred_disp_f_gps.reshape((Ngps,3))
     pred_disp_insar = pred_disp_f[3*Ngps:3*Ngps+Ninsar]
     pred_disp_leveling = pred_disp_f[3*Ngps+Ninsar:];
-    print("Leveling Offset = %f m " % (leveling_offset) );
-    if abs(leveling_offset)<0.0000001:
-      print("WARNING: Leveling offset close to zero. Consider a negative offset in G.")
+    if Nleveling>0:
+      print("Leveling Offset = %f m " % (leveling_offset) );
+      if abs(leveling_offset)<0.0000001:
+        print("WARNING: Leveling offset close to zero. Consider a negative offset in G.")
 
-  if Nleveling==0:
-    # build regularization matrix
-    L = scipy.linalg.block_diag(*L_array) 
-
-    ### estimate slip and compute predicted displacement
+    ### write output
     #####################################################################
-    slip_f = reg_nnls(G,L,alpha,obs_disp_f)
-    pred_disp_f = G.dot(slip_f)*obs_sigma_f*obs_weighting_f   # multiply by sigma to counteract the division for weighting
-    slip = slip_f.reshape((Ns_total,Ds))  # THIS ASSUMES ALL FAULTS HAVE THE SAME NUMBER OF BASIS VECTORS
-    cardinal_slip = slippy.basis.cardinal_components(slip,total_fault_slip_basis)
-
-    # split predicted displacements into insar and GPS component 
-    pred_disp_f_gps = pred_disp_f[:3*Ngps]
-    pred_disp_gps = pred_disp_f_gps.reshape((Ngps,3))
-    pred_disp_insar = pred_disp_f[3*Ngps:]  
-    pred_disp_leveling = pred_disp_f[-1:-1]; # no leveling; padding with nothing
-
-  ### get slip patch data for outputs
-  #####################################################################
-  patches_pos_cart =[i.patch_to_user([0.5,1.0,0.0]) for i in patches]
-  patches_pos_geo = plotting_library.cartesian_to_geodetic(patches_pos_cart,bm)
-  patches_strike = [i.strike for i in patches]
-  patches_dip = [i.dip for i in patches]
-  patches_length = [i.length for i in patches]
-  patches_width = [i.width for i in patches]
-
-  ### write output
-  #####################################################################
-  slippy.io.write_slip_data(patches_pos_geo,
-                            patches_strike,patches_dip,
-                            patches_length,patches_width,
-                            cardinal_slip,fault_names_array,slip_output_file)
-
-  slippy.io.write_gps_data(obs_gps_pos_geo, 
-                           pred_disp_gps,0.0*pred_disp_gps,
-                           gps_output_file)
-
-  slippy.io.write_insar_data(obs_insar_pos_geo,
-                           pred_disp_insar,0.0*pred_disp_insar,
-                           obs_insar_basis, 
-                           insar_output_file)
-
-  slippy.io.write_insar_data(obs_leveling_pos_geo,
-                           pred_disp_leveling,0.0*pred_disp_leveling,
-                           obs_leveling_basis, 
-                           leveling_output_file)
+    slippy.io.write_slip_data(patches_pos_geo,
+                              patches.strike,patches.dip,
+                              patches.length,patches.width,
+                              cardinal_slip,fault_names_array,slip_output_file)
+
+    slippy.io.write_gps_data(obs_gps_pos_geo, 
+                             pred_disp_gps,0.0*pred_disp_gps,
+                             gps_output_file)
+
+    if insar_cells is None:
+      slippy.io.write_insar_data(obs_insar_pos_geo,
+                               pred_disp_insar,0.0*pred_disp_insar,
+                               obs_insar_basis, 
+                               insar_output_file)
+    else:
+      # each pixel is given the displacement at its cell projected onto 
+      # the look vector of the pixel
+      pred_disp_pixels = slippy.downsample.upsample(pred_disp_cells,insar_cells.index)
+      pred_disp_pixels = np.sum(pred_disp_pixels*insar_pixel_basis,axis=1)
+      slippy.io.write_insar_data(insar_pixel_pos_geo,
+                               pred_disp_pixels,0.0*pred_disp_pixels,
+                               insar_pixel_basis, 
+                               insar_output_file)
+
+    slippy.io.write_insar_data(obs_leveling_pos_geo,
+                             pred_disp_leveling,0.0*pred_disp_leveling,
+                             obs_leveling_basis, 
+                             leveling_output_file)
+
+  peak = peak_memory()
+  if peak is not None:
+    print("Peak memory usage: %.1f MB" % (peak/1e6))
 
   return
@@ -1,5 +1,104 @@
 #!/usr/bin/env python
+'''
+Readers and writers for the GPS, InSAR, leveling, and slip files. Each
+file can be stored as space separated text or in a binary format. The
+binary format is used when the file name ends with one of
+BINARY_EXTENSIONS. A binary file is an uncompressed numpy .npz archive
+with one typed array per column, which is named after the column in
+the text header. The file type and the column units are stored as
+metadata. Columns are only read from a binary file when they are
+needed, and they are stored without any loss of precision.
+'''
 import numpy as np
+import itertools
+import os
+
+BINARY_EXTENSIONS = ('.npz',)
+
+# (name,unit,dtype) for each column of each file type. Leveling files
+# have the same format as InSAR files
+GPS_COLUMNS = [('lon','degrees',float),
+               ('lat','degrees',float),
+               ('disp_e','m',float),
+               ('disp_n','m',float),
+               ('disp_v','m',float),
+               ('sigma_e','m',float),
+               ('sigma_n','m',float),
+               ('sigma_u','m',float)]
+
+INSAR_COLUMNS = [('lon','degrees',float),
+                 ('lat','degrees',float),
+                 ('disp_los','m',float),
+                 ('sigma_los','m',float),
+                 ('V_e','',float),
+                 ('V_n','',float),
+                 ('V_u','',float)]
+
+SLIP_COLUMNS = [('lon','degrees',float),
+                ('lat','degrees',float),
+                ('depth','m',float),
+                ('strike','degrees',float),
+                ('dip','degrees',float),
+                ('length','m',float),
+                ('width','m',float),
+                ('left-lateral','m',float),
+                ('thrust','m',float),
+                ('tensile','m',float),
+                ('segment_num','',int)]
+
+FILE_COLUMNS = {'gps':GPS_COLUMNS,
+                'insar':INSAR_COLUMNS,
+                'leveling':INSAR_COLUMNS,
+                'slip':SLIP_COLUMNS}
+
+
+def is_binary(file_name):
+  '''
+  returns True if file_name is read and written in the binary format.
+  File objects, such as sys.stdout, are always written as text
+  '''
+  if not isinstance(file_name,str):
+    return False
+
+  return os.path.splitext(file_name)[1].lower() in BINARY_EXTENSIONS
+
+
+def _text_header(columns):
+  return ' '.join(n if u == '' else '%s[%s]' % (n,u) for n,u,t in columns)
+
+
+def _write_binary(file_name,file_type,values):
+  '''
+  writes each array in values as the column with the same position in
+  FILE_COLUMNS[file_type]
+  '''
+  columns = FILE_COLUMNS[file_type]
+  arrays = {}
+  for (name,unit,dtype),value in zip(columns,values):
+    arrays[name] = np.asarray(value,dtype=dtype)
+
+  arrays['__file_type__'] = np.array(file_type)
+  arrays['__units__'] = np.array([u for n,u,t in columns])
+  np.savez(file_name,**arrays)
+  return
+
+
+def _open_binary(file_name,file_type):
+  '''
+  returns the opened archive for a binary file. Columns are read from
+  disk when they are indexed by name
+  '''
+  data = np.load(file_name,allow_pickle=False)
+  stored_type = str(data['__file_type__'])
+  # InSAR and leveling files are interchangeable
+  if FILE_COLUMNS.get(stored_type) is not FILE_COLUMNS[file_type]:
+    data.close()
+    raise ValueError(
+      '%s contains %s data but %s data was expected' %
+      (file_name,stored_type,file_type))
+
+  return data
+
 
 def read_gps_data(file_name):  
   ''' 
@@ -10,6 +109,17 @@ def read_gps_data(file_name):
     lon[degrees] lat[degrees] disp_e[m] disp_n[m] disp_v[m] sigma_e[m] sigma_n[m] sigma_v[m]
     
   '''
+  if is_binary(file_name):
+    with _open_binary(file_name,'gps') as data:
+      Nx = len(data['lon'])
+      pos_geodetic = np.zeros((Nx,3))
+      pos_geodetic[:,0] = data['lon']
+      pos_geodetic[:,1] = data['lat']
+      disp = np.column_stack([data['disp_e'],data['disp_n'],data['disp_v']])
+      sigma = np.column_stack([data['sigma_e'],data['sigma_n'],data['sigma_u']])
+
+    return pos_geodetic,disp,sigma
+
   data = np.loadtxt(file_name,skiprows=1)
   Nx = len(data) 
   lonlat = data[:,[0,1]]
@@ -19,23 +129,81 @@ def read_gps_data(file_name):
   return pos_geodetic,disp,sigma
 
 
-def read_insar_data(file_name):  
+def _count_lines(file_name,block_size=2**20):
+  ''' 
+  returns the number of lines in the file
+  '''
+  count = 0
+  last = b'\n'
+  with open(file_name,'rb') as fin:
+    block = fin.read(block_size)
+    while block:
+      count += block.count(b'\n')
+      last = block[-1:]
+      block = fin.read(block_size)
+
+  # count the last line if it does not end with a newline
+  if last != b'\n':
+    count += 1
+
+  return count
+
+
+def read_insar_data(file_name,chunk_size=100000):  
   ''' 
   FILE FORMAT
   -----------
   
     HEADER
     lon[degrees] lat[degrees] component[m] sigma[m] basis_e basis_n basis_v
-    
+
+  A text file is read chunk_size rows at a time into preallocated
+  arrays so that the whole file is never held in memory as text or as
+  an intermediate array. A binary file is read one column at a time
   '''  
-  data = np.loadtxt(file_name,skiprows=1)
-  Nx = len(data) 
-  lonlat = data[:,[0,1]]
-  disp = data[:,2]
-  sigma = data[:,3]
-  basis = data[:,[4,5,6]]
-  pos_geodetic = np.hstack((lonlat,np.zeros((Nx,1))))
-  return pos_geodetic,disp,sigma,basis
+  if is_binary(file_name):
+    with _open_binary(file_name,'insar') as data:
+      Nx = len(data['lon'])
+      pos_geodetic = np.zeros((Nx,3))
+      pos_geodetic[:,0] = data['lon']
+      pos_geodetic[:,1] = data['lat']
+      disp = data['disp_los']
+      sigma = data['sigma_los']
+      basis = np.empty((Nx,3))
+      basis[:,0] = data['V_e']
+      basis[:,1] = data['V_n']
+      basis[:,2] = data['V_u']
+
+    return pos_geodetic,disp,sigma,basis
+
+  # the number of lines minus the header is an upper bound on Nx
+  Nmax = max(_count_lines(file_name) - 1,0)
+  pos_geodetic = np.zeros((Nmax,3))
+  disp = np.empty((Nmax,))
+  sigma = np.empty((Nmax,))
+  basis = np.empty((Nmax,3))
+  Nx = 0
+  with open(file_name,'r') as fin:
+    # skip the header
+    fin.readline()
+    while True:
+      lines = list(itertools.islice(fin,chunk_size))
+      if len(lines) == 0:
+        break
+
+      # blank and commented lines are ignored by loadtxt
+      data = np.loadtxt(lines,ndmin=2)
+      if data.size == 0:
+        continue
+
+      chunk = slice(Nx,Nx + len(data))
+      pos_geodetic[chunk,:2] = data[:,[0,1]]
+      disp[chunk] = data[:,2]
+      sigma[chunk] = data[:,3]
+      basis[chunk] = data[:,[4,5,6]]
+      Nx += len(data)
+
+  return pos_geodetic[:Nx],disp[:Nx],sigma[:Nx],basis[:Nx]
 
 
 def read_slip_data(file_name):
@@ -46,6 +214,18 @@ def read_slip_data(file_name):
     HEADER
     lon[degrees] lat[degrees] height[m] strike[degrees] dip[degrees] length[m] width[m] left-lateral[m] thrust[m] tensile[m] segment_num
   '''
+  if is_binary(file_name):
+    with _open_binary(file_name,'slip') as data:
+      pos_geodetic = np.column_stack([data['lon'],data['lat'],data['depth']])
+      strike = data['strike']
+      dip = data['dip']
+      length = data['length']
+      width = data['width']
+      slip = np.column_stack([data['left-lateral'],data['thrust'],data['tensile']])
+      names = data['segment_num']
+
+    return pos_geodetic,strike,dip,length,width,slip,names
+
   data = np.loadtxt(file_name,skiprows=1)
   pos_geodetic = data[:,[0,1,2]]
   strike = data[:,3]
@@ -69,9 +249,16 @@ def write_gps_data(pos_geodetic,disp,sigma,file_name):
   disp = np.asarray(disp)
   sigma = np.asarray(sigma)
   
+  if is_binary(file_name):
+    _write_binary(file_name,'gps',
+                  [pos_geodetic[:,0],pos_geodetic[:,1],
+                   disp[:,0],disp[:,1],disp[:,2],
+                   sigma[:,0],sigma[:,1],sigma[:,2]])
+    return
+
   lonlat = pos_geodetic[:,[0,1]]
   data = np.hstack((lonlat,disp,sigma))
-  header = "lon[degrees] lat[degrees] disp_e[m] disp_n[m] disp_v[m] sigma_e[m] sigma_n[m] sigma_u[m]"
+  header = _text_header(GPS_COLUMNS)
   np.savetxt(file_name,data,header=header,fmt='%0.4f')
   return
 
@@ -89,9 +276,15 @@ def write_insar_data(pos_geodetic,disp,sigma,basis,file_name):
   sigma = np.asarray(sigma)
   basis = np.asarray(basis)
   
+  if is_binary(file_name):
+    _write_binary(file_name,'insar',
+                  [pos_geodetic[:,0],pos_geodetic[:,1],disp,sigma,
+                   basis[:,0],basis[:,1],basis[:,2]])
+    return
+
   lonlat = pos_geodetic[:,[0,1]]
   data = np.hstack((lonlat,disp[:,None],sigma[:,None],basis))
-  header = "lon[degrees] lat[degrees] disp_los[m] sigma_los[m] V_e V_n V_u"
+  header = _text_header(INSAR_COLUMNS)
   np.savetxt(file_name,data,header=header,fmt='%0.4f')
   return
 
@@ -112,8 +305,60 @@ def write_slip_data(pos_geodetic,strike,dip,length,width,slip,names,file_name):
   slip = np.asarray(slip)
   names = np.asarray(names)
 
+  if is_binary(file_name):
+    _write_binary(file_name,'slip',
+                  [pos_geodetic[:,0],pos_geodetic[:,1],pos_geodetic[:,2],
+                   strike,dip,length,width,
+                   slip[:,0],slip[:,1],slip[:,2],names])
+    return
+
   data = np.hstack((pos_geodetic,strike[:,None],
                     dip[:,None],length[:,None],width[:,None],slip,names[:,None]))
-  header = "lon[degrees] lat[degrees] depth[m] strike[degrees] dip[degrees] length[m] width[m] left-lateral[m] thrust[m] tensile[m] segment_num"
+  header = _text_header(SLIP_COLUMNS)
   np.savetxt(file_name,data,header=header,fmt='%0.4f %0.4f %0.4f %0.4f %0.4f %0.4f %0.4f %0.4f %0.4f %0.4f %d')
   return
+
+
+def write_lcurve_data(penalty,misfit_norm,roughness_norm,file_name):
+  ''' 
+  FILE FORMAT
+  -----------
+
+    HEADER
+    penalty misfit_norm roughness_norm
+  '''
+  penalty = np.asarray(penalty)
+  misfit_norm = np.asarray(misfit_norm)
+  roughness_norm = np.asarray(roughness_norm)
+
+  data = np.array([penalty,misfit_norm,roughness_norm]).T
+  header = "penalty misfit_norm roughness_norm"
+  np.savetxt(file_name,data,header=header,fmt='%0.6e')
+  return
+
+
+def convert_data_file(input_file,output_file,file_type):
+  '''
+  reads input_file and writes its contents to output_file. The format
+  of each file, text or binary, is determined by its extension
+
+  Parameters
+  ----------
+    input_file : str
+
+    output_file : str
+
+    file_type : str
+      either 'gps', 'insar', 'leveling', or 'slip'
+
+  '''
+  if file_type == 'gps':
+    write_gps_data(*read_gps_data(input_file),file_name=output_file)
+  elif file_type in ('insar','leveling'):
+    write_insar_data(*read_insar_data(input_file),file_name=output_file)
+  elif file_type == 'slip':
+    write_slip_data(*read_slip_data(input_file),file_name=output_file)
+  else:
+    raise ValueError('file_type must be gps, insar, leveling, or slip')
+
+  return
@@ -34,7 +34,8 @@ def get_slip_moment(slip_filename):
 	# From the inversion results, what is the moment of the slip distribution? 
 	moment_total = 0;
 	mu=30e9;  # Pa, assumed. 
-	length, width, leftlat, thrust, tensile = np.loadtxt(slip_filename,skiprows=1,unpack=True,usecols=(5,6,7,8,9));
+	[_, _, _, length, width, slip_components, _] = slippy.io.read_slip_data(slip_filename);  # text or binary
+	leftlat, thrust = slip_components[:,0], slip_components[:,1];
 	for i in range(len(length)):
 		slip = np.sqrt(leftlat[i]*leftlat[i] + thrust[i]*thrust[i]);
 		area = length[i]*width[i]; # m^2
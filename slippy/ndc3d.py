@@ -0,0 +1,844 @@
+#!/usr/bin/env python
+'''
+Okada 1992 solution for a rectangular dislocation in an elastic half
+space, written with NumPy. This has the same interface as slippy.cdc3d
+and it is used when neither the Fortran nor the Cython module is
+built. The formulas are those in slippy.cdc3d, but they are evaluated
+for broadcast arrays of observation points and dislocations, so one
+call can evaluate every point for every patch. The arrays are split
+into chunks of about chunk_size elements so that the intermediate
+arrays stay in the cache.
+'''
+import numpy as np
+
+TOL = 1e-8
+
+# number of array elements evaluated at once
+CHUNK_SIZE = 2**13
+
+
+def _shared(eps,eta,zeta,c,y,sindel,cosdel,gradients):
+  '''
+  returns the quantities used by the terms of Okada 1992 for one
+  corner of the dislocation. The gradient terms are only computed if
+  gradients is True
+  '''
+  s = {}
+  d = c - zeta
+  q = y*sindel - d*cosdel
+  R = np.sqrt(eps**2 + eta**2 + q**2)
+  X = np.sqrt(eps**2 + q**2)
+  y_bar = eta*cosdel + q*sindel
+  d_bar = eta*sindel - q*cosdel
+  c_bar = d_bar + zeta
+  h = q*cosdel - zeta
+  Rd = R + d_bar
+
+  theta = np.where(np.abs(q) >= TOL,np.arctan(eps*eta/(q*R)),0.0)
+
+  reps = np.abs(R + eps) < TOL
+  logReps = np.where(reps,-np.log(R - eps),np.log(R + eps))
+  X11 = np.where(reps,0.0,1.0/(R*(R + eps)))
+  X32 = np.where(reps,0.0,(2*R + eps)/(R**3*(R + eps)**2))
+
+  reta = np.abs(R + eta) < TOL
+  logReta = np.where(reta,-np.log(R - eta),np.log(R + eta))
+  Y11 = np.where(reta,0.0,1.0/(R*(R + eta)))
+  Y32 = np.where(reta,0.0,(2*R + eta)/(R**3*(R + eta)**2))
+
+  vertical = np.abs(cosdel) < TOL
+  I3 = np.where(vertical,
+                0.5*(eta/Rd + (y_bar*q)/Rd**2 - logReta),
+                y_bar/(cosdel*Rd) - 1/cosdel**2*
+                (logReta - sindel*np.log(Rd)))
+  I4 = np.where(vertical | (np.abs(eps) < TOL),
+                0.5*(eps*y_bar)/Rd**2,
+                (sindel*eps)/(cosdel*Rd) +
+                2.0/cosdel**2*np.arctan((eta*(X + q*cosdel) +
+                X*(R + X)*sindel)/(eps*(R + X)*cosdel)))
+  I2 = np.log(Rd) + I3*sindel
+  I1 = -eps/Rd*cosdel - I4*sindel
+  Z32 = sindel/R**3 - h*Y32
+
+  s.update(eps=eps,eta=eta,zeta=zeta,q=q,R=R,y_bar=y_bar,d_bar=d_bar,
+           c_bar=c_bar,Rd=Rd,theta=theta,logReps=logReps,
+           logReta=logReta,X11=X11,X32=X32,Y11=Y11,Y32=Y32,I1=I1,I2=I2,
+           I3=I3,I4=I4,Z32=Z32)
+  if not gradients:
+    return s
+
+  X53 = np.where(reps,0.0,(8*R**2 + 9*R*eps + 3*eps**2)/
+                          (R**5*(R + eps)**3))
+  Y53 = np.where(reta,0.0,(8*R**2 + 9*R*eta + 3*eta**2)/
+                          (R**5*((R + eta)**3)))
+  Y0 = Y11 - eps**2*Y32
+  Z53 = 3*sindel/R**5 - h*Y53
+  Z0 = Z32 - eps**2*Z53
+  D11 = 1.0/(R*Rd)
+  J2 = eps*y_bar/Rd*D11
+  J5 = -(d_bar + y_bar**2/Rd)*D11
+  K1 = np.where(vertical,eps*q/Rd*D11,eps/cosdel*(D11 - Y11*sindel))
+  K3 = np.where(vertical,sindel/Rd*(eps**2*D11 - 1),
+                1.0/cosdel*(q*Y11 - y_bar*D11))
+  J3 = np.where(vertical,-eps/Rd**2*(q**2*D11 - 0.5),
+                1.0/cosdel*(K1 - J2*sindel))
+  J6 = np.where(vertical,-y_bar/Rd**2*(eps**2*D11 - 0.5),
+                1.0/cosdel*(K3 - J5*sindel))
+  K4 = eps*Y11*cosdel - K1*sindel
+  K2 = 1.0/R + K3*sindel
+  J4 = -eps*Y11 - J2*cosdel + J3*sindel
+  J1 = J5*cosdel - J6*sindel
+  s.update(X53=X53,Y53=Y53,Y0=Y0,Z0=Z0,D11=D11,J1=J1,J2=J2,J3=J3,J4=J4,
+           J5=J5,J6=J6,K1=K1,K2=K2,K3=K3,K4=K4)
+  s['E'] = sindel/R - y_bar*q/R**3
+  s['F'] = d_bar/R**3 + eps**2*Y32*sindel
+  s['G'] = 2.0*X11*sindel - y_bar*q*X32
+  s['H'] = d_bar*q*X32 + eps*q*Y32*sindel
+  s['P'] = cosdel/R**3 + q*Y32*sindel
+  s['Q'] = 3*c_bar*d_bar/R**5 - (zeta*Y32 + Z32 + Z0)*sindel
+  s['Ep'] = cosdel/R + d_bar*q/R**3
+  s['Fp'] = y_bar/R**3 + eps**2*Y32*cosdel
+  s['Gp'] = 2.0*X11*cosdel + d_bar*q*X32
+  s['Hp'] = y_bar*q*X32 + eps*q*Y32*cosdel
+  s['Pp'] = sindel/R**3 - q*Y32*cosdel
+  s['Qp'] = (3*c_bar*y_bar/R**5 +
+             q*Y32 - (zeta*Y32 + Z32 + Z0)*cosdel)
+  return s
+
+
+def _f(s,alpha,sindel,cosdel,output,term,direction):
+  '''
+  evaluates one term of Okada 1992 from the quantities returned by
+  _shared. output is 0 for displacements and 1, 2, or 3 for the x, y,
+  or z derivatives. term is 0, 1, 2, or 3 for the A, B, C, and D
+  terms. direction is the slip direction
+  '''
+  eps,eta,zeta,q,R = s['eps'],s['eta'],s['zeta'],s['q'],s['R']
+  y_bar,d_bar,c_bar = s['y_bar'],s['d_bar'],s['c_bar']
+  theta,logReps,logReta = s['theta'],s['logReps'],s['logReta']
+  X11,X32,Y11,Y32 = s['X11'],s['X32'],s['Y11'],s['Y32']
+  I1,I2,I3,I4,Z32 = s['I1'],s['I2'],s['I3'],s['I4'],s['Z32']
+  if output > 0:
+    X53,Y0,Z0,D11 = s['X53'],s['Y0'],s['Z0'],s['D11']
+    J1,J2,J3,J4,J5,J6 = s['J1'],s['J2'],s['J3'],s['J4'],s['J5'],s['J6']
+    K1,K2,K3,K4 = s['K1'],s['K2'],s['K3'],s['K4']
+    E,F,G,H,P,Q = s['E'],s['F'],s['G'],s['H'],s['P'],s['Q']
+    Ep,Fp,Gp,Hp,Pp,Qp = s['Ep'],s['Fp'],s['Gp'],s['Hp'],s['Pp'],s['Qp']
+
+  if output == 0:
+    if direction == 0:
+      if term == 0:
+        f1 = theta/2.0 + alpha/2.0*eps*q*Y11
+        f2 = alpha/2.0*q/R
+        f3 = (1-alpha)/2.0*logReta - alpha/2.0*q**2*Y11
+
+      if term == 1:
+        f1 = -eps*q*Y11 - theta - (1- alpha)/alpha*I1*sindel
+        f2 = -q/R + (1-alpha)/alpha*y_bar/s['Rd']*sindel
+        f3 = q**2*Y11 - (1 - alpha)/alpha*I2*sindel
+
+      if term == 2:
+        f1 = (1-alpha)*eps*Y11*cosdel - alpha*eps*q*Z32
+        f2 = ((1-alpha)*(cosdel/R + 2*q*Y11*sindel) -
+              alpha*c_bar*q/R**3)
+        f3 = ((1-alpha)*q*Y11*cosdel - alpha*(c_bar*eta/R**3 -
+              zeta*Y11 + eps**2*Z32))
+
+    if direction == 1:
+      if term == 0:
+        f1 = alpha/2.0*q/R
+        f2 = theta/2.0 + alpha/2.0*eta*q*X11
+        f3 = (1-alpha)/2.0*logReps - alpha/2.0*q**2*X11
+
+      if term == 1:
+        f1 = -q/R + (1 - alpha)/alpha*I3*sindel*cosdel
+        f2 = (-eta*q*X11 - theta - (1-alpha)/alpha*
+              eps/s['Rd']*sindel*cosdel)
+        f3 = q**2*X11 + (1-alpha)/alpha*I4*sindel*cosdel
+
+      if term == 2:
+        f1 = ((1-alpha)*cosdel/R - q*Y11*sindel - alpha*c_bar*q/R**3)
+        f2 = (1 - alpha)*y_bar*X11 - alpha*c_bar*eta*q*X32
+        f3 = (-d_bar*X11 - eps*Y11*sindel -
+              alpha*c_bar*(X11 - q**2*X32))
+
+    if direction == 2:
+      if term == 0:
+        f1 = -(1 - alpha)/2.0*logReta - alpha/2.0*q**2*Y11
+        f2 = -(1 - alpha)/2.0*logReps - alpha/2.0*q**2*X11
+        f3 = theta/2.0 - alpha/2.0*q*(eta*X11 + eps*Y11)
+
+      if term == 1:
+        f1 = q**2*Y11 - (1 - alpha)/alpha*I3*sindel**2
+        f2 = (q**2*X11 +
+              (1 - alpha)/alpha*eps / s['Rd']*sindel**2)
+        f3 = (q*(eta*X11 + eps*Y11) - theta -
+              (1 - alpha)/alpha*I4*sindel**2)
+
+      if term == 2:
+        f1 = (-(1 - alpha)*(sindel/R + q*Y11*cosdel) -
+              alpha*(zeta*Y11 - q**2*Z32))
+        f2 = ((1 - alpha)*2.0*eps*Y11 *sindel + d_bar*X11 -
+              alpha*c_bar*(X11 - q**2*X32))
+        f3 = ((1 - alpha)*(y_bar*X11 + eps*Y11*cosdel) +
+              alpha*q*(c_bar*eta*X32 + eps*Z32))
+
+  if output == 1:
+    if direction == 0:
+      if term == 0:
+        f1 = -(1-alpha)/2.0*q*Y11 - alpha/2.0*eps**2*q*Y32
+        f2 = -alpha/2.0*eps*q/R**3
+        f3 = (1 - alpha)/2.0*eps*Y11 + alpha/2.0*eps*q**2*Y32
+      if term == 1:
+        f1 =  eps**2*q*Y32 -(1 - alpha)/alpha*J1*sindel
+        f2 =  eps*q/R**3 -(1 - alpha)/alpha*J2*sindel
+        f3 = -eps*q**2*Y32 -(1 - alpha)/alpha*J3*sindel
+      if term == 2:
+        f1 = (1 - alpha)*Y0*cosdel - alpha*q*Z0
+        f2 = (-(1 - alpha) *eps*(cosdel/R**3 +
+              2.0*q*Y32*sindel) + alpha* 3.0*c_bar*eps*q/R**5)
+        f3 = (-(1 - alpha)*eps*q*Y32*cosdel +
+              alpha*eps*(3.0*c_bar*eta/R**5 - zeta*Y32 - Z32 - Z0))
+
+    if direction == 1:
+      if term == 0:
+        f1 = -alpha/2.0*eps*q/R**3
+        f2 = -q/2.0*Y11 - alpha/2.0*eta*q/R**3
+        f3 = (1 - alpha)/2.0*1.0/R + alpha/2.0*q**2/R**3
+
+      if term == 1:
+        f1 = eps*q/R**3 + (1 - alpha)/alpha*J4*sindel*cosdel
+        f2 = (eta*q/R**3 + q*Y11 +
+              (1 - alpha)/alpha*J5*sindel*cosdel)
+        f3 = (-q**2/R**3 + (1- alpha)/alpha*J6*sindel*cosdel)
+
+      if term == 2:
+        f1 = (-(1 - alpha)* eps/R**3*cosdel +
+             eps*q*Y32*sindel + alpha*3*c_bar*eps*q/R**5)
+        f2 = (-(1 - alpha)* y_bar/R**3 + alpha*3*c_bar*eta*q/R**5)
+        f3 = (d_bar/R**3 - Y0*sindel + alpha*c_bar/R**3*(1 - 3*q**2/R**2))
+
+    if direction == 2:
+      if term == 0:
+        f1 = -(1 - alpha)/2.0*eps*Y11 + alpha/2.0*eps*q**2*Y32
+        f2 = (-(1 - alpha)/2.0*1.0/R + alpha/2.0*q**2/R**3)
+        f3 = -(1 - alpha)/2.0*q*Y11 - alpha/2.0*q**3*Y32
+
+      if term == 1:
+        f1 = (-eps*q**2*Y32 - (1 - alpha)/alpha*J4*sindel**2)
+        f2 = (-q**2/R**3 - (1 - alpha)/alpha*J5*sindel**2)
+        f3 = q**3*Y32 - (1 - alpha)/alpha*J6*sindel**2
+
+      if term == 2:
+        f1 = ((1 - alpha)*eps/R**3*sindel + eps*q*Y32*cosdel +
+              alpha*eps*(3*c_bar*eta/R**5 - 2.0*Z32 - Z0))
+        f2 = ((1 - alpha)*2.0*Y0*sindel - d_bar/R**3 +
+              alpha*c_bar/R**3*(1 - 3.0*q**2/R**2))
+        f3 = (-(1- alpha)*(y_bar/R**3 - Y0*cosdel) -
+              alpha*(3*c_bar*eta*q/R**5 - q *Z0))
+
+  if output == 2:
+    if direction == 0:
+      if term == 0:
+        f1 = (1-alpha)/2.0*eps*Y11*sindel + d_bar/2.0*X11 + alpha/2.0*eps*F
+        f2 = alpha/2.0*E
+        f3 = (1 - alpha)/2.0*(cosdel/R + q*Y11*sindel) - alpha/2.0*q*F
+
+      if term == 1:
+        f1 = -eps*F - d_bar*X11 + (1- alpha)/alpha*(eps*Y11 + J4)*sindel
+        f2 = -E + (1- alpha)/alpha*(1.0/R + J5)*sindel
+        f3 = q*F - (1 - alpha)/alpha*(q*Y11 - J6)*sindel
+
+      if term == 2:
+        f1 = -(1.0 - alpha)*eps*P*cosdel - alpha*eps*Q
+        f2 = (2*(1.0 - alpha)*(d_bar/R**3 - Y0*sindel)*sindel -
+              y_bar/R**3*cosdel -
+              alpha*((c_bar + d_bar)/R**3*sindel -
+              eta/R**3 - 3.0*c_bar*y_bar*q/R**5))
+        f3 = (-(1-alpha)*q/R**3 +
+              (y_bar/R**3 - Y0*cosdel)*sindel +
+              alpha*((c_bar + d_bar)/R**3*cosdel +
+              3.0*c_bar*d_bar*q/R**5 - (Y0*cosdel + q*Z0)*sindel))
+
+    if direction == 1:
+      if term == 0:
+        f1 = alpha/2.0*E
+        f2 = (1 -alpha)/2.0*d_bar*X11 + eps/2.0*Y11*sindel + alpha/2.0*eta*G
+        f3 = (1 -alpha)/2.0*y_bar*X11- alpha/2.0*q*G
+
+      if term == 1:
+        f1 = -E + (1- alpha)/alpha*J1*sindel*cosdel
+        f2 = -eta*G - eps*Y11*sindel + (1- alpha)/alpha*J2*sindel*cosdel
+        f3 = q*G + (1- alpha)/alpha*J3*sindel*cosdel
+
+      if term == 2:
+        f1 = (-(1 - alpha)*eta/R**3 + Y0*sindel**2 -
+              alpha*((c_bar+d_bar)/R**3*sindel -
+              3*c_bar*y_bar*q/R**5))
+        f2 = ((1 - alpha)*(X11 - y_bar**2*X32) -
+              alpha*c_bar*((d_bar + 2.0*q*cosdel)*X32 - y_bar*eta*q*X53))
+        f3 = (eps*P*sindel + y_bar*d_bar*X32 +
+              alpha*c_bar*((y_bar + 2*q*sindel)*X32 -
+              y_bar*q**2*X53))
+
+    if direction == 2:
+      if term == 0:
+        f1 = -(1 - alpha)/2.0*(cosdel/R + q*Y11*sindel) - alpha/2.0*q*F
+        f2 = -(1 - alpha)/2.0*y_bar*X11 - alpha/2.0*q*G
+        f3 = (1 - alpha)/2.0*(d_bar*X11 + eps*Y11*sindel) + alpha/2.0*q*H
+
+      if term == 1:
+        f1 = q*F - (1- alpha)/alpha*J1*sindel**2
+        f2 = q*G - (1- alpha)/alpha*J2*sindel**2
+        f3 = -q*H - (1- alpha)/alpha*J3*sindel**2
+
+      if term == 2:
+        f1 = ((1 - alpha)*(q/R**3 + Y0*sindel*cosdel) +
+              alpha*(zeta/R**3*cosdel +
+              3.0*c_bar*d_bar*q/R**5 - q*Z0*sindel))
+        f2 = (-(1-alpha)*2.0*eps*P*sindel - y_bar*d_bar*X32 +
+              alpha*c_bar*((y_bar + 2.0*q*sindel)*X32 -
+              y_bar*q**2*X53))
+        f3 = (-(1 - alpha)*(eps*P*cosdel - X11 + y_bar**2*X32) +
+              alpha*c_bar*((d_bar + 2.0*q*cosdel)*X32 - y_bar*eta*q*X53) +
+              alpha*eps*Q)
+
+  if output == 3:
+    if direction == 0:
+      if term == 0:
+        f1 = ((1 - alpha)/2.0*eps *Y11*cosdel + y_bar/2.0*X11 +
+              alpha/2.0*eps*Fp)
+        f2 = alpha/2.0*Ep
+        f3 = -(1 - alpha)/2.0*(sindel/R - q*Y11*cosdel) - alpha/2.0*q*Fp
+
+      if term == 1:
+        f1 = -eps*Fp - y_bar*X11 + (1 - alpha)/alpha*K1*sindel
+        f2 = -Ep + (1 - alpha)/alpha*y_bar*D11*sindel
+        f3 = q*Fp + (1 - alpha)/alpha*K2*sindel
+
+      if term == 2:
+        f1 = (1 - alpha)*eps*Pp*cosdel - alpha*eps*Qp
+        f2 = (2*(1-alpha)*(y_bar/R**3 - Y0*cosdel)*sindel +
+              d_bar/R**3*cosdel -
+              alpha*((c_bar + d_bar)/R**3*cosdel +
+              3*c_bar*d_bar*q/R**5))
+        f3 = ((y_bar/R**3 - Y0*cosdel)*cosdel -
+              alpha*((c_bar + d_bar)/R**3*sindel -
+              3*c_bar*y_bar*q/R**5 - Y0*sindel**2 +
+              q*Z0*cosdel))
+
+      if term == 3:
+        f1   = (1-alpha)*eps*Y11*cosdel - alpha*eps*q*Z32
+        f2   = ((1-alpha)*(cosdel/R + 2*q*Y11*sindel) -
+                alpha*c_bar*q/R**3)
+        f3   = ((1-alpha)*q*Y11*cosdel -
+                alpha*(c_bar*eta/R**3 -
+                zeta*Y11 + eps**2*Z32))
+
+    if direction == 1:
+      if term == 0:
+        f1 = alpha/2.0*Ep
+        f2 = (1 - alpha)/2.0*y_bar*X11 + eps/2.0*Y11*cosdel + alpha/2.0*eta*Gp
+        f3 = -(1 - alpha)/2.0*d_bar*X11 - alpha/2.0*q*Gp
+
+      if term == 1:
+        f1 = -Ep - (1 - alpha)/alpha*K3*sindel*cosdel
+        f2 = (-eta*Gp - eps*Y11*cosdel -
+              (1 - alpha)/alpha*eps*D11*sindel*cosdel)
+        f3 = q*Gp - (1 - alpha)/alpha*K4*sindel*cosdel
+
+      if term == 2:
+        f1 = (-q/R**3 + Y0*sindel*cosdel -
+              alpha*((c_bar + d_bar)/R**3*cosdel +
+              3*c_bar*d_bar*q/R**5))
+        f2 = ((1 - alpha)*y_bar*d_bar*X32 -
+              alpha*c_bar*((y_bar - 2*q*sindel)*X32 + d_bar*eta*q*X53))
+        f3 = (-eps*Pp*sindel + X11 - d_bar**2*X32 -
+              alpha*c_bar*((d_bar - 2*q*cosdel)*X32 -
+              d_bar*q**2*X53))
+
+      if term == 3:
+        f1  = ((1-alpha)*cosdel/R - q*Y11*sindel -
+               alpha*c_bar*q/R**3)
+        f2  = (1 - alpha)*y_bar*X11 - alpha*c_bar*eta*q*X32
+        f3  = (-d_bar*X11 - eps*Y11*sindel -
+               alpha*c_bar*(X11 - q**2*X32))
+
+    if direction == 2:
+      if term == 0:
+        f1 = (1 - alpha)/2.0*(sindel/R - q*Y11*cosdel) - alpha/2.0*q*Fp
+        f2 = (1 - alpha)/2.0*d_bar*X11 - alpha/2.0*q*Gp
+        f3 = (1 - alpha)/2.0*(y_bar*X11 + eps*Y11*cosdel) + alpha/2.0*q*Hp
+
+      if term == 1:
+        f1 = q*Fp + (1 - alpha)/alpha*K3*sindel**2
+        f2 = q*Gp + (1 - alpha)/alpha*eps*D11*sindel**2
+        f3 = -q*Hp + (1 - alpha)/alpha*K4*sindel**2
+
+      if term == 2:
+        f1 = (-eta/R**3 + Y0*cosdel**2 -
+              alpha*(zeta/R**3*sindel-
+              3*c_bar*y_bar*q/R**5 -
+              Y0*sindel**2 + q*Z0*cosdel))
+        f2 = ((1 - alpha)*2*eps*Pp*sindel - X11 + d_bar**2*X32 -
+              alpha*c_bar*((d_bar - 2*q*cosdel)*X32 -
+              d_bar*q**2*X53))
+        f3 = ((1 - alpha)*(eps*Pp*cosdel + y_bar*d_bar*X32) +
+              alpha*c_bar*((y_bar - 2*q*sindel)*X32 + d_bar*eta*q*X53) +
+              alpha*eps*Qp)
+
+      if term == 3:
+        f1 = (-(1 - alpha)*(sindel/R + q*Y11*cosdel) -
+              alpha*(zeta*Y11 - q**2*Z32))
+        f2 = ((1 - alpha)*2.0*eps*Y11 *sindel + d_bar*X11 -
+              alpha*c_bar*(X11 - q**2*X32))
+        f3 = ((1 - alpha)*(y_bar*X11 + eps*Y11*cosdel) +
+              alpha*q*(c_bar*eta*X32 + eps*Z32))
+
+  return f1,f2,f3
+
+
+def _okada92(alpha,x,y,z,c,delta,strike_width,dip_width,U,gradients):
+  '''
+  evaluates Okada 1992 for arrays which have already been broadcast
+  to the same shape. U is a list with the slip in each direction, and
+  an entry is None if the displacements for unit slip in that
+  direction are wanted. Returns a list with an entry for each slip
+  direction, where each entry is a list with the displacements and,
+  if gradients is True, the x, y, and z derivatives of the
+  displacements. Each of those is a list of three arrays, one for
+  each displacement component
+  '''
+  pi = 3.141592653589793
+  delta = delta*(pi/180)
+  sindel = np.sin(delta)
+  cosdel = np.cos(delta)
+
+  L = strike_width[1] - strike_width[0]
+  W = dip_width[1] - dip_width[0]
+
+  x = x - strike_width[0]
+  y = y - dip_width[0]*cosdel
+  c = c - dip_width[0]*sindel
+
+  p = y*cosdel + (c - z)*sindel
+  p_ = y*cosdel + (c + z)*sindel
+
+  outputs = [0,1,2,3] if gradients else [0]
+  # slip directions which do not contribute are skipped
+  directions = [i for i in range(3) if (U[i] is None) or np.any(U[i] != 0.0)]
+  # the A, B, C, and D terms are evaluated with the source at depth z
+  # and the A term is also evaluated for the image source at -z. Each
+  # term is summed over the four corners of the dislocation with the
+  # signs +, -, -, +
+  sums = {}
+  for image,zeta,pp in [(False,z,p),(True,-z,p_)]:
+    corners = [(x,pp,1.0),(x,pp - W,-1.0),(x - L,pp,-1.0),
+               (x - L,pp - W,1.0)]
+    for k,(eps,eta,sign) in enumerate(corners):
+      s = _shared(eps,eta,zeta,c,y,sindel,cosdel,gradients)
+      for o in outputs:
+        if image:
+          terms = ['hatA']
+        elif o == 3:
+          terms = ['A','B','C','D']
+        else:
+          terms = ['A','B','C']
+
+        for itr in directions:
+          for t in terms:
+            term = {'A':0,'hatA':0,'B':1,'C':2,'D':3}[t]
+            f = _f(s,alpha,sindel,cosdel,o,term,itr)
+            if k == 0:
+              sums[o,itr,t] = list(f)
+            elif sign > 0:
+              sums[o,itr,t] = [a + b for a,b in zip(sums[o,itr,t],f)]
+            else:
+              sums[o,itr,t] = [a - b for a,b in zip(sums[o,itr,t],f)]
+
+      del s
+
+  out = []
+  for itr in range(3):
+    if itr not in directions:
+      out += [None]
+      continue
+
+    Ui = 1.0 if U[itr] is None else U[itr]
+    out_itr = []
+    for o in outputs:
+      uA1,uA2,uA3 = sums[o,itr,'A']
+      uhatA1,uhatA2,uhatA3 = sums[o,itr,'hatA']
+      uB1,uB2,uB3 = sums[o,itr,'B']
+      uC1,uC2,uC3 = sums[o,itr,'C']
+      if o == 3:
+        uD1,uD2,uD3 = sums[o,itr,'D']
+        ux = Ui/(2*pi)*(uA1 + uhatA1 + uB1 + uD1 + z*uC1)
+        uy = (Ui/(2*pi)*((uA2 + uhatA2 + uB2 + uD2 + z*uC2)*cosdel -
+              (uA3 + uhatA3 + uB3 + uD3 + z*uC3)*sindel))
+        uz = (Ui/(2*pi)*((uA2 + uhatA2 + uB2 - uD2 - z*uC2)*sindel +
+              (uA3 + uhatA3 + uB3 - uD3 - z*uC3)*cosdel))
+      else:
+        ux = Ui/(2*pi)*(uA1 - uhatA1 + uB1 + z*uC1)
+        uy = (Ui/(2*pi)*((uA2 - uhatA2 + uB2 + z*uC2)*cosdel -
+              (uA3 - uhatA3 + uB3 + z*uC3)*sindel))
+        uz = (Ui/(2*pi)*((uA2 - uhatA2 + uB2 - z*uC2)*sindel +
+              (uA3 - uhatA3 + uB3 - z*uC3)*cosdel))
+
+      out_itr += [[ux,uy,uz]]
+
+    out += [out_itr]
+
+  return out
+
+
+def okada92(alpha,pos,c,delta,strike_width,dip_width,U=None,
+            want_gradients=True,chunk_size=CHUNK_SIZE):
+  '''
+  evaluates the Okada 1992 solution for broadcast arrays of
+  observation points and dislocations. For example, pos can have
+  shape (N,1,3) and the dislocation parameters can have shape (1,M)
+  to evaluate N points for M dislocations
+
+  Parameters
+  ----------
+    alpha : float
+      (lambda + mu)/(lambda + 2*mu)
+
+    pos : (...,3) array
+      observation points in the coordinate system of each dislocation
+
+    c : (...) array
+      depth to the origin of each dislocation
+
+    delta : (...) array
+      dip of each dislocation [degrees]
+
+    strike_width : (...,2) array
+      range of each dislocation along strike
+
+    dip_width : (...,2) array
+      range of each dislocation along dip
+
+    U : (...,3) array, optional
+      left-lateral, thrust, and tensile slip on each dislocation. If
+      this is not given then the displacements are returned for unit
+      slip in each direction
+
+    want_gradients : bool, optional
+      whether to compute the displacement gradients
+
+    chunk_size : int, optional
+      approximate number of points evaluated at once. The chunks are
+      taken along the first axis of the broadcast shape
+
+  Returns
+  -------
+    disp : (...,3) array or (...,3,3) array
+      displacements. If U is not given then the last axis is the slip
+      direction
+
+    derr : (...,3,3) array or (...,3,3,3) array
+      displacement gradients, where the first of the three axes is the
+      displacement direction and the second is the derivative
+      direction. If U is not given then the last axis is the slip
+      direction. None is returned if want_gradients is False
+
+  '''
+  pos = np.asarray(pos,dtype=float)
+  c = np.asarray(c,dtype=float)
+  delta = np.asarray(delta,dtype=float)
+  strike_width = np.asarray(strike_width,dtype=float)
+  dip_width = np.asarray(dip_width,dtype=float)
+  unit = U is None
+  if unit:
+    U = np.zeros(3)
+  else:
+    U = np.asarray(U,dtype=float)
+
+  inputs = [pos[...,0],pos[...,1],pos[...,2],c,delta,
+            strike_width[...,0],strike_width[...,1],
+            dip_width[...,0],dip_width[...,1],
+            U[...,0],U[...,1],U[...,2]]
+  shape = np.broadcast_shapes(*[a.shape for a in inputs])
+  # the chunks are taken along the first axis, so a scalar problem is
+  # treated as a one element array
+  full_shape = shape if len(shape) > 0 else (1,)
+  inputs = [np.broadcast_to(a,shape).reshape(full_shape) for a in inputs]
+
+  Nd = 3 if unit else 1
+  disp = np.zeros(full_shape + (3,Nd))
+  if want_gradients:
+    derr = np.zeros(full_shape + (3,3,Nd))
+  else:
+    derr = None
+
+  step = max(chunk_size//max(int(np.prod(full_shape[1:])),1),1)
+  with np.errstate(divide='ignore',invalid='ignore'):
+    for i in range(0,full_shape[0],step):
+      rows = slice(i,i + step)
+      x,y,z,ci,di,sw0,sw1,dw0,dw1,U0,U1,U2 = [a[rows] for a in inputs]
+      if unit:
+        Ui = [None,None,None]
+      else:
+        Ui = [U0,U1,U2]
+
+      out = _okada92(alpha,x,y,z,ci,di,(sw0,sw1),(dw0,dw1),Ui,
+                     want_gradients)
+      for itr,out_itr in enumerate(out):
+        if out_itr is None:
+          continue
+
+        j = itr if unit else 0
+        # the contributions from each slip direction are summed
+        for k in range(3):
+          disp[rows,...,k,j] += out_itr[0][k]
+          if want_gradients:
+            for o in range(3):
+              derr[rows,...,k,o,j] += out_itr[o + 1][k]
+
+  disp = disp.reshape(shape + (3,Nd))
+  if want_gradients:
+    derr = derr.reshape(shape + (3,3,Nd))
+
+  if not unit:
+    disp = disp[...,0]
+    if want_gradients:
+      derr = derr[...,0]
+
+  return disp,derr
+
+
+def dc3d(alpha,pos,c,delta,strike_width,dip_width,U,want_gradients=True):
+  '''
+  evaluates Okada 1992 at one observation point. This has the same
+  interface as slippy.cdc3d.dc3d, so the displacement gradients are
+  returned with the derivative direction along the first axis
+
+  Returns
+  -------
+    status : int
+      always 0
+
+    disp : (3,) array
+
+    derr : (3,3) array or None
+
+  '''
+  disp,derr = okada92(alpha,pos,c,delta,strike_width,dip_width,U,
+                      want_gradients=want_gradients)
+  if want_gradients:
+    derr = derr.T
+
+  return 0,disp,derr
+
+
+def dc3d_batch(alpha,pos,c,delta,strike_width,dip_width,U,out_disp,
+               out_derr=None):
+  '''
+  evaluates Okada 1992 for every observation point in pos and writes
+  the results into the preallocated output buffers. This has the same
+  interface as slippy.cdc3d.dc3d_batch, except that the arguments can
+  be broadcast arrays and U can be None, as in okada92
+
+  Parameters
+  ----------
+    pos : (N,3) array
+      observation points
+
+    out_disp : (N,3) array
+      displacements are written here
+
+    out_derr : (N,3,3) array, optional
+      displacement gradients are written here, where the second axis
+      is the displacement direction and the third axis is the
+      derivative direction. The gradients are not computed if this is
+      not given
+
+  Returns
+  -------
+    status : int
+      always 0
+  '''
+  N = len(pos)
+  if out_disp.shape[0] != N:
+    raise ValueError('out_disp must have the same length as pos')
+
+  want_derr = out_derr is not None
+  if want_derr and (out_derr.shape[0] != N):
+    raise ValueError('out_derr must have the same length as pos')
+
+  disp,derr = okada92(alpha,pos,c,delta,strike_width,dip_width,U,
+                      want_gradients=want_derr)
+  out_disp[...] = disp
+  if want_derr:
+    out_derr[...] = derr
+
+  return 0
+
+
+def _point_source(alpha,x,y,z,depth,sindel,cosdel):
+  '''
+  displacements from Okada 1992 for unit strike, dip, and tensile
+  potency on a point source. These are the displacement terms of the
+  subroutines DC3D0, UA0, UB0, and UC0 in DC3D.f. Returns a list with
+  the three displacement components for each slip direction
+  '''
+  alp1 = (1.0 - alpha)/2.0
+  alp2 = alpha/2.0
+  alp3 = (1.0 - alpha)/alpha
+  alp4 = 1.0 - alpha
+  alp5 = alpha
+  sdsd = sindel*sindel
+  sdcd = sindel*cosdel
+  s2d = 2.0*sdcd
+  c2d = cosdel*cosdel - sdsd
+  x = np.where(np.abs(x) < 1e-6,0.0,x)
+  y = np.where(np.abs(y) < 1e-6,0.0,y)
+
+  # at the surface the terms from part A for the real and image sources
+  # cancel and the terms from part C are multiplied by zero, so only
+  # part B is evaluated
+  surface = not np.any(z)
+  u = [[0.0,0.0,0.0] for i in range(3)]
+  for image in ((True,) if surface else (False,True)):
+    d = depth - z if image else depth + z
+    d = np.where(np.abs(d) < 1e-6,0.0,d)
+    p = y*cosdel + d*sindel
+    q = y*sindel - d*cosdel
+    s = p*sindel + q*cosdel
+    t = p*cosdel - q*sindel
+    xy = x*y
+    x2 = x*x
+    y2 = y*y
+    d2 = d*d
+    r2 = x2 + y2 + d2
+    r = np.sqrt(r2)
+    r3 = r*r2
+    r5 = r3*r2
+    a3 = 1.0 - 3.0*x2/r2
+    a5 = 1.0 - 5.0*x2/r2
+    qr = 3.0*q/r5
+    qrx = 5.0*qr*x/r2
+    if not surface:
+      # part A
+      ua = [[alp1*q/r3 + alp2*x2*qr,
+             alp1*x/r3*sindel + alp2*xy*qr,
+             -alp1*x/r3*cosdel + alp2*x*d*qr],
+            [alp2*x*p*qr,
+             alp1*s/r3 + alp2*y*p*qr,
+             -alp1*t/r3 + alp2*d*p*qr],
+            [alp1*x/r3 - alp2*x*q*qr,
+             alp1*t/r3 - alp2*y*q*qr,
+             alp1*s/r3 - alp2*d*q*qr]]
+
+    if not image:
+      for i in range(3):
+        for k in range(3):
+          u[i][k] = u[i][k] - ua[i][k]
+
+      continue
+
+    # part B
+    c = d + z
+    rd = r + d
+    d12 = 1.0/(r*rd*rd)
+    d32 = d12*(2.0*r + d)/r2
+    d33 = d12*(3.0*r + d)/(r2*rd)
+    fi1 = y*(d12 - x2*d33)
+    fi2 = x*(d12 - y2*d33)
+    fi3 = x/r3 - fi2
+    fi4 = -xy*d32
+    fi5 = 1.0/(r*rd) - x2*d32
+    ub = [[-x2*qr - alp3*fi1*sindel,
+           -xy*qr - alp3*fi2*sindel,
+           -c*x*qr - alp3*fi4*sindel],
+          [-x*p*qr + alp3*fi3*sdcd,
+           -y*p*qr + alp3*fi1*sdcd,
+           -c*p*qr + alp3*fi5*sdcd],
+          [x*q*qr - alp3*fi3*sdsd,
+           y*q*qr - alp3*fi1*sdsd,
+           c*q*qr - alp3*fi5*sdsd]]
+    if surface:
+      u = ub
+      continue
+
+    # part C
+    qr5 = 5.0*q/r2
+    uc = [[-alp4*a3/r3*cosdel + alp5*c*qr*a5,
+           3.0*x/r5*(alp4*y*cosdel + alp5*c*(sindel - y*qr5)),
+           3.0*x/r5*(-alp4*y*sindel + alp5*c*(cosdel + d*qr5))],
+          [alp4*3.0*x*t/r5 - alp5*c*p*qrx,
+           -alp4/r3*(c2d - 3.0*y*t/r2) + alp5*3.0*c/r5*(s - y*p*qr5),
+           -alp4*a3/r3*sdcd + alp5*3.0*c/r5*(t + d*p*qr5)],
+          [3.0*x/r5*(-alp4*s + alp5*(c*q*qr5 - z)),
+           (alp4/r3*(s2d - 3.0*y*s/r2) +
+            alp5*3.0/r5*(c*(t - y + y*q*qr5) - y*z)),
+           (-alp4/r3*(1.0 - a3*sdsd) -
+            alp5*3.0/r5*(c*(s - d + d*q*qr5) - d*z))]]
+    for i in range(3):
+      for k in range(3):
+        u[i][k] = u[i][k] + ua[i][k] + ub[i][k] + z*uc[i][k]
+
+  return u
+
+
+def point_source(alpha,pos,depth,delta,chunk_size=CHUNK_SIZE):
+  '''
+  evaluates the Okada 1992 solution for a point source (DC3D0) with
+  unit strike, dip, and tensile potency. The potency is the slip
+  times the area of the dislocation, so this approximates a small
+  dislocation, or one which is far from the observation points. Only
+  the displacements are computed. The arrays are broadcast as in
+  okada92
+
+  Parameters
+  ----------
+    alpha : float
+      (lambda + mu)/(lambda + 2*mu)
+
+    pos : (...,3) array
+      observation points in the coordinate system of each source, 
+      which is centered above the source
+
+    depth : (...) array
+      depth of each source
+
+    delta : (...) array
+      dip of each source [degrees]
+
+  Returns
+  -------
+    disp : (...,3,3) array
+      displacements, where the last axis is the slip direction. The
+      displacement is zero where the observation point is the source
+
+  '''
+  pos = np.asarray(pos,dtype=float)
+  depth = np.asarray(depth,dtype=float)
+  delta = np.asarray(delta,dtype=float)
+  inputs = [pos[...,0],pos[...,1],pos[...,2],depth,delta]
+  shape = np.broadcast_shapes(*[a.shape for a in inputs])
+  full_shape = shape if len(shape) > 0 else (1,)
+  inputs = [np.broadcast_to(a,shape).reshape(full_shape) for a in inputs]
+
+  disp = np.zeros(full_shape + (3,3))
+  step = max(chunk_size//max(int(np.prod(full_shape[1:])),1),1)
+  with np.errstate(divide='ignore',invalid='ignore'):
+    for i in range(0,full_shape[0],step):
+      rows = slice(i,i + step)
+      x,y,z,di,de = [a[rows] for a in inputs]
+      sindel = np.sin(np.radians(de))
+      cosdel = np.cos(np.radians(de))
+      # the dip constants are rounded as in DCCON0
+      vertical = np.abs(cosdel) < 1e-6
+      cosdel = np.where(vertical,0.0,cosdel)
+      sindel = np.where(vertical,np.sign(sindel),sindel)
+      u = _point_source(alpha,x,y,z,di,sindel,cosdel)
+      for j in range(3):
+        for k in range(3):
+          disp[rows,...,k,j] = u[j][k]/(2*np.pi)
+
+  # the solution is singular at the source
+  disp[~np.isfinite(disp)] = 0.0
+  return disp.reshape(shape + (3,3))
@@ -1,13 +1,218 @@
+#!/usr/bin/env python
+'''
+Okada 1992 dislocations. The solution is evaluated by one of several
+backends, which are
+
+  fortran : the f2py wrapper of Okada's DC3D, built by setup.py
+  cython : slippy.cdc3d, built by setup_nofortran.py
+  numpy : slippy.ndc3d, which does not need to be built
+
+The backend is chosen with set_backend, the SLIPPY_OKADA_BACKEND
+environment variable, or the "okada_backend" argument of slippy, in
+that order. Otherwise the backend chosen by slippy_bench_kernel for
+this machine is used, or else the first of the above which can be
+imported. Other backends can be added with register_backend.
+'''
 import numpy as np
-try:
-  from slippy.dc3d import dc3dwrapper as dc3d
-except ImportError:
-  print('using cythonized dc3d')
-  from slippy.cdc3d import dc3d
-    
+import slippy.ndc3d
+import collections
+import platform
 import warnings
+import json
+import time
+import os
+
+# dc3d evaluates one observation point and has the interface of
+# slippy.cdc3d.dc3d. dc3d_batch, which can be None, evaluates an array
+# of observation points and has the interface of
+# slippy.cdc3d.dc3d_batch. If vectorized is True then dc3d_batch
+# accepts broadcast arrays, like slippy.ndc3d.okada92, and all patches
+# are evaluated at once. dc3d_unit_batch, which can be None, has the
+# interface of slippy.cdc3d.dc3d_unit_batch
+Backend = collections.namedtuple('Backend',
+                                 ['name','dc3d','dc3d_batch','vectorized',
+                                  'dc3d_unit_batch'],
+                                 defaults=(None,))
+
+ENV_VAR = 'SLIPPY_OKADA_BACKEND'
+
+
+def _load_cython():
+  from slippy.cdc3d import dc3d,dc3d_batch,dc3d_unit_batch
+  return Backend('cython',dc3d,dc3d_batch,False,dc3d_unit_batch)
+
+
+def _load_fortran():
+  from slippy.dc3d import dc3dwrapper
+  return Backend('fortran',dc3dwrapper,None,False)
+
+
+def _load_numpy():
+  return Backend('numpy',slippy.ndc3d.dc3d,slippy.ndc3d.dc3d_batch,True)
+
+
+# functions which import each backend and return a Backend, in order of
+# preference. A function raises ImportError if its backend is not built
+BACKENDS = collections.OrderedDict([('fortran',_load_fortran),
+                                    ('cython',_load_cython),
+                                    ('numpy',_load_numpy)])
+
+# double precision backends which benchmark_backends compares the 
+# others with, in order of preference
+REFERENCE_BACKENDS = ['cython','numpy']
+
+# the backend which is currently used
+_backend = None
+
+
+def register_backend(name,loader):
+  '''
+  adds a backend to the registry
+
+  Parameters
+  ----------
+    name : str
+
+    loader : function
+      takes no arguments and returns a Backend. It should raise an
+      ImportError if the backend is not available
+
+  '''
+  BACKENDS[name] = loader
+
+
+def load_backend(name):
+  '''
+  returns the Backend called name. An ImportError is raised if it is
+  not available
+  '''
+  if name not in BACKENDS:
+    raise ValueError('unknown Okada backend "%s". The backends are %s'
+                     % (name,list(BACKENDS)))
+
+  return BACKENDS[name]()
+
+
+def available_backends():
+  '''
+  returns the names of the backends which can be imported
+  '''
+  out = []
+  for name in BACKENDS:
+    try:
+      load_backend(name)
+      out += [name]
+    except ImportError:
+      pass
+
+  return out
+
+
+def backend_cache_file():
+  '''
+  returns the name of the file where slippy_bench_kernel records the
+  fastest backend for each machine
+  '''
+  cache_home = os.environ.get('XDG_CACHE_HOME',
+                              os.path.join(os.path.expanduser('~'),'.cache'))
+  return os.path.join(cache_home,'slippy','okada_backend.json')
+
+
+def load_backend_choice():
+  '''
+  returns the backend that slippy_bench_kernel chose for this machine,
+  or None
+  '''
+  try:
+    with open(backend_cache_file(),'r') as fin:
+      choices = json.load(fin)
+
+  except (IOError,ValueError):
+    return None
+
+  choice = choices.get(platform.node())
+  if choice is None:
+    return None
 
-def patch_dislocation(x,slip,patch,lamb=3.2e10,mu=3.2e10):
+  return choice['backend']
+
+
+def save_backend_choice(name,results=None):
+  '''
+  records name as the backend for this machine along with the results
+  of benchmark_backends
+  '''
+  file_name = backend_cache_file()
+  try:
+    with open(file_name,'r') as fin:
+      choices = json.load(fin)
+
+  except (IOError,ValueError):
+    choices = {}
+
+  choices[platform.node()] = {'backend':name,
+                              'machine':platform.machine(),
+                              'date':time.strftime('%Y-%m-%d %H:%M:%S'),
+                              'results':results}
+  if not os.path.exists(os.path.dirname(file_name)):
+    os.makedirs(os.path.dirname(file_name))
+
+  with open(file_name,'w') as fout:
+    json.dump(choices,fout,indent=2)
+
+  return file_name
+
+
+def set_backend(name=None,verbose=False):
+  '''
+  sets the backend used to evaluate dislocations
+
+  Parameters
+  ----------
+    name : str, optional
+      name of the backend. If this is None or "auto" then the backend
+      is given by the SLIPPY_OKADA_BACKEND environment variable, or
+      else the choice of slippy_bench_kernel for this machine, or else
+      the first available backend in BACKENDS
+
+    verbose : bool, optional
+      whether to print the name of the backend
+
+  Returns
+  -------
+    backend : Backend
+
+  '''
+  global _backend
+  if name in (None,'auto'):
+    name = os.environ.get(ENV_VAR)
+
+  if name in (None,'auto',''):
+    name = load_backend_choice()
+    available = available_backends()
+    if name not in available:
+      name = available[0]
+
+  _backend = load_backend(name)
+  if verbose:
+    print('using %s dc3d' % name)
+
+  return _backend
+
+
+def get_backend():
+  '''
+  returns the backend used to evaluate dislocations, which is chosen
+  by set_backend if it has not been set
+  '''
+  if _backend is None:
+    set_backend()
+
+  return _backend
+
+
+def patch_dislocation(x,slip,patch,lamb=3.2e10,mu=3.2e10,
+                      want_gradients=True):
   ''' 
   Parameters
   ----------
@@ -22,6 +227,10 @@ def patch_dislocation(x,slip,patch,lamb=3.2e10,mu=3.2e10):
     lamb : float  
 
     mu : float
+
+    want_gradients : bool, optional
+      if False then the displacement derivatives are not computed and 
+      None is returned in their place
   
   Returns
   -------
@@ -35,7 +244,8 @@ def patch_dislocation(x,slip,patch,lamb=3.2e10,mu=3.2e10):
                      patch.patch_to_user([0.5,1.0,0.0]),
                      patch.length,patch.width,
                      patch.strike,patch.dip,
-                     lamb=lamb,mu=mu)
+                     lamb=lamb,mu=mu,
+                     want_gradients=want_gradients)
                       
 def dislocation(x,
                 slip,
@@ -45,7 +255,9 @@ def dislocation(x,
                 strike,
                 dip,
                 lamb=3.2e10,
-                mu=3.2e10):
+                mu=3.2e10,
+                want_gradients=True,
+                backend=None):
   ''' 
   wrapper for the Okada 1992 solution displacements and displacement 
   gradients resulting from a rectangular dislocation. This function 
@@ -76,6 +288,13 @@ def dislocation(x,
     dip : float
       dip of the fault patch in degrees
 
+    want_gradients : bool, optional
+      if False then the displacement gradients are not computed, which 
+      is about four times faster, and None is returned in their place
+
+    backend : Backend, optional
+      backend used to evaluate the solution. Defaults to get_backend()
+
   Returns
   -------
     disp,derr
@@ -90,9 +309,11 @@ def dislocation(x,
 
   '''
   tol = 1e-10
+  if backend is None:
+    backend = get_backend()
 
-  x = np.array(x,copy=True)
-  slip = np.asarray(slip)
+  x = np.array(x,dtype=float,copy=True)
+  slip = np.asarray(slip,dtype=float)
   center = np.asarray(top_center)
 
   # elastic property
@@ -123,22 +344,354 @@ def dislocation(x,
   x = np.einsum('ij,...j',R,x)
 
   disp = np.zeros((len(x),3))
-  derr = np.zeros((len(x),3,3))
-  for i,xi in enumerate(x):
-    out = dc3d(alpha,xi,c,dip,length_range,width_range,slip)
-    status = out[0]
+  if want_gradients:
+    derr = np.zeros((len(x),3,3))
+  else:
+    derr = None
+
+  if backend.dc3d_batch is not None:
+    # evaluate all observation points in a single call
+    x = np.ascontiguousarray(x)
+    status = backend.dc3d_batch(alpha,x,c,dip,length_range,width_range,
+                                slip,disp,derr)
     if status != 0:
       warnings.warn('dc3d returned with error code %s' % status)   
 
-    disp[i,:] = out[1]
-    derr[i,:,:] = out[2].T
+  else:
+    for i,xi in enumerate(x):
+      out = backend.dc3d(alpha,xi,c,dip,length_range,width_range,slip)
+      status = out[0]
+      if status != 0:
+        warnings.warn('dc3d returned with error code %s' % status)   
+
+      disp[i,:] = out[1]
+      if want_gradients:
+        derr[i,:,:] = out[2].T
 
   # return solution to original coordinate system
   disp = np.einsum('ij,...j',R.T,disp)
-  derr = np.einsum('ij,...jk,kl',R.T,derr,R)
+  if want_gradients:
+    derr = np.einsum('ij,...jk,kl',R.T,derr,R)
 
   return disp,derr
 
 
+def unit_slip_dislocations(x,top_center,length,width,strike,dip,
+                           lamb=3.2e10,mu=3.2e10,backend=None):
+  ''' 
+  computes the displacements resulting from unit left-lateral, thrust, 
+  and tensile slip on each of M dislocations. With a vectorized 
+  backend every observation point and dislocation is evaluated at 
+  once. If the backend has dc3d_unit_batch then each dislocation is 
+  evaluated for all slip directions at once. Otherwise dislocation is 
+  called for each dislocation and slip direction
+
+  Parameters
+  ----------
+    x : (N,3) array
+      observation points
+
+    top_center : (M,3) array
+
+    length : (M,) array
+
+    width : (M,) array
+
+    strike : (M,) array
+
+    dip : (M,) array
+
+    backend : Backend, optional
+      Defaults to get_backend()
+
+  Returns
+  -------
+    out : (N,M,3,3) array
+      displacements where the third axis is the displacement direction 
+      and the fourth axis is the slip direction
+
+  '''
+  tol = 1e-10
+  if backend is None:
+    backend = get_backend()
+
+  x = np.asarray(x,dtype=float)
+  top_center = np.asarray(top_center,dtype=float)
+  length = np.asarray(length,dtype=float)
+  width = np.asarray(width,dtype=float)
+  strike = np.asarray(strike,dtype=float)
+  dip = np.asarray(dip,dtype=float)
+  N,M = len(x),len(top_center)
+  if (not backend.vectorized) & (backend.dc3d_unit_batch is not None):
+    if np.any(x[:,2] > tol):
+      raise ValueError('values for z coordinate must be negative')
+
+    # the slip directions are evaluated together for each patch. The 
+    # coordinate transformations are the same as in dislocation
+    alpha = (lamb + mu)/(lamb + 2*mu)
+    out = np.zeros((N,M,3,3))
+    for i in range(M):
+      argZ = np.pi/2.0 - strike[i]*np.pi/180
+      R = np.array([[   np.cos(argZ),   np.sin(argZ),       0.0],
+                    [  -np.sin(argZ),   np.cos(argZ),       0.0],
+                    [            0.0,            0.0,       1.0]])
+      xi = np.array(x,copy=True)
+      xi[:,0] -= top_center[i,0]
+      xi[:,1] -= top_center[i,1]
+      xi = np.ascontiguousarray(np.einsum('ij,...j',R,xi))
+      disp = np.zeros((N,3,3))
+      backend.dc3d_unit_batch(alpha,xi,-top_center[i,2],dip[i],
+                              np.array([-0.5*length[i],0.5*length[i]]),
+                              np.array([-width[i],0.0]),disp)
+      for j in range(3):
+        out[:,i,:,j] = np.einsum('ij,...j',R.T,
+                                 np.ascontiguousarray(disp[:,:,j]))
+
+    return out
+
+  if not backend.vectorized:
+    out = np.zeros((N,M,3,3))
+    for i in range(M):
+      for j in range(3):
+        slip = np.zeros(3)
+        slip[j] = 1.0
+        disp,derr = dislocation(x,slip,top_center[i],length[i],width[i],
+                                strike[i],dip[i],lamb=lamb,mu=mu,
+                                want_gradients=False,backend=backend)
+        out[:,i,:,j] = disp
+
+    return out
+
+  if np.any(x[:,2] > tol):
+    raise ValueError('values for z coordinate must be negative')
+
+  alpha = (lamb + mu)/(lamb + 2*mu)
+  argZ = np.pi/2.0 - strike*np.pi/180
+  c = -top_center[:,2]
+  length_range = np.array([-0.5*length,0.5*length]).T
+  width_range = np.array([-width,0.0*width]).T
+  # (M,3,3) rotation matrices into the okada reference frame
+  R = np.zeros((M,3,3))
+  R[:,0,0] = np.cos(argZ)
+  R[:,0,1] = np.sin(argZ)
+  R[:,1,0] = -np.sin(argZ)
+  R[:,1,1] = np.cos(argZ)
+  R[:,2,2] = 1.0
+  xi = np.empty((N,M,3))
+  xi[...] = x[:,None,:]
+  xi[:,:,0] -= top_center[:,0]
+  xi[:,:,1] -= top_center[:,1]
+  xi = np.einsum('mij,nmj->nmi',R,xi)
+  disp = np.zeros((N,M,3,3))
+  backend.dc3d_batch(alpha,xi,c,dip,length_range,width_range,None,disp)
+  # return solution to original coordinate system
+  return np.einsum('mji,nmjk->nmik',R,disp)
+
+
+# largest value of the relative error of unit_slip_point_sources times 
+# the squared ratio of the distance to the size of the dislocation, 
+# which is about 0.5 for surface observation points and random 
+# dislocations. This is doubled to be safe
+POINT_SOURCE_ERROR = 1.0
+
+def unit_slip_point_sources(x,top_center,length,width,strike,dip,
+                            lamb=3.2e10,mu=3.2e10):
+  ''' 
+  approximates the displacements resulting from unit left-lateral, 
+  thrust, and tensile slip on each of M dislocations with a point 
+  source at the center of each dislocation. The potency of the point 
+  source is the area of the dislocation. The point source solution is 
+  always evaluated with slippy.ndc3d and it is much cheaper than the 
+  solution for a rectangular dislocation. The relative error decreases 
+  as the squared ratio of the dislocation size to the distance from 
+  its center, see point_source_error
+
+  Parameters
+  ----------
+    x : (N,3) array
+      observation points
+
+    top_center : (M,3) array
+
+    length : (M,) array
+
+    width : (M,) array
+
+    strike : (M,) array
+
+    dip : (M,) array
+
+  Returns
+  -------
+    out : (N,M,3,3) array
+      displacements where the third axis is the displacement direction 
+      and the fourth axis is the slip direction
+
+  '''
+  tol = 1e-10
+  x = np.asarray(x,dtype=float)
+  top_center = np.asarray(top_center,dtype=float)
+  length = np.asarray(length,dtype=float)
+  width = np.asarray(width,dtype=float)
+  strike = np.asarray(strike,dtype=float)
+  dip = np.asarray(dip,dtype=float)
+  if np.any(x[:,2] > tol):
+    raise ValueError('values for z coordinate must be negative')
+
+  N,M = len(x),len(top_center)
+  alpha = (lamb + mu)/(lamb + 2*mu)
+  argZ = np.pi/2.0 - strike*np.pi/180
+  cosZ = np.cos(argZ)
+  sinZ = np.sin(argZ)
+  # rotate into the okada reference frame. The rotations are only about 
+  # the z axis, so they are written out rather than using einsum, 
+  # which is slow for these small matrices
+  dx = x[:,None,0] - top_center[:,0]
+  dy = x[:,None,1] - top_center[:,1]
+  xi = np.empty((N,M,3))
+  xi[:,:,0] = cosZ*dx + sinZ*dy
+  xi[:,:,1] = -sinZ*dx + cosZ*dy
+  xi[:,:,2] = x[:,None,2]
+  # move the origin to above the center of the dislocation
+  xi[:,:,1] += 0.5*width*np.cos(np.radians(dip))
+  depth = -top_center[:,2] + 0.5*width*np.sin(np.radians(dip))
+  disp = slippy.ndc3d.point_source(alpha,xi,depth,dip)
+  disp *= (length*width)[:,None,None]
+  # return solution to original coordinate system
+  out = np.empty((N,M,3,3))
+  out[:,:,0] = cosZ[:,None]*disp[:,:,0] - sinZ[:,None]*disp[:,:,1]
+  out[:,:,1] = sinZ[:,None]*disp[:,:,0] + cosZ[:,None]*disp[:,:,1]
+  out[:,:,2] = disp[:,:,2]
+  return out
+
+
+def point_source_error(x,top_center,length,width,strike,dip):
+  ''' 
+  estimates the error of unit_slip_point_sources relative to the 
+  solution for a rectangular dislocation. The error is measured as the 
+  norm of the difference between the (3,3) displacement blocks divided 
+  by the norm of the exact block, and it is estimated as 
+  POINT_SOURCE_ERROR*(d/r)**2, where d is the length of the diagonal 
+  of the dislocation and r is the distance from its center. The 
+  estimate is only valid for observation points on the surface, so the 
+  error is infinite for points below the surface
+
+  Parameters
+  ----------
+    x : (N,3) array
+      observation points
+
+    top_center : (M,3) array
+
+    length : (M,) array
+
+    width : (M,) array
+
+    strike : (M,) array
+
+    dip : (M,) array
+
+  Returns
+  -------
+    out : (N,M) array
+      estimated relative errors
+
+  '''
+  tol = 1e-10
+  x = np.asarray(x,dtype=float)
+  top_center = np.asarray(top_center,dtype=float)
+  length = np.asarray(length,dtype=float)
+  width = np.asarray(width,dtype=float)
+  argZ = np.pi/2.0 - np.asarray(strike,dtype=float)*np.pi/180
+  argX = np.asarray(dip,dtype=float)*np.pi/180
+  # the center is half a width down dip, which is to the right of the 
+  # strike direction
+  center = np.array(top_center,copy=True)
+  center[:,0] += 0.5*width*np.cos(argX)*np.sin(argZ)
+  center[:,1] -= 0.5*width*np.cos(argX)*np.cos(argZ)
+  center[:,2] -= 0.5*width*np.sin(argX)
+  r2 = np.sum((x[:,None,:] - center[None,:,:])**2,axis=2)
+  with np.errstate(divide='ignore'):
+    out = POINT_SOURCE_ERROR*(length**2 + width**2)/r2
+
+  out[x[:,2] < -tol] = np.inf
+  return out
+
+
+def benchmark_backends(names=None,points=1000,patches=50,repeats=3,
+                       tol=1e-8,reference=None):
+  ''' 
+  times each backend on a representative workload, which is the 
+  displacement at random surface points for unit slip on random fault 
+  patches, and compares the displacements from each backend with 
+  those from a double precision reference backend
+
+  Parameters
+  ----------
+    names : list of str, optional
+      backends to benchmark. Defaults to all available backends
+
+    points : int, optional
+      number of observation points
+
+    patches : int, optional
+      number of fault patches
+
+    repeats : int, optional
+      the fastest of this many runs is used
+
+    tol : float, optional
+      backends whose displacements differ from the reference by more 
+      than this are not accurate [m per m of slip]
+
+    reference : str, optional
+      backend which the others are compared with. Defaults to the 
+      first available of REFERENCE_BACKENDS. The fortran backend is 
+      not used as the reference because DC3D is single precision
+
+  Returns
+  -------
+    results : OrderedDict
+      dictionary for each backend with the best run time "time", the 
+      number of point, patch, and slip direction evaluations per second 
+      "rate", the largest difference from the reference "max_error", 
+      and whether that is less than tol "accurate"
+
+  '''
+  if names is None:
+    names = available_backends()
+
+  rng = np.random.RandomState(1)
+  x = np.zeros((points,3))
+  x[:,:2] = rng.uniform(-50000.0,50000.0,(points,2))
+  top_center = np.zeros((patches,3))
+  top_center[:,:2] = rng.uniform(-20000.0,20000.0,(patches,2))
+  top_center[:,2] = -rng.uniform(0.0,10000.0,patches)
+  length = rng.uniform(2000.0,10000.0,patches)
+  width = rng.uniform(2000.0,10000.0,patches)
+  strike = rng.uniform(0.0,360.0,patches)
+  dip = rng.uniform(10.0,90.0,patches)
+
+  if reference is None:
+    available = available_backends()
+    reference = [n for n in REFERENCE_BACKENDS if n in available][0]
+
+  expected = unit_slip_dislocations(x,top_center,length,width,strike,dip,
+                                    backend=load_backend(reference))
+  results = collections.OrderedDict()
+  for name in names:
+    backend = load_backend(name)
+    times = []
+    for i in range(repeats):
+      start = time.time()
+      out = unit_slip_dislocations(x,top_center,length,width,strike,dip,
+                                   backend=backend)
+      times += [time.time() - start]
 
+    max_error = float(np.max(np.abs(out - expected)))
+    results[name] = {'time':min(times),
+                     'rate':3*points*patches/min(times),
+                     'max_error':max_error,
+                     'accurate':max_error <= tol}
 
+  return results
@@ -2,9 +2,6 @@
 import numpy as np
 import slippy.transform
 import warnings
-import matplotlib.pyplot as plt
-from matplotlib.patches import Polygon
-from matplotlib.collections import PatchCollection
 
 class Patch:
   def __init__(self,pos,length,width,strike,dip,pos_patch=None):
@@ -134,6 +131,9 @@ class Patch:
     ''' 
     returns a matplotlib.patch.Polygon instance 
     '''
+    # matplotlib is only imported when it is needed so that the 
+    # inversion does not depend on it
+    from matplotlib.patches import Polygon
     vert = self.patch_to_user([[0.0,0.0,0.0],
                                [1.0,0.0,0.0],
                                [1.0,1.0,0.0],
@@ -149,25 +149,238 @@ class Patch:
                                         [1.0, 0.0, 0.0],
                                         [1.0, 1.0, 0.0],
                                         [0.0, 1.0, 0.0]])
-    return verts_3vector  
+    return verts_3vector
+
+
+class PatchSet:
+  def __init__(self,pos,length,width,strike,dip,pos_patch=None):
+    ''' 
+    A collection of M fault patches which are stored as contiguous 
+    arrays rather than as a list of Patch instances. The methods 
+    operate on every patch at once and are equivalent to calling the 
+    Patch methods for each patch
+
+    Parameters
+    ----------
+      pos : (M,3) array
+        by default, this is the top center of each fault patch
+
+      length : (M,) array
+      
+      width : (M,) array
+      
+      strike : (M,) array
+        patch strikes in degrees
+      
+      dip : (M,) array
+        patch dips in degrees
+      
+      pos_patch : (3,) or (M,3) array, optional
+        Location of pos in the patch coordinate system. Defaults to 
+        [0.5,1.0,0.0]
+
+    '''
+    self.pos = np.array(pos,dtype=float).reshape((-1,3))
+    M = len(self.pos)
+    self.length = np.array(np.broadcast_to(length,(M,)),dtype=float)
+    self.width = np.array(np.broadcast_to(width,(M,)),dtype=float)
+    self.strike = np.array(np.broadcast_to(strike,(M,)),dtype=float)
+    self.dip = np.array(np.broadcast_to(dip,(M,)),dtype=float)
+    if pos_patch is None:
+      pos_patch = [0.5,1.0,0.0]
+
+    self.pos_patch = np.array(np.broadcast_to(pos_patch,(M,3)),dtype=float)
+    self._build_transforms()
+    self.check_breach()
+    return
+
+  def _build_transforms(self):
+    ''' 
+    builds the stack of transformations from the patch coordinate 
+    system of each patch to the user coordinate system. These are the 
+    same transformations that are built for each Patch instance
+    '''
+    stretch = np.column_stack((self.length,self.width,np.ones(len(self))))
+    trans  = slippy.transform.point_translation(-self.pos_patch)
+    trans += slippy.transform.point_stretch(stretch)
+    trans += slippy.transform.point_rotation_x(np.pi*self.dip/180.0)
+    trans += slippy.transform.point_rotation_z(np.pi/2.0 - np.pi*self.strike/180.0)
+    trans += slippy.transform.point_translation(self.pos)
+    self._patch_to_user = trans
+    return
+
+  @classmethod
+  def from_patches(cls,patches):
+    ''' 
+    creates a PatchSet from a list of Patch instances
+    '''
+    patches = list(patches)
+    return cls(np.reshape([p.pos for p in patches],(-1,3)),
+               [p.length for p in patches],
+               [p.width for p in patches],
+               [p.strike for p in patches],
+               [p.dip for p in patches],
+               pos_patch=np.reshape([p.pos_patch for p in patches],(-1,3)))
+
+  @classmethod
+  def concatenate(cls,patch_sets):
+    ''' 
+    joins a list of PatchSet instances into one PatchSet
+    '''
+    patch_sets = list(patch_sets)
+    out = cls.__new__(cls)
+    for attr in ['pos','length','width','strike','dip','pos_patch']:
+      setattr(out,attr,np.concatenate([getattr(p,attr) for p in patch_sets]))
+
+    out._patch_to_user = slippy.transform.concatenate(
+      [p._patch_to_user for p in patch_sets])
+    return out
+
+  def __len__(self):
+    return len(self.length)
+
+  def __getitem__(self,idx):
+    ''' 
+    returns a Patch instance if idx is an integer and otherwise returns 
+    a PatchSet containing the indexed patches
+    '''
+    if np.ndim(idx) == 0 and not isinstance(idx,slice):
+      return Patch(self.pos[idx],self.length[idx],self.width[idx],
+                   self.strike[idx],self.dip[idx],
+                   pos_patch=self.pos_patch[idx])
+
+    out = PatchSet.__new__(PatchSet)
+    for attr in ['pos','length','width','strike','dip','pos_patch']:
+      setattr(out,attr,getattr(self,attr)[idx])
+
+    out._patch_to_user = slippy.transform.TransformStack(
+      self._patch_to_user.get_M()[idx])
+    return out
+
+  def __iter__(self):
+    for i in range(len(self)):
+      yield self[i]
+
+  def check_breach(self):
+    ''' 
+    Makes sure that the top of each fault does not breach the surface
+    '''
+    tol = 1e-10
+    if np.any(self.corners()[:,:,2] > tol):
+      warnings.warn('patch has positive z coordinate')
+
+  def patch_to_user(self,x):
+    ''' 
+    transforms points from the patch coordinate system of each patch 
+    to the user coordinate system
+    
+    Parameters
+    ----------
+      x : (...,3) array in patch coordinates
       
+    Returns 
+    -------
+      out : (M,...,3) array in data coordinates
+    '''  
+    x = np.asarray(x,dtype=float)
+    return self._patch_to_user(x[None])
+
+  def user_to_patch(self,x):
+    ''' 
+    transforms points from the user coordinate system to the patch 
+    coordinate system of each patch
+
+    Parameters
+    ----------
+      x : (...,3) array in data coordinates
+
+    Returns 
+    -------
+      out : (M,...,3) array in patch coordinates
+    '''  
+    x = np.asarray(x,dtype=float)
+    return self._patch_to_user.inverse()(x[None])
+
+  def discretize(self,Nl,Nw):
+    ''' 
+    divides each patch into Nl*Nw patches. The subpatches of each 
+    patch are contiguous and in the same order as Patch.discretize
+    '''
+    x_patch = np.linspace(0.0,1.0,Nl+1)[:-1]
+    y_patch = np.linspace(0.0,1.0,Nw+1)[:-1]
+    x_patch_grid,y_patch_grid = np.meshgrid(x_patch,y_patch,indexing='ij')
+    x_patch_flat,y_patch_flat = x_patch_grid.ravel(),y_patch_grid.ravel()
+    pnt_patch = np.array([x_patch_flat,y_patch_flat,np.zeros(Nl*Nw)]).T
+    pnt_data = self.patch_to_user(pnt_patch).reshape((-1,3))
+    Nsub = Nl*Nw
+    return PatchSet(pnt_data,
+                    (self.length/Nl).repeat(Nsub),
+                    (self.width/Nw).repeat(Nsub),
+                    self.strike.repeat(Nsub),
+                    self.dip.repeat(Nsub),
+                    pos_patch=[0.0,0.0,0.0])
+
+  def top_centers(self):
+    ''' 
+    returns the (M,3) array of patch top centers
+    '''
+    return self.patch_to_user([0.5,1.0,0.0])
+
+  def centroids(self):
+    ''' 
+    returns the (M,3) array of patch centers
+    '''
+    return self.patch_to_user([0.5,0.5,0.0])
+
+  def corners(self):
+    ''' 
+    returns the (M,4,3) array of patch corners, which are in the same 
+    order as Patch.get_3d_polygon
+    '''
+    return self.patch_to_user([[0.0,0.0,0.0],
+                               [1.0,0.0,0.0],
+                               [1.0,1.0,0.0],
+                               [0.0,1.0,0.0]])
+
+  def polygons(self):
+    ''' 
+    returns the (M,5,2) array of closed patch outlines in the xy 
+    plane. These are the vertices of the polygons returned by 
+    Patch.get_polygon
+    '''
+    corners = self.corners()[:,:,:2]
+    return np.concatenate((corners,corners[:,:1]),axis=1)
+
+  def geometry(self):
+    ''' 
+    returns an (M,7) array with the top center, length, width, strike, 
+    and dip of each patch, which uniquely describes the patches
+    '''
+    return np.column_stack((self.top_centers(),self.length,self.width,
+                            self.strike,self.dip))
+
+
 def draw_patches(patch_list,colors=None,ax=None,**kwargs):
   ''' 
   draws a list of Patch instances
   
   Parameters
   ----------
-    patch_list : (N,) list of Patch instances
+    patch_list : (N,) list of Patch instances or a PatchSet
     
     colors : (N,) array of color values
 
   '''    
+  import matplotlib.pyplot as plt
+  from matplotlib.collections import PatchCollection
+  from matplotlib.patches import Polygon
   if ax is None:
     ax = plt.gca()
 
-  polys = []
-  for p in patch_list:
-    polys += [p.get_polygon()]
+  if not isinstance(patch_list,PatchSet):
+    patch_list = PatchSet.from_patches(patch_list)
+
+  polys = [Polygon(v) for v in patch_list.polygons()]
   
   pc = PatchCollection(polys,**kwargs)
   if colors is not None:
@@ -179,30 +392,22 @@ def draw_patches(patch_list,colors=None,ax=None,**kwargs):
 
 def get_shallow_edges(patch_list, fault_nums):
   '''
-  Inputs are a patch list (in cartesian)
+  Inputs are a patch list or PatchSet (in cartesian)
   Returns a list of coordinates of the shallow edges (in cartesian)
   '''
+  if not isinstance(patch_list,PatchSet):
+    patch_list = PatchSet.from_patches(patch_list)
+
+  fault_nums = np.asarray(fault_nums)
+  verts = patch_list.corners()
   shallow_edge_list = [];
   for i in range(len(set(fault_nums))):
-    segment_patch_list = []
-    verts_list = [];
-    shallow_points = [];
-    shallow_x = []; 
-    shallow_y = []; 
-    for j in range(len(fault_nums)):
-      if fault_nums[j] == i:
-        segment_patch_list.append(patch_list[j]);
-    for p in segment_patch_list:
-      verts_list += [p.get_3d_polygon()];  
-    for p in verts_list:
-      shallow_points.append(p[2][2]);  # extract the shallowest point of each patch
-    shallow_limit = np.max(shallow_points);
-    for i in range(len(verts_list)):
-      if verts_list[i][2][2] == shallow_limit:
-        shallow_x.append(verts_list[i][2][0])
-        shallow_x.append(verts_list[i][3][0])
-        shallow_y.append(verts_list[i][2][1])
-        shallow_y.append(verts_list[i][3][1])
+    segment_verts = verts[fault_nums == i]
+    # extract the shallowest point of each patch
+    shallow_limit = np.max(segment_verts[:,2,2]);
+    shallow_verts = segment_verts[segment_verts[:,2,2] == shallow_limit]
+    shallow_x = shallow_verts[:,[2,3],0]
+    shallow_y = shallow_verts[:,[2,3],1]
     minpoint = [np.min(shallow_x), np.min(shallow_y)];
     maxpoint = [np.max(shallow_x), np.max(shallow_y)];
     one_shallow_edge = [minpoint, maxpoint];
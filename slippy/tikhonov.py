@@ -1,17 +1,21 @@
 #!/usr/bin/env python
 from __future__ import division
 import numpy as np
+import scipy.sparse
 
 def remove_zero_rows(M):
   ''' 
-  used in tikhonov_matrix
+  returns M without the rows that are entirely zero. M can be a dense 
+  array or a scipy.sparse matrix, in which case a csr_matrix is 
+  returned
   '''
-  out = np.zeros((0,M.shape[1]))
-  for m in M:
-    if np.any(m):
-      out = np.vstack((out,m))
+  if scipy.sparse.issparse(M):
+    M = scipy.sparse.csr_matrix(M,dtype=float,copy=True)
+    M.eliminate_zeros()
+    return M[np.diff(M.indptr) > 0]
 
-  return out
+  M = np.asarray(M,dtype=float)
+  return M[np.any(M != 0,axis=1)]
 
 
 def flat_to_array_index(idx,shape):
@@ -250,54 +254,93 @@ class Neighbors:
       return out,self.C[idx]
       
 
-def _tikhonov_zeroth_order(C,L):
+def _axis_slices(axis,ndim):
   ''' 
-  used in tikhonov_matrix
+  returns slices which select all but the last and all but the first 
+  elements along axis
   '''
-  for val in C.flat:
-    if (val == -1):
-      continue
-    L[val,val] = 1
-
-  return L
+  lo = [slice(None)]*ndim
+  hi = [slice(None)]*ndim
+  lo[axis] = slice(None,-1)
+  hi[axis] = slice(1,None)
+  return tuple(lo),tuple(hi)
 
 
-def _tikhonov_first_order(C,L):
+def _tikhonov_zeroth_order(C):
   ''' 
-  used in tikhonov_matrix
+  used in tikhonov_matrix. Returns the row indices, column indices, 
+  and values of the nonzero entries
   '''
-  Lrow = 0
-  for neighbors,i in ForwardNeighbors(C):
-    if i == -1:
-      continue
-    for k in neighbors:
-      if k == -1:
-        continue
-      L[Lrow,i] += -1
-      L[Lrow,k] += 1
-      Lrow += 1
+  cols = np.sort(C[C != -1])
+  rows = np.arange(len(cols))
+  vals = np.ones(len(cols))
+  return rows,cols,vals
 
-  return L 
 
-
-def _tikhonov_second_order(C,L):
+def _tikhonov_first_order(C):
   ''' 
-  used in tikhonov_matrix
+  used in tikhonov_matrix. Returns the row indices, column indices, 
+  and values of the nonzero entries
   '''
-  for nbrs,i in Neighbors(C):
-    if i == -1:
-      continue
-    denom = len([n for n in nbrs if n != -1])
-    for k in nbrs:
-      if k == -1:
-        continue
-      L[i,i] += -1.0/denom 
-      L[i,k]  +=  1.0/denom
-
-  return L
-
-
-def tikhonov_matrix(C,order,column_no=None):
+  # each row is the difference between an element and its forward 
+  # neighbor along one axis. The rows are ordered by the flat index of 
+  # the element and then by the axis
+  flat = np.arange(C.size).reshape(C.shape)
+  src,nbr,src_flat,src_axis = [],[],[],[]
+  for axis in range(C.ndim):
+    lo,hi = _axis_slices(axis,C.ndim)
+    src += [C[lo].ravel()]
+    nbr += [C[hi].ravel()]
+    src_flat += [flat[lo].ravel()]
+    src_axis += [np.full(C[lo].size,axis)]
+
+  src = np.concatenate(src)
+  nbr = np.concatenate(nbr)
+  src_flat = np.concatenate(src_flat)
+  src_axis = np.concatenate(src_axis)
+  keep = (src != -1) & (nbr != -1)
+  order = np.lexsort((src_axis[keep],src_flat[keep]))
+  src = src[keep][order]
+  nbr = nbr[keep][order]
+
+  N = len(src)
+  rows = np.concatenate((np.arange(N),np.arange(N)))
+  cols = np.concatenate((src,nbr))
+  vals = np.concatenate((-np.ones(N),np.ones(N)))
+  return rows,cols,vals
+
+
+def _tikhonov_second_order(C):
+  ''' 
+  used in tikhonov_matrix. Returns the row indices, column indices, 
+  and values of the nonzero entries
+  '''
+  # find the forward and backward neighbors along each axis
+  src,nbr = [],[]
+  for axis in range(C.ndim):
+    lo,hi = _axis_slices(axis,C.ndim)
+    src += [C[lo].ravel(),C[hi].ravel()]
+    nbr += [C[hi].ravel(),C[lo].ravel()]
+
+  src = np.concatenate(src) if src else np.zeros(0,dtype=int)
+  nbr = np.concatenate(nbr) if nbr else np.zeros(0,dtype=int)
+  keep = (src != -1) & (nbr != -1)
+  src = src[keep]
+  nbr = nbr[keep]
+
+  # each element with at least one neighbor gets a row. The rows are 
+  # ordered by the element value
+  row_vals,row_idx,denom = np.unique(src,return_inverse=True,
+                                     return_counts=True)
+  row_idx = row_idx.ravel()
+  weight = 1.0/denom[row_idx]
+  rows = np.concatenate((row_idx,row_idx))
+  cols = np.concatenate((src,nbr))
+  vals = np.concatenate((-weight,weight))
+  return rows,cols,vals
+
+
+def tikhonov_matrix(C,order,column_no=None,sparse=False):
   ''' 
   Parameters
   ----------
@@ -311,6 +354,9 @@ def tikhonov_matrix(C,order,column_no=None):
     column_no: int
       number of columns in the output matrix
 
+    sparse: bool
+      if True then L is returned as a scipy.sparse.csr_matrix
+
   Returns
   -------
     L: tikhonov regularization matrix 
@@ -334,8 +380,6 @@ def tikhonov_matrix(C,order,column_no=None):
   assert len(params) == len(unique_params), (
          'all values in C, except for -1, must be unique')
 
-  Cdim = len(np.shape(C))
-
   if np.size(C) == 0:
     max_param = 0
 
@@ -349,19 +393,22 @@ def tikhonov_matrix(C,order,column_no=None):
          'column_no must be at least as large as max(C)')
 
   if order == 0:
-    L = np.zeros((column_no,column_no))
-    L =  _tikhonov_zeroth_order(C,L)
+    rows,cols,vals = _tikhonov_zeroth_order(C)
 
-  if order == 1:
-    L = np.zeros((Cdim*column_no,column_no))
-    L = _tikhonov_first_order(C,L)
+  elif order == 1:
+    rows,cols,vals = _tikhonov_first_order(C)
 
-  if order == 2:
-    L = np.zeros((column_no,column_no))
-    L = _tikhonov_second_order(C,L)
+  elif order == 2:
+    rows,cols,vals = _tikhonov_second_order(C)
 
-  L = remove_zero_rows(L)     
-
-  return L
+  else:
+    raise ValueError('order must be 0, 1, or 2')
 
+  row_no = np.max(rows) + 1 if len(rows) > 0 else 0
+  # duplicate entries are summed when converting to csr
+  L = scipy.sparse.coo_matrix((vals,(rows,cols)),
+                              shape=(row_no,column_no)).tocsr()
+  if not sparse:
+    L = L.toarray()
 
+  return L
@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+'''
+Transverse Mercator projection on the WGS84 ellipsoid. This module
+has the same interface as slippy.xyz2geo and slippy.bm, but it does
+not depend on Basemap and, unlike the 111 km per degree approximation
+in slippy.xyz2geo, it is accurate over continental distances.
+
+The forward and inverse projections use the 6th order Kruger series
+from Karney (2011), Transverse Mercator with an accuracy of a few
+nanometers, J. Geodesy. The series are accurate to about a
+micrometer within 4000 km of the central meridian. The scale factor
+on the central meridian is one and the origin of the cartesian
+coordinate system is at (lon_0,lat_0), so x is east and y is north
+near the origin.
+'''
+import numpy as np
+from slippy.xyz2geo import Map_boundaries_tuple
+
+# WGS84 ellipsoid
+SEMI_MAJOR_AXIS = 6378137.0
+FLATTENING = 1.0/298.257223563
+
+_e2 = FLATTENING*(2.0 - FLATTENING)
+_e = np.sqrt(_e2)
+_n = FLATTENING/(2.0 - FLATTENING)
+
+# rectifying radius
+_A = SEMI_MAJOR_AXIS/(1.0 + _n)*(1.0 + _n**2/4.0 + _n**4/64.0 + _n**6/256.0)
+
+# coefficients for the forward series
+_ALPHA = np.array([
+  _n/2.0 - 2.0*_n**2/3.0 + 5.0*_n**3/16.0 + 41.0*_n**4/180.0 -
+  127.0*_n**5/288.0 + 7891.0*_n**6/37800.0,
+  13.0*_n**2/48.0 - 3.0*_n**3/5.0 + 557.0*_n**4/1440.0 +
+  281.0*_n**5/630.0 - 1983433.0*_n**6/1935360.0,
+  61.0*_n**3/240.0 - 103.0*_n**4/140.0 + 15061.0*_n**5/26880.0 +
+  167603.0*_n**6/181440.0,
+  49561.0*_n**4/161280.0 - 179.0*_n**5/168.0 +
+  6601661.0*_n**6/7257600.0,
+  34729.0*_n**5/80640.0 - 3418889.0*_n**6/1995840.0,
+  212378941.0*_n**6/319334400.0])
+
+# coefficients for the inverse series
+_BETA = np.array([
+  _n/2.0 - 2.0*_n**2/3.0 + 37.0*_n**3/96.0 - _n**4/360.0 -
+  81.0*_n**5/512.0 + 96199.0*_n**6/604800.0,
+  _n**2/48.0 + _n**3/15.0 - 437.0*_n**4/1440.0 + 46.0*_n**5/105.0 -
+  1118711.0*_n**6/3870720.0,
+  17.0*_n**3/480.0 - 37.0*_n**4/840.0 - 209.0*_n**5/4480.0 +
+  5569.0*_n**6/90720.0,
+  4397.0*_n**4/161280.0 - 11.0*_n**5/504.0 -
+  830251.0*_n**6/7257600.0,
+  4583.0*_n**5/161280.0 - 108847.0*_n**6/3991680.0,
+  20648693.0*_n**6/638668800.0])
+
+
+def _conformal_tan(tau):
+  '''
+  returns the tangent of the conformal latitude given the tangent of
+  the geodetic latitude
+  '''
+  sig = np.sinh(_e*np.arctanh(_e*tau/np.hypot(1.0,tau)))
+  return tau*np.hypot(1.0,sig) - sig*np.hypot(1.0,tau)
+
+
+def _geodetic_tan(taup,iterations=2):
+  '''
+  inverts _conformal_tan with Newton's method. Two iterations are
+  enough for double precision
+  '''
+  tau = np.array(taup,dtype=float,copy=True)
+  for i in range(iterations):
+    taupi = _conformal_tan(tau)
+    dtau = ((taup - taupi)/np.hypot(1.0,taupi)*
+            (1.0 + (1.0 - _e2)*tau**2)/
+            ((1.0 - _e2)*np.hypot(1.0,tau)))
+    tau += dtau
+
+  return tau
+
+
+def _sin_series(coeff,zeta):
+  '''
+  evaluates sum_j coeff[j]*sin(2*(j+1)*zeta) for complex zeta with
+  Clenshaw summation, which only needs one complex sine and cosine
+  '''
+  sin2 = np.sin(2.0*zeta)
+  cos2 = 2.0*np.cos(2.0*zeta)
+  b1 = np.zeros_like(zeta)
+  b2 = np.zeros_like(zeta)
+  for c in coeff[::-1]:
+    b1,b2 = c + cos2*b1 - b2,b1
+
+  return b1*sin2
+
+
+def _northing(lat):
+  '''
+  distance along the central meridian from the equator to lat
+  '''
+  lon,northing = _forward(np.zeros_like(lat),lat)
+  return northing
+
+
+def _forward(dlon,lat):
+  '''
+  projects the longitude relative to the central meridian and the
+  latitude, both in degrees, to easting and northing in meters
+  '''
+  lam = np.deg2rad(dlon)
+  coslam = np.cos(lam)
+  taup = _conformal_tan(np.tan(np.deg2rad(lat)))
+  # xi' + i*eta' on the sphere and then xi + i*eta on the ellipsoid
+  zeta = np.arctan2(taup,coslam) + 1j*np.arcsinh(np.sin(lam)/np.hypot(taup,coslam))
+  zeta += _sin_series(_ALPHA,zeta)
+  return _A*zeta.imag,_A*zeta.real
+
+
+def _inverse(x,y):
+  '''
+  inverse of _forward
+  '''
+  zeta = y/_A + 1j*(x/_A)
+  zeta -= _sin_series(_BETA,zeta)
+  xip = zeta.real
+  sinh_etap = np.sinh(zeta.imag)
+  cos_xip = np.cos(xip)
+  taup = np.sin(xip)/np.hypot(sinh_etap,cos_xip)
+  lam = np.arctan2(sinh_etap,cos_xip)
+  lat = np.rad2deg(np.arctan(_geodetic_tan(taup)))
+  return np.rad2deg(lam),lat
+
+
+def geo2xyz(lons,lats,lon0,lat0):
+  '''
+  projects longitudes and latitudes, which can have any shape, to
+  cartesian coordinates in meters with the origin at (lon0,lat0)
+  '''
+  lons = np.asarray(lons,dtype=float)
+  lats = np.asarray(lats,dtype=float)
+  # wrap the longitudes to be within 180 degrees of the central
+  # meridian
+  dlon = (lons - lon0 + 180.0) % 360.0 - 180.0
+  x,y = _forward(dlon,lats)
+  y = y - _northing(np.asarray(lat0,dtype=float))
+  return x,y
+
+
+def xyz2geo(x,y,lon0,lat0):
+  '''
+  inverse of geo2xyz
+  '''
+  x = np.asarray(x,dtype=float)
+  y = np.asarray(y,dtype=float)
+  y = y + _northing(np.asarray(lat0,dtype=float))
+  dlon,lats = _inverse(x,y)
+  lons = lon0 + dlon
+  return lons,lats
+
+
+def geodetic_to_cartesian(pos_geo,collection):
+  '''
+  Parameters
+  ----------
+    pos_geo : (...,D) array
+      array of geodetic positions. The first and second component of
+      the last axis are longitude and latitude.  The last axis can
+      have additional components (e.g. height) and they will be
+      returned unaltered.
+
+    collection : Map_boundaries_tuple
+      map created by create_default_basemap
+
+  Returns
+  -------
+    pos_cart : (...,D) array
+  '''
+  pos_cart = np.array(pos_geo,dtype=float,copy=True)
+  pos_x,pos_y = geo2xyz(pos_cart[...,0],pos_cart[...,1],
+                        collection.lon_0,collection.lat_0)
+  pos_cart[...,0] = pos_x
+  pos_cart[...,1] = pos_y
+  return pos_cart
+
+
+def cartesian_to_geodetic(pos_cart,collection):
+  '''
+  Parameters
+  ----------
+    pos_cart : (...,D) array
+      array of cartesian positions
+
+    collection : Map_boundaries_tuple
+      map created by create_default_basemap
+
+  Returns
+  -------
+    pos_geo : (...,D) array
+  '''
+  pos_geo = np.array(pos_cart,dtype=float,copy=True)
+  pos_lon,pos_lat = xyz2geo(pos_geo[...,0],pos_geo[...,1],
+                            collection.lon_0,collection.lat_0)
+  pos_geo[...,0] = pos_lon
+  pos_geo[...,1] = pos_lat
+  return pos_geo
+
+
+def create_default_basemap(lon_lst,lat_lst,proj='M5i',resolution='i'):
+  '''
+  creates a named tuple that bounds lat_lst and lon_lst. The center
+  of the bounds is the origin of the projection
+  '''
+  print("Creating transverse Mercator projection")
+  if (len(lon_lst) == 0) | (len(lat_lst) == 0):
+    return Map_boundaries_tuple(lon_0=-90.0,lat_0=41.0,llcrnrlat=26.0,
+                                llcrnrlon=-128.0,urcrnrlat=48.0,
+                                urcrnrlon=-53.0,proj=proj,
+                                resolution=resolution)
+
+  min_lon,max_lon = float(np.min(lon_lst)),float(np.max(lon_lst))
+  min_lat,max_lat = float(np.min(lat_lst)),float(np.max(lat_lst))
+  lon_buff = max((max_lon - min_lon)/20.0,0.15)
+  lat_buff = max((max_lat - min_lat)/20.0,0.15)
+  llcrnrlon = min_lon - lon_buff
+  llcrnrlat = min_lat - lat_buff
+  urcrnrlon = max_lon + lon_buff
+  urcrnrlat = max_lat + lat_buff
+  lon_0 = (llcrnrlon + urcrnrlon)/2.0
+  lat_0 = (llcrnrlat + urcrnrlat)/2.0
+  return Map_boundaries_tuple(lon_0=lon_0,lat_0=lat_0,llcrnrlat=llcrnrlat,
+                              llcrnrlon=llcrnrlon,urcrnrlat=urcrnrlat,
+                              urcrnrlon=urcrnrlon,proj=proj,
+                              resolution=resolution)
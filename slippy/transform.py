@@ -2,15 +2,46 @@
 from __future__ import division
 import numpy as np
 
-def _augment(point):
-  point = np.array(point,dtype=float,copy=True)
-  s = np.shape(point) 
-  a = np.ones(s[:-1]+(1,))
-  return np.concatenate((point,a),axis=-1)
+def _apply(M,point):
+  ''' 
+  applies the affine transformation(s) M, which has shape (4,4) or 
+  (K,4,4), to point. The linear part and the translation are applied 
+  separately so that the points never need to be augmented with ones
+  '''
+  point = np.asarray(point,dtype=float)
+  if M.ndim == 2:
+    return point.dot(M[:3,:3].T) + M[:3,3]
+
+  # the first axis of point is matched with the K transformations. It 
+  # can have length one to apply each transformation to the same points
+  shape = np.broadcast_shapes(point.shape[:1],M.shape[:1]) + point.shape[1:]
+  point = point.reshape((point.shape[0],-1,3))
+  out = np.matmul(point,M[:,:3,:3].transpose(0,2,1))
+  out += M[:,None,:3,3]
+  return out.reshape(shape)
+
+
+def _inverse(M):
+  ''' 
+  inverts the affine transformation(s) M, which has shape (...,4,4)
+  '''
+  Minv = np.zeros(M.shape)
+  Minv[...,:3,:3] = np.linalg.inv(M[...,:3,:3])
+  Minv[...,:3,3] = -np.einsum('...ij,...j->...i',Minv[...,:3,:3],M[...,:3,3])
+  Minv[...,3,3] = 1.0
+  return Minv
+
+
+def _as_transform(M):
+  ''' 
+  returns a Transform for a (4,4) matrix and a TransformStack for a 
+  (K,4,4) array of matrices
+  '''
+  if M.ndim == 2:
+    return Transform(M)
+  else:
+    return TransformStack(M)
 
-def _unaugment(point):
-  point = np.array(point,dtype=float,copy=True)    
-  return point[...,:-1]
 
 class Transform:
   def __init__(self,M):
@@ -18,10 +49,7 @@ class Transform:
     self._M = M
 
   def __call__(self,point):
-    point = _augment(point)
-    out = np.einsum('ij,...j->...i',self._M,point)
-    out = _unaugment(out) 
-    return out
+    return _apply(self._M,point)
 
   def inverse(self):
     Minv = np.linalg.inv(self._M)
@@ -34,16 +62,17 @@ class Transform:
     self._M = M
 
   def get_transformed_origin(self):
-    return self._M[[0,1,2],3]
+    return self._M[...,[0,1,2],3]
 
   def get_transformed_bases(self):
-    return (self._M[[0,1,2],0],
-            self._M[[0,1,2],1],
-            self._M[[0,1,2],2])
+    return (self._M[...,[0,1,2],0],
+            self._M[...,[0,1,2],1],
+            self._M[...,[0,1,2],2])
 
   def then(self,other):
     ''' 
-    combines transformation operations
+    combines transformation operations. If either transformation is a 
+    TransformStack then the result is a TransformStack
     
     Example
     -------
@@ -51,7 +80,7 @@ class Transform:
       >>> RotateY = point_rotation_y(2.0)
       >>> TotalRotation = RotateX.then(RotateY)
     '''
-    return Transform(other._M.dot(self._M))
+    return _as_transform(np.matmul(other._M,self._M))
       
   def __add__(self,other):
     return self.then(other)
@@ -60,49 +89,135 @@ class Transform:
     return self.then(other.inverse())
 
 
+class TransformStack(Transform):
+  def __init__(self,M):
+    ''' 
+    A stack of K affine transformations which are composed, inverted, 
+    and applied at once
+
+    Parameters
+    ----------
+      M : (K,4,4) array
+        augmented transformation matrices
+
+    '''
+    M = np.asarray(M,dtype=float)
+    if (M.ndim != 3) | (M.shape[1:] != (4,4)):
+      raise ValueError('M must have shape (K,4,4)')
+
+    self._M = M
+
+  def __call__(self,point):
+    ''' 
+    applies the k'th transformation to point[k]
+
+    Parameters
+    ----------
+      point : (K,...,3) or (1,...,3) array
+        The same points are transformed by each transformation if the 
+        first axis has length one
+
+    Returns
+    -------
+      out : (K,...,3) array
+    '''
+    return _apply(self._M,point)
+
+  def __len__(self):
+    return len(self._M)
+
+  def __getitem__(self,idx):
+    return _as_transform(self._M[idx])
+
+  def inverse(self):
+    return TransformStack(_inverse(self._M))
+
+
+def concatenate(transforms):
+  ''' 
+  joins a list of Transform and TransformStack instances into one 
+  TransformStack
+  '''
+  return TransformStack(np.concatenate(
+    [np.reshape(t.get_M(),(-1,4,4)) for t in transforms]))
+
+
 def identity():
   M = np.eye(4)
   return Transform(M)
 
 
+def _identities(shape):
+  ''' 
+  returns identity matrices with the given leading shape
+  '''
+  M = np.zeros(shape + (4,4))
+  M[...,[0,1,2,3],[0,1,2,3]] = 1.0
+  return M
+
+
 def point_rotation_x(arg):
-  M = np.array([[1.0, 0.0, 0.0, 0.0],
-                [0.0, np.cos(arg), -np.sin(arg), 0.0],
-                [0.0, np.sin(arg), np.cos(arg), 0.0],
-                [0.0, 0.0, 0.0, 1.0]])
-  return Transform(M)
+  ''' 
+  rotation about the x axis. A TransformStack is returned if arg is a 
+  (K,) array of angles
+  '''
+  arg = np.asarray(arg,dtype=float)
+  M = _identities(arg.shape)
+  M[...,1,1] = np.cos(arg)
+  M[...,1,2] = -np.sin(arg)
+  M[...,2,1] = np.sin(arg)
+  M[...,2,2] = np.cos(arg)
+  return _as_transform(M)
 
 
 def point_rotation_y(arg):
-  M = np.array([[np.cos(arg), 0.0, np.sin(arg), 0.0],
-                [0.0, 1.0, 0.0, 0.0],
-                [-np.sin(arg), 0.0, np.cos(arg), 0.0],
-                [0.0, 0.0, 0.0, 1.0]])
-  return Transform(M)
+  ''' 
+  rotation about the y axis. A TransformStack is returned if arg is a 
+  (K,) array of angles
+  '''
+  arg = np.asarray(arg,dtype=float)
+  M = _identities(arg.shape)
+  M[...,0,0] = np.cos(arg)
+  M[...,0,2] = np.sin(arg)
+  M[...,2,0] = -np.sin(arg)
+  M[...,2,2] = np.cos(arg)
+  return _as_transform(M)
 
 
 def point_rotation_z(arg):
-  M = np.array([[np.cos(arg), -np.sin(arg), 0.0, 0.0],
-                [np.sin(arg), np.cos(arg), 0.0, 0.0],
-                [0.0, 0.0, 1.0, 0.0],
-                [0.0, 0.0, 0.0, 1.0]])
-  return Transform(M)
+  ''' 
+  rotation about the z axis. A TransformStack is returned if arg is a 
+  (K,) array of angles
+  '''
+  arg = np.asarray(arg,dtype=float)
+  M = _identities(arg.shape)
+  M[...,0,0] = np.cos(arg)
+  M[...,0,1] = -np.sin(arg)
+  M[...,1,0] = np.sin(arg)
+  M[...,1,1] = np.cos(arg)
+  return _as_transform(M)
 
 
 def point_translation(T):  
-  M = np.array([[1.0, 0.0, 0.0, T[0]],
-                [0.0, 1.0, 0.0, T[1]],
-                [0.0, 0.0, 1.0, T[2]],
-                [0.0, 0.0, 0.0, 1.0]])
-  return Transform(M)
+  ''' 
+  translation by T. A TransformStack is returned if T is a (K,3) 
+  array
+  '''
+  T = np.asarray(T,dtype=float)
+  M = _identities(T.shape[:-1])
+  M[...,:3,3] = T
+  return _as_transform(M)
 
 
 def point_stretch(S):
-  M = np.array([[S[0], 0.0, 0.0, 0.0],
-                [0.0, S[1], 0.0, 0.0],
-                [0.0, 0.0, S[2], 0.0],
-                [0.0, 0.0, 0.0, 1.0]])
-  return Transform(M)
+  ''' 
+  stretches each axis by S. A TransformStack is returned if S is a 
+  (K,3) array
+  '''
+  S = np.asarray(S,dtype=float)
+  M = _identities(S.shape[:-1])
+  M[...,[0,1,2],[0,1,2]] = S
+  return _as_transform(M)
 
 def basis_rotation_x(arg):
   a = point_rotation_x(arg)
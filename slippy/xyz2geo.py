@@ -6,34 +6,22 @@ Map_boundaries_tuple=collections.namedtuple("Map_boundaries_tuple",["lon_0",
 
 
 def geo2xyz(lons, lats, lon0, lat0):
-  # returns units of meters
-  if len(np.atleast_1d(lons))==1:
-  	x_array = (lons-lon0)*111000.0*(np.cos(np.deg2rad(lat0)));
-  	y_array = (lats-lat0)*111000.0;
-  else:
-    x_array = np.zeros(np.shape(lons));
-    y_array = np.zeros(np.shape(lats));
-
-    for i in range(len(lons)):
-      x_array[i]=(lons[i]-lon0)*111000.0*(np.cos(np.deg2rad(lat0)));
-      y_array[i]=(lats[i]-lat0)*111000.0;
-
+  # returns units of meters. lons and lats can be scalars or arrays 
+  # with any shape
+  lons = np.asarray(lons, dtype=float)
+  lats = np.asarray(lats, dtype=float)
+  x_array = (lons-lon0)*111000.0*(np.cos(np.deg2rad(lat0)));
+  y_array = (lats-lat0)*111000.0;
   return x_array,y_array;
 
 
 def xyz2geo(x, y, lon0, lat0):
-  # takes units of meters
-  if len(np.atleast_1d(x))==1:
-    lon_array = lon0 + (x/(111000.0*np.cos(np.deg2rad(lat0))));
-    lat_array = lat0 + (y/111000.0);
-  else:
-    lon_array = np.zeros(np.shape(x));
-    lat_array = np.zeros(np.shape(y));
-
-    for i in range(len(x)):
-      lon_array[i] = lon0 + (x[i]/(111000.0*np.cos(np.deg2rad(lat0))));
-      lat_array[i] = lat0 + (y[i]/111000.0);
-
+  # takes units of meters. x and y can be scalars or arrays with any 
+  # shape
+  x = np.asarray(x, dtype=float)
+  y = np.asarray(y, dtype=float)
+  lon_array = lon0 + (x/(111000.0*np.cos(np.deg2rad(lat0))));
+  lat_array = lat0 + (y/111000.0);
   return lon_array, lat_array;
 
 
@@ -51,11 +39,8 @@ def geodetic_to_cartesian(pos_geo, collection):
   -------
     pos_cart : (...,D) array
   '''    
-  pos_cart = np.array(pos_geo,copy=True)
-  pos_geo = np.asarray(pos_geo)
-  pos_x,pos_y = geo2xyz(pos_geo[...,0],pos_geo[...,1], collection.lon_0, collection.lat_0)  
-  pos_x = np.asarray(pos_x)
-  pos_y = np.asarray(pos_y)
+  pos_cart = np.array(pos_geo,dtype=float,copy=True)
+  pos_x,pos_y = geo2xyz(pos_cart[...,0],pos_cart[...,1], collection.lon_0, collection.lat_0)  
   pos_cart[...,0] = pos_x
   pos_cart[...,1] = pos_y
   return pos_cart
@@ -73,11 +58,8 @@ def cartesian_to_geodetic(pos_cart,collection):
   -------
     pos_geo : (...,D) array  
   '''
-  pos_geo = np.array(pos_cart,copy=True)
-  pos_cart = np.asarray(pos_cart)
-  pos_lon,pos_lat = xyz2geo(pos_cart[...,0],pos_cart[...,1],collection.lon_0, collection.lat_0)  
-  pos_lon = np.asarray(pos_lon)
-  pos_lat = np.asarray(pos_lat)
+  pos_geo = np.array(pos_cart,dtype=float,copy=True)
+  pos_lon,pos_lat = xyz2geo(pos_geo[...,0],pos_geo[...,1],collection.lon_0, collection.lat_0)  
   pos_geo[...,0] = pos_lon
   pos_geo[...,1] = pos_lat
   return pos_geo
@@ -92,18 +74,20 @@ def create_default_basemap(lon_lst,lat_lst, proj='M5i', resolution='i'):
   if (len(lon_lst) == 0) | (len(lat_lst) == 0):
     return Map_boundaries_tuple(lon_0=-90.0, lat_0=41.0, llcrnrlat = 26.0, llcrnrlon=-128.0, urcrnrlat=48.0, urcrnrlon=-53.0, proj='M5i');
     
-  lon_buff = (max(lon_lst) - min(lon_lst))/20.0
-  lat_buff = (max(lat_lst) - min(lat_lst))/20.0
+  min_lon,max_lon = float(np.min(lon_lst)),float(np.max(lon_lst))
+  min_lat,max_lat = float(np.min(lat_lst)),float(np.max(lat_lst))
+  lon_buff = (max_lon - min_lon)/20.0
+  lat_buff = (max_lat - min_lat)/20.0
   if lon_buff < 0.15:
     lon_buff = 0.15
 
   if lat_buff < 0.15:
     lat_buff = 0.15
 
-  llcrnrlon = min(lon_lst) - lon_buff
-  llcrnrlat = min(lat_lst) - lat_buff
-  urcrnrlon = max(lon_lst) + lon_buff
-  urcrnrlat = max(lat_lst) + lat_buff
+  llcrnrlon = min_lon - lon_buff
+  llcrnrlat = min_lat - lat_buff
+  urcrnrlon = max_lon + lon_buff
+  urcrnrlat = max_lat + lat_buff
   lon_0 = (llcrnrlon + urcrnrlon)/2.0
   lat_0 = (llcrnrlat + urcrnrlat)/2.0
   return Map_boundaries_tuple(lon_0=lon_0, lat_0=lat_0, llcrnrlat = llcrnrlat, 
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+''' 
+benchmarks the throughput of the Okada 1992 kernels in points times 
+patches per second. Each kernel computes the displacements at random 
+surface points for unit slip in each of the three slip directions on 
+random patches, which is the work done when building the system 
+matrix. Run with
+
+  $ python bench_dc3d.py [Npoints] [Npatches]
+
+'''
+import slippy.okada
+import slippy.cdc3d
+import slippy.ndc3d
+import numpy as np
+import time
+import sys
+
+def problem(Npoints,Npatches):
+  ''' 
+  creates random surface points and patches
+  '''
+  np.random.seed(1)
+  pos = np.zeros((Npoints,3))
+  pos[:,:2] = np.random.uniform(-50000.0,50000.0,(Npoints,2))
+  c = np.random.uniform(0.0,10000.0,Npatches)
+  dip = np.random.uniform(10.0,90.0,Npatches)
+  length = np.random.uniform(2000.0,10000.0,Npatches)
+  width = np.random.uniform(2000.0,10000.0,Npatches)
+  return pos,c,dip,length,width
+
+def dc3d_batch(pos,c,dip,length,width):
+  ''' 
+  calls cdc3d.dc3d_batch for each patch and slip direction
+  '''
+  out = np.zeros((len(pos),len(c),3,3))
+  for i in range(len(c)):
+    for j in range(3):
+      slip = np.zeros(3)
+      slip[j] = 1.0
+      disp = np.zeros((len(pos),3))
+      slippy.cdc3d.dc3d_batch(2.0/3.0,pos,c[i],dip[i],
+                              np.array([-0.5*length[i],0.5*length[i]]),
+                              np.array([-width[i],0.0]),slip,disp)
+      out[:,i,:,j] = disp
+
+  return out
+
+def dc3d_unit_batch(pos,c,dip,length,width):
+  ''' 
+  calls cdc3d.dc3d_unit_batch for each patch
+  '''
+  out = np.zeros((len(pos),len(c),3,3))
+  for i in range(len(c)):
+    slippy.cdc3d.dc3d_unit_batch(2.0/3.0,pos,c[i],dip[i],
+                                 np.array([-0.5*length[i],0.5*length[i]]),
+                                 np.array([-width[i],0.0]),out[:,i])
+  return out
+
+def ndc3d(pos,c,dip,length,width):
+  ''' 
+  evaluates every point and patch with the NumPy kernel
+  '''
+  out = np.zeros((len(pos),len(c),3,3))
+  slippy.ndc3d.dc3d_batch(2.0/3.0,pos[:,None,:],c,dip,
+                          np.array([-0.5*length,0.5*length]).T,
+                          np.array([-width,0.0*width]).T,None,out)
+  return out
+
+if __name__ == '__main__':
+  Npoints = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+  Npatches = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+  pos,c,dip,length,width = problem(Npoints,Npatches)
+  print('%18s %12s %20s %12s' % ('kernel','time[s]','points*patches/s',
+                                 'max diff'))
+  reference = None
+  for name,f in [('dc3d_batch',dc3d_batch),
+                 ('dc3d_unit_batch',dc3d_unit_batch),
+                 ('ndc3d',ndc3d)]:
+    t = time.time()
+    out = f(pos,c,dip,length,width)
+    t = time.time() - t
+    if reference is None:
+      reference = out
+
+    print('%18s %12.4f %20.3e %12.2e' % (name,t,Npoints*Npatches/t,
+                                         np.max(np.abs(out - reference))))
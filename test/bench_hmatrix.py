@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+''' 
+benchmarks the hierarchical approximation of the system matrix for 
+InSAR-like problems, where the observation points cover a region 
+three times larger than the fault. The dense system matrix is only 
+built to measure the accuracy of the approximation for problems 
+where it fits in memory. Run with
+
+  $ python bench_hmatrix.py
+
+'''
+import slippy.hmatrix
+import slippy.gbuild
+import slippy.patch
+import numpy as np
+import time
+
+# (observation points,Nlength,Nwidth) of each problem
+PROBLEMS = [(5000,20,8),(20000,20,8),(100000,20,8),(100000,40,16)]
+
+# dense matrices are only built for problems with at most this many 
+# entries
+MAX_DENSE = 2*10**7
+
+def timeit(f,*args,**kwargs):
+  t = time.time()
+  out = f(*args,**kwargs)
+  return time.time() - t,out
+
+def problem(Npoints,Nl,Nw):
+  ''' 
+  random surface observation points with random look directions and a 
+  100 km fault with two slip basis vectors for each patch
+  '''
+  np.random.seed(1)
+  pos = np.zeros((Npoints,3))
+  pos[:,:2] = np.random.uniform(-150000.0,150000.0,(Npoints,2))
+  disp_directions = np.random.normal(0.0,1.0,(Npoints,3))
+  disp_directions /= np.linalg.norm(disp_directions,axis=1)[:,None]
+  fault = slippy.patch.Patch([0.0,0.0,0.0],100000.0,40000.0,30.0,30.0)
+  patches = slippy.patch.PatchSet.from_patches([fault]).discretize(Nl,Nw)
+  patches = patches[np.arange(len(patches)).repeat(2)]
+  slip_directions = np.tile([[1.0,1.0,0.0],[1.0,-1.0,0.0]],
+                            (Nl*Nw,1))
+  return pos,patches,disp_directions,slip_directions
+
+if __name__ == '__main__':
+  print('%18s %10s %10s %12s %12s %12s %10s' % 
+        ('problem','dense[s]','H[s]','dense[MB]','H[MB]',
+         'compression','error'))
+  for Npoints,Nl,Nw in PROBLEMS:
+    args = problem(Npoints,Nl,Nw)
+    t_H,H = timeit(slippy.hmatrix.build_hmatrix,*args,tol=1e-4)
+    m = np.random.uniform(0.0,1.0,H.shape[1])
+    if H.shape[0]*H.shape[1] <= MAX_DENSE:
+      t_dense,G = timeit(slippy.gbuild.build_system_matrix,*args)
+      # relative error of the predicted displacements
+      error = (np.linalg.norm(H.matvec(m) - G.dot(m))/
+               np.linalg.norm(G.dot(m)))
+      t_dense = '%10.2f' % t_dense
+      error = '%10.1e' % error
+      del G
+    else:
+      t_dense = '%10s' % '-'
+      error = '%10s' % '-'
+
+    name = '%dx%d' % H.shape
+    print('%18s %s %10.2f %12.1f %12.1f %12.1f %s' % 
+          (name,t_dense,t_H,8e-6*H.shape[0]*H.shape[1],1e-6*H.nbytes,
+           H.compression_ratio(),error))
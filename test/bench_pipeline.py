@@ -0,0 +1,341 @@
+#!/usr/bin/env python
+'''
+benchmarks each stage of the slip inversion for synthetic problems of
+several sizes. The run time of each stage and the peak memory of the
+process after each stage are written to a JSON file, which can be
+compared with the results for another version of SlipPy. Each problem
+is run in a new process so that the peak memory of one problem does
+not carry over to the next. Run with
+
+  $ python bench_pipeline.py [case1 case2 ...] [--output results.json]
+                             [--compare old_results.json]
+
+The stages are the same as in slippy.inversion.main
+
+  io : reading the GPS and InSAR text files
+  projection : assembling the observations and converting them to
+    cartesian coordinates
+  discretize : discretizing the fault segment
+  gbuild : building the weighted system matrix
+  lbuild : building the regularization matrix
+  solve : estimating slip
+  output : computing the predicted displacements and writing the
+    output files
+
+The synthetic problems are like the one in example/synthetic. The
+fault segment slips uniformly and the observations are scattered
+around it.
+
+'''
+import slippy.io
+import slippy.tmerc
+import slippy.patch
+import slippy.basis
+import slippy.okada
+import slippy.gbuild
+import slippy.tikhonov
+import slippy.inversion
+import numpy as np
+import scipy
+import scipy.sparse
+import concurrent.futures
+import multiprocessing
+import subprocess
+import collections
+import platform
+import argparse
+import tempfile
+import shutil
+import json
+import time
+import os
+
+# (observations,Nlength,Nwidth,slip basis vectors) for each problem.
+# The number of observations is the number of rows in the system
+# matrix
+CASES = collections.OrderedDict([
+  ('1k_obs_100_patches',(1000,10,10,2)),
+  ('5k_obs_400_patches',(5000,20,20,2)),
+  ('100k_obs_400_patches',(100000,20,20,2)),
+  ('1M_obs_100_patches',(1000000,10,10,2)),
+  ('10k_obs_20k_patches',(10000,200,100,1))])
+
+# these are run if no cases are specified
+DEFAULT_CASES = ['1k_obs_100_patches','5k_obs_400_patches']
+
+STAGES = ['io','projection','discretize','gbuild','lbuild','solve',
+          'output']
+
+# fault segment
+SEGMENT = {'position':[-84.2,43.3,0.0],
+           'length':200000.0,
+           'width':60000.0,
+           'strike':70.0,
+           'dip':45.0}
+
+PENALTY = 10.0
+
+
+def make_problem(Nobs,directory):
+  '''
+  writes synthetic GPS and InSAR files. One tenth of the observations
+  are GPS displacement components and the rest are InSAR pixels
+  '''
+  np.random.seed(1)
+  Ngps = max(Nobs//30,1)
+  Ninsar = Nobs - 3*Ngps
+  pos_geo = np.zeros((Ngps + Ninsar,3))
+  pos_geo[:,:2] = np.random.normal(0.0,1.0,(Ngps + Ninsar,2))
+  pos_geo[:,0] += SEGMENT['position'][0]
+  pos_geo[:,1] += SEGMENT['position'][1]
+  bm = slippy.tmerc.create_default_basemap(pos_geo[:,0],pos_geo[:,1])
+  pos_cart = slippy.tmerc.geodetic_to_cartesian(pos_geo,bm)
+  seg_pos_cart = slippy.tmerc.geodetic_to_cartesian(SEGMENT['position'],bm)
+  segment = slippy.patch.Patch(seg_pos_cart,SEGMENT['length'],
+                               SEGMENT['width'],SEGMENT['strike'],
+                               SEGMENT['dip'])
+  disp,derr = slippy.okada.patch_dislocation(pos_cart,[1.0,0.5,0.0],segment)
+
+  gps_disp = disp[:Ngps] + np.random.normal(0.0,0.003,(Ngps,3))
+  gps_sigma = 0.003*np.ones((Ngps,3))
+  gps_file = os.path.join(directory,'gps.txt')
+  slippy.io.write_gps_data(pos_geo[:Ngps],gps_disp,gps_sigma,gps_file)
+
+  look = np.random.uniform(0.5,1.0,(Ninsar,3))
+  look /= np.linalg.norm(look,axis=1)[:,None]
+  insar_disp = np.einsum('ij,ij->i',disp[Ngps:],look)
+  insar_disp += np.random.normal(0.0,0.01,Ninsar)
+  insar_sigma = 0.01*np.ones(Ninsar)
+  insar_file = os.path.join(directory,'insar.txt')
+  slippy.io.write_insar_data(pos_geo[Ngps:],insar_disp,insar_sigma,look,
+                             insar_file)
+  return gps_file,insar_file
+
+
+def stage_io(gps_file,insar_file):
+  gps = slippy.io.read_gps_data(gps_file)
+  insar = slippy.io.read_insar_data(insar_file)
+  return gps,insar
+
+
+def stage_projection(gps,insar):
+  gps_pos_geo,gps_disp,gps_sigma = gps
+  insar_pos_geo,insar_disp,insar_sigma,insar_basis = insar
+  Ngps,Ninsar = len(gps_pos_geo),len(insar_pos_geo)
+  bm = slippy.tmerc.create_default_basemap(
+    np.concatenate((gps_pos_geo[:,0],insar_pos_geo[:,0])),
+    np.concatenate((gps_pos_geo[:,1],insar_pos_geo[:,1])))
+  obs = {'Ngps':Ngps}
+  obs['pos_geo'] = np.vstack((gps_pos_geo.repeat(3,axis=0),insar_pos_geo))
+  obs['disp'] = np.concatenate((gps_disp.ravel(),insar_disp))
+  obs['sigma'] = np.concatenate((gps_sigma.ravel(),insar_sigma))
+  obs['basis'] = np.vstack((slippy.basis.cardinal_basis((Ngps,3)).reshape((Ngps*3,3)),
+                            insar_basis))
+  obs['pos_cart'] = slippy.tmerc.geodetic_to_cartesian(obs['pos_geo'],bm)
+  seg_pos_cart = slippy.tmerc.geodetic_to_cartesian(SEGMENT['position'],bm)
+  return bm,obs,seg_pos_cart
+
+
+def stage_discretize(seg_pos_cart,Nl,Nw,Ds):
+  seg = slippy.patch.PatchSet([seg_pos_cart],[SEGMENT['length']],
+                              [SEGMENT['width']],[SEGMENT['strike']],
+                              [SEGMENT['dip']])
+  patches = seg.discretize(Nl,Nw)
+  Ns = len(patches)
+  slip_basis = np.array([[1.0,1.0,0.0],[1.0,-1.0,0.0]])[:Ds]
+  patches_f = patches[np.arange(Ns).repeat(Ds)]
+  slip_basis_f = np.tile(slip_basis,(Ns,1))
+  return patches,patches_f,slip_basis_f
+
+
+def stage_gbuild(obs,patches_f,slip_basis_f,dtype,workers):
+  row_scale = 1.0/obs['sigma']
+  G = slippy.gbuild.build_system_matrix(obs['pos_cart'],patches_f,
+                                        obs['basis'],slip_basis_f,
+                                        workers=workers,
+                                        row_scale=row_scale,
+                                        dtype=dtype)
+  return G,row_scale
+
+
+def stage_lbuild(Nl,Nw,Ds):
+  Ns = Nl*Nw
+  indices = np.arange(Ns*Ds).reshape((Ns,Ds))
+  L_blocks = []
+  for i in range(Ds):
+    connectivity = indices[:,i].reshape((Nl,Nw))
+    L_blocks += [slippy.tikhonov.tikhonov_matrix(connectivity,2,
+                                                 column_no=Ns*Ds,
+                                                 sparse=True)]
+
+  return PENALTY*scipy.sparse.vstack(L_blocks,format='csr')
+
+
+def stage_solve(G,L,d,solver):
+  return slippy.inversion.reg_nnls(G,L,0.0,d,solver=solver)
+
+
+def stage_output(G,slip_f,row_scale,obs,patches,bm,Ds,directory):
+  pred_disp_f = slippy.inversion._matvec(G,slip_f)/row_scale
+  Ngps = obs['Ngps']
+  slip = slip_f.reshape((len(patches),Ds))
+  slip_basis = np.array([[1.0,1.0,0.0],[1.0,-1.0,0.0]])[:Ds]
+  cardinal_slip = slippy.basis.cardinal_components(
+    slip,slip_basis[None].repeat(len(patches),axis=0))
+  patches_pos_geo = slippy.tmerc.cartesian_to_geodetic(patches.top_centers(),bm)
+  slippy.io.write_slip_data(patches_pos_geo,patches.strike,patches.dip,
+                            patches.length,patches.width,cardinal_slip,
+                            np.zeros(len(patches)),
+                            os.path.join(directory,'predicted_slip.txt'))
+  pred_gps = pred_disp_f[:3*Ngps].reshape((Ngps,3))
+  slippy.io.write_gps_data(obs['pos_geo'][:3*Ngps:3],pred_gps,0.0*pred_gps,
+                           os.path.join(directory,'predicted_gps.txt'))
+  pred_insar = pred_disp_f[3*Ngps:]
+  slippy.io.write_insar_data(obs['pos_geo'][3*Ngps:],pred_insar,
+                             0.0*pred_insar,obs['basis'][3*Ngps:],
+                             os.path.join(directory,'predicted_insar.txt'))
+  return
+
+
+def run_case(name,solver,dtype,workers):
+  '''
+  runs each stage of the inversion for the problem called name and
+  returns the run times and the peak memory after each stage
+  '''
+  Nobs,Nl,Nw,Ds = CASES[name]
+  directory = tempfile.mkdtemp()
+  stages = collections.OrderedDict()
+  def timed(stage,f,*args):
+    t = time.time()
+    out = f(*args)
+    stages[stage] = {'time':time.time() - t,
+                     'max_rss':slippy.inversion.peak_memory()}
+    return out
+
+  try:
+    gps_file,insar_file = make_problem(Nobs,directory)
+    gps,insar = timed('io',stage_io,gps_file,insar_file)
+    bm,obs,seg_pos_cart = timed('projection',stage_projection,gps,insar)
+    del gps,insar
+    patches,patches_f,slip_basis_f = timed('discretize',stage_discretize,
+                                           seg_pos_cart,Nl,Nw,Ds)
+    G,row_scale = timed('gbuild',stage_gbuild,obs,patches_f,slip_basis_f,
+                        dtype,workers)
+    L = timed('lbuild',stage_lbuild,Nl,Nw,Ds)
+    d = obs['disp']*row_scale
+    slip_f = timed('solve',stage_solve,G,L,d,solver)
+    timed('output',stage_output,G,slip_f,row_scale,obs,patches,bm,Ds,
+          directory)
+  finally:
+    shutil.rmtree(directory)
+
+  return {'observations':Nobs,
+          'patches':Nl*Nw,
+          'slip_basis':Ds,
+          'system_matrix_shape':list(G.shape),
+          'total_time':sum(s['time'] for s in stages.values()),
+          'max_rss':slippy.inversion.peak_memory(),
+          'stages':stages}
+
+
+def version():
+  '''
+  returns the git commit of the SlipPy source tree, or None
+  '''
+  try:
+    out = subprocess.check_output(
+      ['git','describe','--always','--dirty'],
+      cwd=os.path.dirname(os.path.abspath(slippy.inversion.__file__)),
+      stderr=subprocess.DEVNULL)
+    return out.decode().strip()
+  except (OSError,subprocess.CalledProcessError):
+    return None
+
+
+def print_results(results):
+  for name,case in results['cases'].items():
+    print('')
+    print('%s: %d x %d system matrix' % ((name,) + tuple(case['system_matrix_shape'])))
+    print('%12s %12s %14s' % ('stage','time[s]','max rss[MB]'))
+    for stage,s in case['stages'].items():
+      rss = s['max_rss']
+      print('%12s %12.4f %14s' % (stage,s['time'],
+                                  '-' if rss is None else '%.1f' % (rss/1e6)))
+    print('%12s %12.4f' % ('total',case['total_time']))
+
+
+def compare(old,new,tolerance):
+  '''
+  prints the ratio of the new and old run times for each stage.
+  Stages which are more than tolerance slower are marked as
+  regressions
+  '''
+  print('')
+  print('comparison with %s' % old.get('version'))
+  print('%24s %12s %12s %12s %8s' % ('case','stage','old[s]','new[s]',
+                                     'ratio'))
+  regressions = 0
+  for name,case in new['cases'].items():
+    if name not in old['cases']:
+      continue
+
+    for stage,s in case['stages'].items():
+      t_old = old['cases'][name]['stages'][stage]['time']
+      ratio = s['time']/max(t_old,1e-9)
+      # stages that take less than 10ms are too noisy to compare
+      slower = (ratio > 1.0 + tolerance) & (s['time'] > 0.01)
+      regressions += slower
+      print('%24s %12s %12.4f %12.4f %8.2f %s' % (name,stage,t_old,s['time'],
+                                                  ratio,'*' if slower else ''))
+
+  print('%d stages are more than %d%% slower' % (regressions,100*tolerance))
+
+
+if __name__ == '__main__':
+  p = argparse.ArgumentParser(description='benchmarks the stages of the '
+                                          'slip inversion')
+  p.add_argument('cases',nargs='*',default=DEFAULT_CASES,
+                 help='problems to run, which can be any of %s. '
+                      'Defaults to %s' % (list(CASES),DEFAULT_CASES))
+  p.add_argument('--output',type=str,default='bench_pipeline.json',
+                 help='JSON file where the results are written')
+  p.add_argument('--compare',type=str,default=None,
+                 help='JSON file containing results for another version '
+                      'to compare against')
+  p.add_argument('--tolerance',type=float,default=0.2,
+                 help='relative slowdown that is reported as a regression')
+  p.add_argument('--solver',type=str,default='stacked',
+                 choices=['stacked','normal'])
+  p.add_argument('--dtype',type=str,default='float64',
+                 choices=['float64','float32'])
+  p.add_argument('--workers',type=int,default=1)
+  args = p.parse_args()
+  for name in args.cases:
+    if name not in CASES:
+      p.error('unknown case "%s"' % name)
+
+  results = {'version':version(),
+             'date':time.strftime('%Y-%m-%d %H:%M:%S'),
+             'python':platform.python_version(),
+             'numpy':np.__version__,
+             'scipy':scipy.__version__,
+             'machine':platform.machine(),
+             'cpu_count':os.cpu_count(),
+             'options':{'solver':args.solver,'dtype':args.dtype,
+                        'workers':args.workers},
+             'cases':collections.OrderedDict()}
+  context = multiprocessing.get_context('spawn')
+  for name in args.cases:
+    with concurrent.futures.ProcessPoolExecutor(1,mp_context=context) as ex:
+      results['cases'][name] = ex.submit(run_case,name,args.solver,
+                                         args.dtype,args.workers).result()
+
+  print_results(results)
+  with open(args.output,'w') as fout:
+    json.dump(results,fout,indent=2)
+
+  print('')
+  print('results were written to %s' % args.output)
+  if args.compare is not None:
+    with open(args.compare,'r') as fin:
+      compare(json.load(fin),results,args.tolerance)
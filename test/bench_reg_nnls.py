@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+''' 
+benchmarks the stacked and normal equation solvers in 
+slippy.inversion.reg_nnls as the number of observations grows. Run 
+with
+
+  $ python bench_reg_nnls.py [Nobs1 Nobs2 ...]
+
+'''
+import slippy.inversion
+import slippy.tikhonov
+import numpy as np
+import time
+import sys
+
+def problem(Nobs,Nl=20,Nw=10):
+  ''' 
+  creates a smooth, nonnegative slip inversion problem 
+  '''
+  np.random.seed(1)
+  M = Nl*Nw
+  # observation points and patch centers on a line
+  x_obs = np.random.uniform(-1.0,2.0,Nobs)
+  x_patch = np.linspace(0.0,1.0,M)
+  G = 1.0/(1.0 + 100*(x_obs[:,None] - x_patch[None,:])**2)
+  m_true = np.maximum(np.sin(np.pi*x_patch),0.0)
+  d = G.dot(m_true) + np.random.normal(0.0,0.01,Nobs)
+  C = np.arange(M).reshape((Nl,Nw))
+  L = slippy.tikhonov.tikhonov_matrix(C,2)
+  return G,L,d
+
+if __name__ == '__main__':
+  if len(sys.argv) > 1:
+    sizes = [int(i) for i in sys.argv[1:]]
+  else:
+    sizes = [1000,4000,16000]
+
+  print('%10s %12s %12s %12s' % ('Nobs','stacked[s]','normal[s]','max diff'))
+  for Nobs in sizes:
+    G,L,d = problem(Nobs)
+    t = time.time()
+    soln1 = slippy.inversion.reg_nnls(G,L,0.1,d,solver='stacked')
+    t_stacked = time.time() - t
+    t = time.time()
+    soln2 = slippy.inversion.reg_nnls(G,L,0.1,d,solver='normal')
+    t_normal = time.time() - t
+    print('%10d %12.4f %12.4f %12.2e' % (Nobs,t_stacked,t_normal,
+                                          np.max(np.abs(soln1 - soln2))))
+
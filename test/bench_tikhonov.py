@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+''' 
+benchmarks the construction of Tikhonov regularization matrices as 
+the fault mesh grows. Run with
+
+  $ python bench_tikhonov.py
+
+'''
+import slippy.tikhonov
+import numpy as np
+import scipy.sparse
+import time
+
+# (Nlength,Nwidth) of the fault meshes
+MESHES = [(10,10),(50,20),(100,40),(200,100)]
+
+# dense matrices are only built for meshes with at most this many 
+# patches
+MAX_DENSE = 5000
+
+def timeit(f,*args,**kwargs):
+  t = time.time()
+  out = f(*args,**kwargs)
+  return time.time() - t,out
+
+if __name__ == '__main__':
+  print('%12s %6s %12s %12s %12s %12s' % ('mesh','order','sparse[s]',
+                                          'dense[s]','rows',
+                                          'sparse[kB]'))
+  for Nl,Nw in MESHES:
+    C = np.arange(Nl*Nw).reshape((Nl,Nw))
+    for order in [0,1,2]:
+      t_sparse,L = timeit(slippy.tikhonov.tikhonov_matrix,C,order,
+                          sparse=True)
+      if Nl*Nw <= MAX_DENSE:
+        t_dense,_ = timeit(slippy.tikhonov.tikhonov_matrix,C,order)
+        t_dense = '%12.4f' % t_dense
+      else:
+        t_dense = '%12s' % '-'
+
+      size = (L.data.nbytes + L.indices.nbytes + L.indptr.nbytes)/1e3
+      print('%12s %6d %12.4f %s %12d %12.1f' % ('%sx%s' % (Nl,Nw),order,
+                                                t_sparse,t_dense,
+                                                L.shape[0],size))
+
+  print('')
+  print('%12s %12s %12s' % ('mesh','dense[s]','sparse[s]'))
+  for Nl,Nw in MESHES:
+    if Nl*Nw > MAX_DENSE:
+      continue
+    # first order operator padded with as many zero rows as in the 
+    # original dense construction
+    C = np.arange(Nl*Nw).reshape((Nl,Nw))
+    L = slippy.tikhonov.tikhonov_matrix(C,1)
+    L = np.vstack((L,np.zeros((2*Nl*Nw - L.shape[0],Nl*Nw))))
+    t_dense,_ = timeit(slippy.tikhonov.remove_zero_rows,L)
+    t_sparse,_ = timeit(slippy.tikhonov.remove_zero_rows,
+                        scipy.sparse.csr_matrix(L))
+    print('%12s %12.4f %12.4f' % ('%sx%s' % (Nl,Nw),t_dense,t_sparse))
+
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+''' 
+benchmarks building the patch to user transformations for many fault 
+patches and transforming the patch corners, either with a loop over 
+Patch instances or with a single TransformStack. Run with
+
+  $ python bench_transform.py
+
+'''
+import slippy.transform
+import slippy.patch
+import numpy as np
+import time
+
+SIZES = [10**2,10**3,10**4,10**5]
+
+CORNERS = np.array([[0.0,0.0,0.0],
+                    [1.0,0.0,0.0],
+                    [1.0,1.0,0.0],
+                    [0.0,1.0,0.0]])
+
+def timeit(f,*args,**kwargs):
+  t = time.time()
+  out = f(*args,**kwargs)
+  return time.time() - t,out
+
+def loop(pos,length,width,strike,dip):
+  patches = [slippy.patch.Patch(*a) for a in zip(pos,length,width,strike,dip)]
+  return np.array([p.patch_to_user(CORNERS) for p in patches])
+
+def stack(pos,length,width,strike,dip):
+  stretch = np.column_stack((length,width,np.ones(len(length))))
+  trans  = slippy.transform.point_translation(-np.array([0.5,1.0,0.0]))
+  trans += slippy.transform.point_stretch(stretch)
+  trans += slippy.transform.point_rotation_x(np.pi*dip/180.0)
+  trans += slippy.transform.point_rotation_z(np.pi/2.0 - np.pi*strike/180.0)
+  trans += slippy.transform.point_translation(pos)
+  return trans(CORNERS[None])
+
+if __name__ == '__main__':
+  np.random.seed(1)
+  print('%12s %16s %16s %12s' % ('patches','loop[s]','stack[s]','speedup'))
+  for N in SIZES:
+    pos = np.random.uniform(-1e5,1e5,(N,3))
+    pos[:,2] = -np.random.uniform(1e3,1e4,N)
+    length = np.random.uniform(1e3,1e4,N)
+    width = np.random.uniform(1e3,1e4,N)
+    strike = np.random.uniform(0.0,360.0,N)
+    dip = np.random.uniform(10.0,90.0,N)
+    t_stack,out_stack = timeit(stack,pos,length,width,strike,dip)
+    if N <= 10**4:
+      t_loop,out_loop = timeit(loop,pos,length,width,strike,dip)
+      assert np.allclose(out_loop,out_stack)
+      print('%12d %16.4f %16.4f %12.1f' % (N,t_loop,t_stack,t_loop/t_stack))
+    else:
+      print('%12d %16s %16.4f %12s' % (N,'-',t_stack,'-'))
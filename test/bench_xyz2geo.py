@@ -0,0 +1,38 @@
+#!/usr/bin/env python
+''' 
+benchmarks the conversions between geodetic and cartesian coordinates 
+in slippy.xyz2geo and slippy.tmerc for up to 10 million points. Run 
+with
+
+  $ python bench_xyz2geo.py
+
+'''
+import slippy.xyz2geo
+import slippy.tmerc
+import numpy as np
+import time
+
+SIZES = [10**4,10**5,10**6,10**7]
+
+MODULES = [slippy.xyz2geo,slippy.tmerc]
+
+def timeit(f,*args,**kwargs):
+  t = time.time()
+  out = f(*args,**kwargs)
+  return time.time() - t,out
+
+if __name__ == '__main__':
+  np.random.seed(1)
+  print('%16s %12s %16s %16s %16s' % ('module','points','basemap[s]',
+                                      'geo->cart[s]','cart->geo[s]'))
+  for module in MODULES:
+    for N in SIZES:
+      pos_geo = np.zeros((N,3))
+      pos_geo[:,0] = np.random.uniform(-90.0,-80.0,N)
+      pos_geo[:,1] = np.random.uniform(35.0,45.0,N)
+      t_bm,bm = timeit(module.create_default_basemap,
+                       pos_geo[:,0],pos_geo[:,1])
+      t_cart,pos_cart = timeit(module.geodetic_to_cartesian,pos_geo,bm)
+      t_geo,_ = timeit(module.cartesian_to_geodetic,pos_cart,bm)
+      print('%16s %12d %16.4f %16.4f %16.4f' % (module.__name__,N,t_bm,
+                                                t_cart,t_geo))
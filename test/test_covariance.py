@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+import slippy.covariance
+import numpy as np
+import scipy.spatial.distance
+import unittest
+import tempfile
+import shutil
+import os
+
+class Test(unittest.TestCase):
+  def setUp(self):
+    self.cache_dir = tempfile.mkdtemp()
+    np.random.seed(5)
+    N = 300
+    self.pos = np.zeros((N,3))
+    self.pos[:,:2] = np.random.uniform(0.0,100.0,(N,2))
+    self.sigma = np.random.uniform(0.5,1.0,N)
+    self.options = {'sill':2.0,'length_scale':20.0}
+
+  def tearDown(self):
+    shutil.rmtree(self.cache_dir)
+
+  def test_exponential_covariance(self):
+    C = slippy.covariance.exponential_covariance(self.pos,self.sigma,2.0,20.0)
+    r = scipy.spatial.distance.cdist(self.pos,self.pos)
+    Ctrue = 2.0*np.exp(-r/20.0) + np.diag(self.sigma**2)
+    self.assertTrue(np.allclose(C,Ctrue))
+
+  def test_cholesky(self):
+    C = slippy.covariance.exponential_covariance(self.pos,self.sigma,2.0,20.0)
+    Ccopy = np.array(C)
+    L = slippy.covariance.cholesky(C)
+    # the factor overwrites the covariance
+    self.assertTrue(np.shares_memory(L,C))
+    self.assertTrue(np.allclose(L.dot(L.T),Ccopy))
+    self.assertTrue(np.all(np.triu(L,1) == 0.0))
+
+  def test_whiten(self):
+    # least squares with the whitened rows is generalized least squares
+    N = len(self.pos)
+    C = slippy.covariance.exponential_covariance(self.pos,self.sigma,2.0,20.0)
+    Cinv = np.linalg.inv(C)
+    L = slippy.covariance.cholesky(np.array(C))
+    G = np.random.normal(0.0,1.0,(N + 10,4))
+    d = np.random.normal(0.0,1.0,N + 10)
+    rows = slice(10,N + 10)
+    Gw = G.astype(np.float32)
+    dw = np.array(d)
+    slippy.covariance.whiten(L,Gw,dw,rows)
+    W = np.eye(N + 10)
+    W[rows,rows] = Cinv
+    m1 = np.linalg.solve(G.T.dot(W).dot(G),G.T.dot(W).dot(d))
+    m2 = np.linalg.lstsq(Gw.astype(float),dw,rcond=None)[0]
+    self.assertTrue(np.allclose(m1,m2,atol=1e-5))
+    pred = slippy.covariance.unwhiten(L,Gw[rows].astype(float).dot(m2))
+    self.assertTrue(np.allclose(pred,G[rows].dot(m2),atol=1e-5))
+
+  def test_cache(self):
+    L1,hit1 = slippy.covariance.insar_cholesky(self.pos,self.sigma,
+                                               self.options,
+                                               cache_dir=self.cache_dir)
+    L2,hit2 = slippy.covariance.insar_cholesky(self.pos,self.sigma,
+                                               self.options,
+                                               cache_dir=self.cache_dir)
+    self.assertFalse(hit1)
+    self.assertTrue(hit2)
+    self.assertTrue(np.array_equal(L1,L2))
+    options = {'sill':2.0,'length_scale':21.0}
+    L3,hit3 = slippy.covariance.insar_cholesky(self.pos,self.sigma,
+                                               options,
+                                               cache_dir=self.cache_dir)
+    self.assertFalse(hit3)
+
+  def test_file(self):
+    C = slippy.covariance.exponential_covariance(self.pos,self.sigma,2.0,20.0)
+    file_name = os.path.join(self.cache_dir,'cov.npy')
+    np.save(file_name,C)
+    L1,hit = slippy.covariance.insar_cholesky(self.pos,self.sigma,
+                                              {'file':file_name})
+    L2,hit = slippy.covariance.insar_cholesky(self.pos,self.sigma,
+                                              self.options)
+    self.assertTrue(np.allclose(L1,L2))
+    self.assertRaises(ValueError,slippy.covariance.insar_cholesky,
+                      self.pos[:10],self.sigma[:10],{'file':file_name})
+    self.assertRaises(ValueError,slippy.covariance.insar_cholesky,
+                      self.pos,self.sigma,{'sill':1.0})
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+import slippy.downsample
+import numpy as np
+import unittest
+
+class Test(unittest.TestCase):
+  def setUp(self):
+    np.random.seed(3)
+    N = 2000
+    self.pos = np.zeros((N,3))
+    self.pos[:,:2] = np.random.uniform(0.0,100.0,(N,2))
+    self.sigma = np.random.uniform(0.5,1.0,N)
+    self.basis = np.random.normal(0.0,1.0,(N,3))
+    self.basis /= np.linalg.norm(self.basis,axis=1)[:,None]
+
+  def test_quadtree_constant(self):
+    disp = np.ones(len(self.pos))
+    out = slippy.downsample.quadtree(self.pos,disp,self.sigma,
+                                     self.basis,max_std=0.1)
+    self.assertTrue(len(out.disp) == 1)
+    self.assertTrue(np.all(out.index == 0))
+    self.assertTrue(np.isclose(out.disp[0],1.0))
+    sigma = np.sqrt(np.sum(self.sigma**2))/len(self.pos)
+    self.assertTrue(np.isclose(out.sigma[0],sigma))
+    self.assertTrue(np.allclose(out.pos[0],np.mean(self.pos,axis=0)))
+
+  def test_quadtree_step(self):
+    # cells with a large standard deviation are split until they do
+    # not straddle the step
+    disp = 1.0*(self.pos[:,0] > 30.0)
+    out = slippy.downsample.quadtree(self.pos,disp,self.sigma,
+                                     self.basis,max_std=0.01)
+    self.assertTrue(len(out.disp) > 1)
+    self.assertTrue(len(out.disp) < len(self.pos)/10)
+    for k in range(len(out.disp)):
+      self.assertTrue(np.std(disp[out.index == k]) <= 0.01)
+
+    self.assertTrue(np.sum(out.count) == len(self.pos))
+    self.assertTrue(np.allclose(np.linalg.norm(out.basis,axis=1),1.0))
+
+  def test_footprint(self):
+    disp = np.sin(self.pos[:,0]/10.0)
+    out = slippy.downsample.quadtree(self.pos,disp,self.sigma,
+                                     self.basis,max_std=0.05,
+                                     min_size=5.0)
+    fp = out.footprint[out.index]
+    self.assertTrue(np.all(self.pos[:,0] >= fp[:,0]))
+    self.assertTrue(np.all(self.pos[:,0] <= fp[:,1]))
+    self.assertTrue(np.all(self.pos[:,1] >= fp[:,2]))
+    self.assertTrue(np.all(self.pos[:,1] <= fp[:,3]))
+    self.assertTrue(np.all(out.footprint[:,1] - out.footprint[:,0] >= 5.0))
+
+  def test_max_size(self):
+    disp = np.zeros(len(self.pos))
+    out = slippy.downsample.quadtree(self.pos,disp,self.sigma,
+                                     self.basis,max_std=1.0,
+                                     max_size=30.0)
+    self.assertTrue(np.all(out.footprint[:,1] - out.footprint[:,0] <= 30.0))
+
+  def test_nan_pixels(self):
+    disp = np.zeros(len(self.pos))
+    disp[:10] = np.nan
+    out = slippy.downsample.quadtree(self.pos,disp,self.sigma,
+                                     self.basis,max_std=0.1)
+    self.assertTrue(np.all(out.index[:10] == -1))
+    self.assertTrue(np.all(out.index[10:] == 0))
+    pixels = slippy.downsample.upsample(out.disp,out.index)
+    self.assertTrue(np.all(np.isnan(pixels[:10])))
+    self.assertTrue(np.all(pixels[10:] == 0.0))
+
+  def test_resolution_based(self):
+    # the data are most sensitive to a source at the origin
+    def greens(pos,basis):
+      r2 = np.sum(pos[:,:2]**2,axis=1) + 10.0**2
+      return np.array([1e3/r2,1e5/r2**2]).T
+
+    disp = np.zeros(len(self.pos))
+    out = slippy.downsample.resolution_based(self.pos,disp,self.sigma,
+                                             self.basis,greens,
+                                             max_resolution=0.05,
+                                             min_size=1.0)
+    size = out.footprint[:,1] - out.footprint[:,0]
+    dist = np.linalg.norm(out.pos[:,:2],axis=1)
+    # cells are smaller near the source
+    self.assertTrue(np.mean(size[dist < 30.0]) < np.mean(size[dist > 70.0]))
+    G = greens(out.pos,out.basis)/out.sigma[:,None]
+    res = slippy.downsample.data_resolution(G,1.0)
+    split = (out.count > 1) & (size/2.0 >= 1.0)
+    self.assertTrue(np.all(res[split] <= 0.05))
+
+  def test_downsample_method(self):
+    disp = np.zeros(len(self.pos))
+    self.assertRaises(ValueError,slippy.downsample.downsample,
+                      self.pos,disp,self.sigma,self.basis,
+                      method='grid')
+    self.assertRaises(ValueError,slippy.downsample.downsample,
+                      self.pos,disp,self.sigma,self.basis,
+                      method='resolution',max_resolution=0.1)
+    # the option that controls the refinement must be given
+    self.assertRaises(ValueError,slippy.downsample.downsample,
+                      self.pos,disp,self.sigma,self.basis,
+                      method='quadtree')
+    self.assertRaises(ValueError,slippy.downsample.downsample,
+                      self.pos,disp,self.sigma,self.basis,
+                      method='resolution',greens=lambda p,b: p)
+
+  def test_empty(self):
+    out = slippy.downsample.quadtree(np.zeros((0,3)),np.zeros(0),
+                                     np.zeros(0),np.zeros((0,3)),
+                                     max_std=0.1)
+    self.assertTrue(out.pos.shape == (0,3))
+    self.assertTrue(out.index.shape == (0,))
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+import slippy.gbuild
+import slippy.patch
+import slippy.okada
+import slippy.basis
+import numpy as np
+import unittest
+
+class Test(unittest.TestCase):
+  def setUp(self):
+    # the comparisons below need a double precision backend
+    self.backend = slippy.okada.get_backend()
+    slippy.okada.set_backend('cython')
+    np.random.seed(2)
+    Npnt = 20
+    pnt = np.random.uniform(-20.0,20.0,(Npnt,3))
+    pnt[:,2] = 0.0
+    # each point is repeated for the three cardinal directions
+    self.pos = pnt[:,None,:].repeat(3,axis=1).reshape((Npnt*3,3))
+    self.disp_directions = slippy.basis.cardinal_basis((Npnt,3)).reshape((Npnt*3,3))
+    seg = slippy.patch.Patch([0.0,0.0,-1.0],10.0,5.0,30.0,60.0)
+    patches = np.array(seg.discretize(3,2))
+    slip_basis = np.array([[1.0,1.0,0.0],[1.0,-1.0,0.0]])
+    # each patch is repeated for the two slip basis vectors
+    self.patches = patches[:,None].repeat(2,axis=1).reshape((12,))
+    self.slip_directions = np.array([slip_basis for p in patches]).reshape((12,3))
+
+  def tearDown(self):
+    slippy.okada.set_backend(self.backend.name)
+
+  def test_build_system_matrix(self):
+    G = slippy.gbuild.build_system_matrix(self.pos,self.patches,
+                                          self.disp_directions,
+                                          self.slip_directions)
+    Gtrue = np.zeros(G.shape)
+    for i,p in enumerate(self.patches):
+      disp,derr = slippy.okada.patch_dislocation(self.pos,self.slip_directions[i],p)
+      Gtrue[:,i] = np.sum(disp*self.disp_directions,axis=1)
+
+    self.assertTrue(np.allclose(G,Gtrue,rtol=1e-12,atol=1e-15))
+
+  def test_build_system_matrix_leveling(self):
+    G = slippy.gbuild.build_system_matrix(self.pos,self.patches,
+                                          self.disp_directions,
+                                          self.slip_directions,
+                                          Nleveling=4)
+    self.assertTrue(G.shape == (60,13))
+    self.assertTrue(np.all(G[-4:,-1] == 1.0))
+    self.assertTrue(np.all(G[:-4,-1] == 0.0))
+
+  def test_build_system_matrix_parallel(self):
+    G1 = slippy.gbuild.build_system_matrix(self.pos,self.patches,
+                                           self.disp_directions,
+                                           self.slip_directions,
+                                           Nleveling=4)
+    G2 = slippy.gbuild.build_system_matrix(self.pos,self.patches,
+                                           self.disp_directions,
+                                           self.slip_directions,
+                                           Nleveling=4,workers=2)
+    self.assertTrue(np.array_equal(G1,G2))
+
+
+  def test_build_system_matrix_patch_set(self):
+    G1 = slippy.gbuild.build_system_matrix(self.pos,self.patches,
+                                           self.disp_directions,
+                                           self.slip_directions)
+    patches = slippy.patch.PatchSet.from_patches(self.patches)
+    G2 = slippy.gbuild.build_system_matrix(self.pos,patches,
+                                           self.disp_directions,
+                                           self.slip_directions)
+    self.assertTrue(np.array_equal(G1,G2))
+
+  def test_build_system_matrix_scaled(self):
+    row_scale = np.random.uniform(0.5,2.0,len(self.pos))
+    G1 = slippy.gbuild.build_system_matrix(self.pos,self.patches,
+                                           self.disp_directions,
+                                           self.slip_directions,
+                                           Nleveling=4)
+    for workers in [1,2]:
+      G2 = slippy.gbuild.build_system_matrix(self.pos,self.patches,
+                                             self.disp_directions,
+                                             self.slip_directions,
+                                             Nleveling=4,workers=workers,
+                                             row_scale=row_scale,
+                                             dtype=np.float32)
+      self.assertTrue(G2.dtype == np.float32)
+      self.assertTrue(np.allclose(G2,G1*row_scale[:,None],rtol=1e-6,atol=1e-9))
+
+  def test_build_system_matrix_far_field(self):
+    pos = self.pos*20.0
+    G1 = slippy.gbuild.build_system_matrix(pos,self.patches,
+                                           self.disp_directions,
+                                           self.slip_directions)
+    for workers in [1,2]:
+      info = {}
+      G2 = slippy.gbuild.build_system_matrix(pos,self.patches,
+                                             self.disp_directions,
+                                             self.slip_directions,
+                                             workers=workers,
+                                             far_field_tol=1e-2,
+                                             info=info)
+      self.assertTrue(0.0 < info['far_field_fraction'] < 1.0)
+      self.assertTrue(0.0 < info['far_field_error'] <= 1e-2)
+      self.assertTrue(np.allclose(G2,G1,rtol=0.0,
+                                  atol=1e-2*np.max(np.abs(G1))))
+      # the entries which were not approximated are exact
+      self.assertEqual(np.sum(G1 != G2),
+                       round(info['far_field_fraction']*G1.size))
+
+    info = {}
+    G3 = slippy.gbuild.build_system_matrix(pos,self.patches,
+                                           self.disp_directions,
+                                           self.slip_directions,
+                                           far_field_tol=1e-12,info=info)
+    self.assertEqual(info['far_field_fraction'],0.0)
+    self.assertTrue(np.array_equal(G1,G3))
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+import slippy.gcache
+import slippy.gbuild
+import slippy.patch
+import numpy as np
+import unittest
+import tempfile
+import shutil
+import os
+
+class Test(unittest.TestCase):
+  def setUp(self):
+    self.cache_dir = tempfile.mkdtemp()
+    np.random.seed(3)
+    self.pos = np.random.uniform(-20.0,20.0,(10,3))
+    self.pos[:,2] = 0.0
+    self.disp_directions = np.random.normal(0.0,1.0,(10,3))
+    seg = slippy.patch.Patch([0.0,0.0,-1.0],10.0,5.0,30.0,60.0)
+    self.patches = seg.discretize(2,2)
+    self.slip_directions = np.random.normal(0.0,1.0,(4,3))
+
+  def tearDown(self):
+    shutil.rmtree(self.cache_dir)
+
+  def test_hit(self):
+    G1,hit1 = slippy.gcache.cached_system_matrix(self.cache_dir,self.pos,
+                                                 self.patches,
+                                                 self.disp_directions,
+                                                 self.slip_directions)
+    G2,hit2 = slippy.gcache.cached_system_matrix(self.cache_dir,self.pos,
+                                                 self.patches,
+                                                 self.disp_directions,
+                                                 self.slip_directions)
+    self.assertFalse(hit1)
+    self.assertTrue(hit2)
+    self.assertTrue(np.array_equal(G1,G2))
+
+  def test_modify_hit(self):
+    # modifying a loaded matrix must not change the cached matrix
+    slippy.gcache.cached_system_matrix(self.cache_dir,self.pos,
+                                       self.patches,
+                                       self.disp_directions,
+                                       self.slip_directions)
+    G1,hit1 = slippy.gcache.cached_system_matrix(self.cache_dir,self.pos,
+                                                 self.patches,
+                                                 self.disp_directions,
+                                                 self.slip_directions)
+    G1_copy = np.array(G1)
+    G1 /= 2.0
+    G2,hit2 = slippy.gcache.cached_system_matrix(self.cache_dir,self.pos,
+                                                 self.patches,
+                                                 self.disp_directions,
+                                                 self.slip_directions)
+    self.assertTrue(np.array_equal(G1_copy,G2))
+
+  def test_miss(self):
+    key1 = slippy.gcache.geometry_hash(self.pos,self.patches,
+                                       self.disp_directions,
+                                       self.slip_directions)
+    pos = np.array(self.pos)
+    pos[0,0] += 1e-6
+    key2 = slippy.gcache.geometry_hash(pos,self.patches,
+                                       self.disp_directions,
+                                       self.slip_directions)
+    key3 = slippy.gcache.geometry_hash(self.pos,self.patches,
+                                       self.disp_directions,
+                                       self.slip_directions,
+                                       Nleveling=1)
+    key4 = slippy.gcache.geometry_hash(self.pos,self.patches,
+                                       self.disp_directions,
+                                       self.slip_directions,
+                                       far_field_tol=1e-3)
+    self.assertTrue(len(set([key1,key2,key3,key4])) == 4)
+    # the double precision backends share their keys, and the single 
+    # precision fortran backend does not
+    key5 = slippy.gcache.geometry_hash(self.pos,self.patches,
+                                       self.disp_directions,
+                                       self.slip_directions,
+                                       backend='fortran')
+    key6 = slippy.gcache.geometry_hash(self.pos,self.patches,
+                                       self.disp_directions,
+                                       self.slip_directions,
+                                       backend='numpy')
+    key7 = slippy.gcache.geometry_hash(self.pos,self.patches,
+                                       self.disp_directions,
+                                       self.slip_directions,
+                                       backend='cython')
+    self.assertEqual(key6,key7)
+    self.assertNotEqual(key5,key6)
+
+  def test_evict(self):
+    G = np.zeros((10,10))
+    for i,key in enumerate(['a','b','c']):
+      slippy.gcache.save(G,key,self.cache_dir)
+      # make sure the access times are distinct
+      os.utime(os.path.join(self.cache_dir,'G_%s.npy' % key),(i,i))
+
+    size = os.path.getsize(os.path.join(self.cache_dir,'G_a.npy'))
+    # access 'a' so that 'b' is the least recently used
+    slippy.gcache.load('a',self.cache_dir)
+    slippy.gcache.evict(self.cache_dir,2*size)
+    self.assertTrue(sorted(os.listdir(self.cache_dir)) == ['G_a.npy','G_c.npy'])
+
+
+  def test_scaled(self):
+    # the unscaled matrix is cached and it is scaled when it is loaded
+    row_scale = np.random.uniform(0.5,2.0,10)
+    G = slippy.gbuild.build_system_matrix(self.pos,self.patches,
+                                          self.disp_directions,
+                                          self.slip_directions)
+    for dtype in [np.float64,np.float32]:
+      for i in range(2):
+        G1,hit = slippy.gcache.cached_system_matrix(self.cache_dir,self.pos,
+                                                    self.patches,
+                                                    self.disp_directions,
+                                                    self.slip_directions,
+                                                    row_scale=row_scale,
+                                                    dtype=dtype)
+        self.assertTrue(G1.dtype == dtype)
+        self.assertTrue(np.allclose(G1,G*row_scale[:,None],rtol=1e-6))
+
+    G2,hit = slippy.gcache.cached_system_matrix(self.cache_dir,self.pos,
+                                                self.patches,
+                                                self.disp_directions,
+                                                self.slip_directions)
+    self.assertTrue(hit)
+    self.assertTrue(np.array_equal(G,G2))
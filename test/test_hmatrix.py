@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+import slippy.hmatrix
+import slippy.gbuild
+import slippy.patch
+import numpy as np
+import scipy.sparse.linalg
+import unittest
+
+class Test(unittest.TestCase):
+  def setUp(self):
+    np.random.seed(3)
+    Npnt = 600
+    self.pos = np.zeros((Npnt,3))
+    self.pos[:,:2] = np.random.uniform(-300.0,300.0,(Npnt,2))
+    self.disp_directions = np.random.normal(0.0,1.0,(Npnt,3))
+    seg = slippy.patch.Patch([0.0,0.0,0.0],40.0,20.0,30.0,60.0)
+    patches = slippy.patch.PatchSet.from_patches([seg]).discretize(8,4)
+    # each patch is repeated for the two slip basis vectors
+    self.patches = patches[np.arange(len(patches)).repeat(2)]
+    self.slip_directions = np.tile([[1.0,1.0,0.0],[1.0,-1.0,0.0]],
+                                   (len(patches),1))
+
+  def test_cluster_tree(self):
+    perm,root = slippy.hmatrix.cluster_tree(self.pos,leaf_size=50)
+    self.assertTrue(np.array_equal(np.sort(perm),np.arange(len(self.pos))))
+    def check(node):
+      x = self.pos[perm[node.start:node.stop]]
+      self.assertTrue(np.all(x >= node.lower))
+      self.assertTrue(np.all(x <= node.upper))
+      if len(node.children) == 0:
+        self.assertTrue(node.stop - node.start <= 50)
+      else:
+        self.assertEqual(node.children[0].start,node.start)
+        self.assertEqual(node.children[0].stop,node.children[1].start)
+        self.assertEqual(node.children[1].stop,node.stop)
+        for child in node.children:
+          check(child)
+
+    check(root)
+
+  def test_aca(self):
+    A = np.random.normal(0.0,1.0,(40,3)).dot(np.random.normal(0.0,1.0,(3,30)))
+    U,V = slippy.hmatrix.aca(lambda i:A[i],lambda j:A[:,j],A.shape,
+                             tol=1e-10)
+    self.assertTrue(U.shape[1] <= 4)
+    self.assertTrue(np.allclose(U.dot(V.T),A,rtol=0.0,atol=1e-10))
+    U,V = slippy.hmatrix.recompress(U,V,tol=1e-10)
+    self.assertEqual(U.shape[1],3)
+    self.assertTrue(np.allclose(U.dot(V.T),A,rtol=0.0,atol=1e-10))
+    # the approximation is abandoned if it needs too many terms
+    A = np.random.normal(0.0,1.0,(40,30))
+    out = slippy.hmatrix.aca(lambda i:A[i],lambda j:A[:,j],A.shape,
+                             tol=1e-10,max_rank=5)
+    self.assertTrue(out is None)
+
+  def test_build_hmatrix(self):
+    row_scale = np.random.uniform(0.5,2.0,len(self.pos))
+    G = slippy.gbuild.build_system_matrix(self.pos,self.patches,
+                                          self.disp_directions,
+                                          self.slip_directions,
+                                          row_scale=row_scale)
+    H = slippy.hmatrix.build_hmatrix(self.pos,self.patches,
+                                     self.disp_directions,
+                                     self.slip_directions,tol=1e-6,
+                                     leaf_size=32,row_scale=row_scale)
+    self.assertEqual(H.shape,G.shape)
+    self.assertTrue(len(H.low_rank) > 0)
+    self.assertTrue(H.compression_ratio() > 1.0)
+    self.assertTrue(np.allclose(H.toarray(),G,rtol=0.0,
+                                atol=1e-5*np.max(np.abs(G))))
+    m = np.random.normal(0.0,1.0,G.shape[1])
+    d = np.random.normal(0.0,1.0,G.shape[0])
+    self.assertTrue(np.allclose(H.matvec(m),H.toarray().dot(m)))
+    self.assertTrue(np.allclose(H.rmatvec(d),H.toarray().T.dot(d)))
+    # the matrix can be used with the iterative solvers in scipy
+    m_est = scipy.sparse.linalg.lsqr(H.aslinearoperator(),G.dot(m),
+                                     atol=1e-12,btol=1e-12)[0]
+    self.assertTrue(np.allclose(G.dot(m_est),G.dot(m),rtol=0.0,
+                                atol=1e-4*np.max(np.abs(G.dot(m)))))
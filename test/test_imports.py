@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+import subprocess
+import sys
+import os
+import unittest
+
+# modules used to run an inversion, none of which should import a 
+# plotting library
+ENGINE_MODULES = ['slippy.inversion','slippy.gbuild','slippy.gcache',
+                  'slippy.okada','slippy.patch','slippy.tikhonov',
+                  'slippy.basis','slippy.io','slippy.downsample',
+                  'slippy.xyz2geo','slippy.tmerc','slippy.bm']
+
+PLOTTING_PACKAGES = ('matplotlib','mpl_toolkits','pylab')
+
+def imported_modules(modules):
+  ''' 
+  returns the names of all modules that are imported by a fresh 
+  interpreter when the given modules are imported
+  '''
+  code = ('import sys\n' +
+          ''.join('import %s\n' % m for m in modules) +
+          'print("\\n".join(sys.modules))\n')
+  root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+  env = dict(os.environ)
+  env['PYTHONPATH'] = os.pathsep.join([root] + 
+                                      env.get('PYTHONPATH','').split(os.pathsep))
+  out = subprocess.check_output([sys.executable,'-c',code],env=env)
+  return out.decode().split()
+
+class Test(unittest.TestCase):
+  def test_no_plotting_imports(self):
+    names = imported_modules(ENGINE_MODULES)
+    plotting = [n for n in names if n.split('.')[0] in PLOTTING_PACKAGES]
+    self.assertTrue(len(plotting) == 0,
+                    'plotting modules were imported: %s' % plotting[:5])
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+import slippy.inversion
+import numpy as np
+import scipy.sparse
+import unittest
+
+class Test(unittest.TestCase):
+  def setUp(self):
+    np.random.seed(4)
+    self.G = np.random.normal(0.0,1.0,(40,10))
+    self.L = np.random.normal(0.0,1.0,(8,10))
+    self.d = np.random.normal(0.0,1.0,40)
+
+  def test_normal_nnls(self):
+    A = np.random.normal(0.0,1.0,(30,10))
+    b = np.random.normal(0.0,1.0,30)
+    soln1 = slippy.inversion.normal_nnls(A.T.dot(A),A.T.dot(b))
+    soln2 = slippy.inversion.reg_nnls(A,np.zeros((0,10)),0.0,b)
+    self.assertTrue(np.allclose(soln1,soln2,atol=1e-10))
+
+  def test_normal_nnls_singular(self):
+    # the normal equations are singular but the solution is unique 
+    # because the nonnegativity constraint is active
+    A = np.random.normal(0.0,1.0,(30,2))
+    A = np.hstack((A,-A[:,[0]]))
+    b = A[:,0] + A[:,1]
+    soln1 = slippy.inversion.normal_nnls(A.T.dot(A),A.T.dot(b))
+    self.assertTrue(np.allclose(A.dot(soln1),b,atol=1e-8))
+
+  def test_reg_nnls_sweep(self):
+    penalties = [0.0,0.5,2.0]
+    solns = slippy.inversion.reg_nnls_sweep(self.G,self.L,0.1,self.d,penalties)
+    for p,soln1 in zip(penalties,solns):
+      soln2 = slippy.inversion.reg_nnls(self.G,p*self.L,0.1,self.d)
+      self.assertTrue(np.allclose(soln1,soln2,atol=1e-10))
+
+  def test_get_sweep_filename(self):
+    out = slippy.inversion.get_sweep_filename('out/predicted_slip.txt',10.0)
+    self.assertTrue(out == 'out/predicted_slip_penalty10.txt')
+
+  def test_reg_nnls_normal(self):
+    soln1 = slippy.inversion.reg_nnls(self.G,self.L,0.1,self.d)
+    soln2 = slippy.inversion.reg_nnls(self.G,self.L,0.1,self.d,solver='normal')
+    self.assertTrue(np.allclose(soln1,soln2,atol=1e-10))
+
+  def test_reg_nnls_sparse(self):
+    Ls = scipy.sparse.csr_matrix(self.L)
+    for solver in ['stacked','normal']:
+      soln1 = slippy.inversion.reg_nnls(self.G,self.L,0.1,self.d,solver=solver)
+      soln2 = slippy.inversion.reg_nnls(self.G,Ls,0.1,self.d,solver=solver)
+      self.assertTrue(np.allclose(soln1,soln2,atol=1e-12))
+
+
+  def test_reg_nnls_float32(self):
+    # the normal equations are accumulated in double precision
+    G32 = self.G.astype(np.float32)
+    soln1 = slippy.inversion.reg_nnls(G32.astype(float),self.L,0.1,self.d,
+                                      solver='normal')
+    soln2 = slippy.inversion.reg_nnls(G32,self.L,0.1,self.d,solver='normal')
+    self.assertTrue(np.allclose(soln1,soln2,atol=1e-10))
+    pred1 = G32.astype(float).dot(soln1)
+    pred2 = slippy.inversion._matvec(G32,soln1)
+    self.assertTrue(pred2.dtype == np.float64)
+    self.assertTrue(np.allclose(pred1,pred2,atol=1e-12))
+
+  def test_reduce_rows(self):
+    # G has enough rows to be reduced in several blocks
+    G = np.random.normal(0.0,1.0,(250000,10))
+    d = np.random.normal(0.0,1.0,250000)
+    R,b = slippy.inversion._reduce_rows(G,d)
+    self.assertTrue(R.shape == (11,10))
+    diff = []
+    for i in range(3):
+      m = np.random.normal(0.0,1.0,10)
+      diff += [np.linalg.norm(G.dot(m) - d)**2 - np.linalg.norm(R.dot(m) - b)**2]
+
+    self.assertTrue(np.allclose(diff,diff[0],rtol=1e-8))
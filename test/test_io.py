@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+import slippy.io
+import numpy as np
+import unittest
+import tempfile
+import shutil
+import os
+import sys
+
+class Test(unittest.TestCase):
+  def setUp(self):
+    self.tmp_dir = tempfile.mkdtemp()
+    np.random.seed(7)
+    N = 25
+    self.pos = np.zeros((N,3))
+    self.pos[:,:2] = np.random.uniform(-1.0,1.0,(N,2))
+    self.disp = np.random.normal(0.0,1.0,N)
+    self.sigma = np.random.uniform(0.0,1.0,N)
+    self.basis = np.random.normal(0.0,1.0,(N,3))
+
+  def tearDown(self):
+    shutil.rmtree(self.tmp_dir)
+
+  def test_read_insar_data_chunks(self):
+    file_name = os.path.join(self.tmp_dir,'insar.txt')
+    slippy.io.write_insar_data(self.pos,self.disp,self.sigma,
+                               self.basis,file_name)
+    data = np.loadtxt(file_name,skiprows=1)
+    for chunk_size in [1,7,25,100]:
+      out = slippy.io.read_insar_data(file_name,chunk_size=chunk_size)
+      self.assertTrue(np.all(out[0][:,:2] == data[:,[0,1]]))
+      self.assertTrue(np.all(out[0][:,2] == 0.0))
+      self.assertTrue(np.all(out[1] == data[:,2]))
+      self.assertTrue(np.all(out[2] == data[:,3]))
+      self.assertTrue(np.all(out[3] == data[:,[4,5,6]]))
+
+  def test_read_insar_data_no_trailing_newline(self):
+    file_name = os.path.join(self.tmp_dir,'insar.txt')
+    with open(file_name,'w') as fout:
+      fout.write('# header\n')
+      fout.write('1.0 2.0 3.0 4.0 5.0 6.0 7.0\n')
+      fout.write('\n')
+      fout.write('8.0 9.0 10.0 11.0 12.0 13.0 14.0')
+
+    out = slippy.io.read_insar_data(file_name)
+    self.assertTrue(out[0].shape == (2,3))
+    self.assertTrue(np.all(out[1] == [3.0,10.0]))
+
+  def test_read_insar_data_empty(self):
+    file_name = os.path.join(self.tmp_dir,'insar.txt')
+    with open(file_name,'w') as fout:
+      fout.write('# header\n')
+
+    out = slippy.io.read_insar_data(file_name)
+    self.assertTrue(out[0].shape == (0,3))
+    self.assertTrue(out[3].shape == (0,3))
+
+
+  def test_binary_insar_round_trip(self):
+    file_name = os.path.join(self.tmp_dir,'insar.npz')
+    slippy.io.write_insar_data(self.pos,self.disp,self.sigma,
+                               self.basis,file_name)
+    out = slippy.io.read_insar_data(file_name)
+    # the binary format has no loss of precision
+    self.assertTrue(np.all(out[0] == self.pos))
+    self.assertTrue(np.all(out[1] == self.disp))
+    self.assertTrue(np.all(out[2] == self.sigma))
+    self.assertTrue(np.all(out[3] == self.basis))
+
+  def test_binary_gps_round_trip(self):
+    file_name = os.path.join(self.tmp_dir,'gps.npz')
+    disp = np.random.normal(0.0,1.0,(len(self.pos),3))
+    sigma = np.random.uniform(0.0,1.0,(len(self.pos),3))
+    slippy.io.write_gps_data(self.pos,disp,sigma,file_name)
+    out = slippy.io.read_gps_data(file_name)
+    self.assertTrue(np.all(out[0] == self.pos))
+    self.assertTrue(np.all(out[1] == disp))
+    self.assertTrue(np.all(out[2] == sigma))
+
+  def test_binary_slip_round_trip(self):
+    file_name = os.path.join(self.tmp_dir,'slip.npz')
+    N = len(self.pos)
+    pos = np.random.normal(0.0,1.0,(N,3))
+    strike,dip,length,width = np.random.uniform(0.0,1.0,(4,N))
+    slip = np.random.normal(0.0,1.0,(N,3))
+    names = np.arange(N) % 3
+    slippy.io.write_slip_data(pos,strike,dip,length,width,slip,names,
+                              file_name)
+    out = slippy.io.read_slip_data(file_name)
+    for a,b in zip(out,(pos,strike,dip,length,width,slip,names)):
+      self.assertTrue(np.all(a == b))
+
+    self.assertTrue(out[6].dtype.kind == 'i')
+    with np.load(file_name) as data:
+      self.assertTrue(str(data['__file_type__']) == 'slip')
+      self.assertTrue(data['__units__'][0] == 'degrees')
+
+  def test_binary_wrong_file_type(self):
+    file_name = os.path.join(self.tmp_dir,'insar.npz')
+    slippy.io.write_insar_data(self.pos,self.disp,self.sigma,
+                               self.basis,file_name)
+    self.assertRaises(ValueError,slippy.io.read_gps_data,file_name)
+
+  def test_convert_data_file(self):
+    text_file = os.path.join(self.tmp_dir,'insar.txt')
+    binary_file = os.path.join(self.tmp_dir,'insar.npz')
+    slippy.io.write_insar_data(self.pos,self.disp,self.sigma,
+                               self.basis,text_file)
+    slippy.io.convert_data_file(text_file,binary_file,'leveling')
+    text_out = slippy.io.read_insar_data(text_file)
+    binary_out = slippy.io.read_insar_data(binary_file)
+    for a,b in zip(text_out,binary_out):
+      self.assertTrue(np.all(a == b))
+
+  def test_is_binary(self):
+    self.assertTrue(slippy.io.is_binary('data.npz'))
+    self.assertFalse(slippy.io.is_binary('data.txt'))
+    self.assertFalse(slippy.io.is_binary(sys.stdout))
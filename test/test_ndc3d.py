@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+import slippy.ndc3d
+import slippy.cdc3d
+import slippy.okada
+import numpy as np
+import unittest
+
+class Test(unittest.TestCase):
+  def setUp(self):
+    np.random.seed(1)
+    self.pos = np.random.uniform(-10.0,10.0,(200,3))
+    self.pos[:,2] = -np.abs(self.pos[:,2])
+    # points on the surface and above the edges of the dislocation
+    self.pos[:10,2] = 0.0
+    self.pos[10] = [-2.5,0.0,0.0]
+    self.pos[11] = [2.5,-2.0,0.0]
+    self.alpha = 2.0/3.0
+    self.c = 3.0
+    self.strike_width = np.array([-2.5,2.5])
+    self.dip_width = np.array([-4.0,0.0])
+
+  def test_dc3d_batch(self):
+    N = len(self.pos)
+    for dip in [0.0,30.0,60.0,89.9,90.0]:
+      for slip in [[1.0,0.5,0.25],[0.0,1.0,0.0],[0.0,0.0,-1.0]]:
+        slip = np.array(slip)
+        disp1,derr1 = np.zeros((N,3)),np.zeros((N,3,3))
+        disp2,derr2 = np.zeros((N,3)),np.zeros((N,3,3))
+        slippy.cdc3d.dc3d_batch(self.alpha,self.pos,self.c,dip,
+                                self.strike_width,self.dip_width,
+                                slip,disp1,derr1)
+        slippy.ndc3d.dc3d_batch(self.alpha,self.pos,self.c,dip,
+                                self.strike_width,self.dip_width,
+                                slip,disp2,derr2)
+        self.assertTrue(np.allclose(disp1,disp2,rtol=0.0,atol=1e-10))
+        self.assertTrue(np.allclose(derr1,derr2,rtol=0.0,atol=1e-10))
+
+  def test_dc3d(self):
+    slip = np.array([1.0,0.5,0.25])
+    out1 = slippy.cdc3d.dc3d(self.alpha,self.pos[20],self.c,60.0,
+                             self.strike_width,self.dip_width,slip)
+    out2 = slippy.ndc3d.dc3d(self.alpha,self.pos[20],self.c,60.0,
+                             self.strike_width,self.dip_width,slip)
+    self.assertEqual(out2[0],0)
+    self.assertTrue(np.allclose(out1[1],out2[1],rtol=0.0,atol=1e-10))
+    self.assertTrue(np.allclose(out1[2],out2[2],rtol=0.0,atol=1e-10))
+    out3 = slippy.ndc3d.dc3d(self.alpha,self.pos[20],self.c,60.0,
+                             self.strike_width,self.dip_width,slip,
+                             want_gradients=False)
+    self.assertTrue(np.all(out3[1] == out2[1]))
+    self.assertTrue(out3[2] is None)
+
+  def test_okada92_unit_slip(self):
+    disp,derr = slippy.ndc3d.okada92(self.alpha,self.pos,self.c,60.0,
+                                     self.strike_width,self.dip_width)
+    self.assertEqual(disp.shape,(len(self.pos),3,3))
+    self.assertEqual(derr.shape,(len(self.pos),3,3,3))
+    for j in range(3):
+      slip = np.zeros(3)
+      slip[j] = 1.0
+      disp_j,derr_j = slippy.ndc3d.okada92(self.alpha,self.pos,self.c,
+                                           60.0,self.strike_width,
+                                           self.dip_width,slip)
+      self.assertTrue(np.allclose(disp[...,j],disp_j,rtol=0.0,atol=1e-12))
+      self.assertTrue(np.allclose(derr[...,j],derr_j,rtol=0.0,atol=1e-12))
+
+  def test_okada92_broadcast(self):
+    # evaluate every point for each of three dislocations at once
+    c = np.array([1.0,3.0,5.0])
+    dip = np.array([20.0,60.0,90.0])
+    strike_width = np.array([[-1.0,1.0],[-2.5,2.5],[0.0,4.0]])
+    dip_width = np.array([[-2.0,0.0],[-4.0,0.0],[-3.0,-1.0]])
+    slip = np.array([1.0,-0.5,0.25])
+    disp,derr = slippy.ndc3d.okada92(self.alpha,self.pos[:,None,:],c,dip,
+                                     strike_width,dip_width,slip,
+                                     chunk_size=64)
+    self.assertEqual(disp.shape,(len(self.pos),3,3))
+    for m in range(3):
+      disp_m,derr_m = slippy.ndc3d.okada92(self.alpha,self.pos,c[m],
+                                           dip[m],strike_width[m],
+                                           dip_width[m],slip)
+      self.assertTrue(np.allclose(disp[:,m],disp_m,rtol=0.0,atol=1e-12))
+      self.assertTrue(np.allclose(derr[:,m],derr_m,rtol=0.0,atol=1e-12))
+
+  def test_unit_slip_dislocations(self):
+    pos = np.copy(self.pos)
+    top_center = np.array([[0.0,0.0,-1.0],[2.0,1.0,-2.0]])
+    length = np.array([5.0,3.0])
+    width = np.array([3.0,2.0])
+    strike = np.array([30.0,100.0])
+    dip = np.array([60.0,90.0])
+    out1 = slippy.okada.unit_slip_dislocations(
+             pos,top_center,length,width,strike,dip,
+             backend=slippy.okada.load_backend('cython'))
+    out2 = slippy.okada.unit_slip_dislocations(
+             pos,top_center,length,width,strike,dip,
+             backend=slippy.okada.load_backend('numpy'))
+
+    self.assertEqual(out2.shape,(len(pos),2,3,3))
+    self.assertTrue(np.allclose(out1,out2,rtol=0.0,atol=1e-10))
+
+  def test_point_source(self):
+    # a small dislocation with unit area is a point source with unit 
+    # potency
+    h = 0.01
+    pos = np.copy(self.pos)
+    for dip in [30.0,90.0]:
+      sindel = np.sin(np.radians(dip))
+      cosdel = np.cos(np.radians(dip))
+      disp1 = slippy.ndc3d.point_source(self.alpha,pos,4.0,dip)
+      pos_rect = np.copy(pos)
+      pos_rect[:,1] -= 0.5*h*cosdel
+      disp2,derr2 = slippy.ndc3d.okada92(self.alpha,pos_rect,
+                                         4.0 - 0.5*h*sindel,dip,
+                                         [-0.5*h,0.5*h],[-h,0.0],
+                                         want_gradients=False)
+      disp2 /= h**2
+      self.assertEqual(disp1.shape,(len(pos),3,3))
+      self.assertTrue(np.allclose(disp1,disp2,rtol=0.0,
+                                  atol=1e-5*np.max(np.abs(disp2))))
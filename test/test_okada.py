@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+import slippy.okada
+import slippy.cdc3d
+import numpy as np
+import tempfile
+import shutil
+import os
+import unittest
+
+class Test(unittest.TestCase):
+  def setUp(self):
+    np.random.seed(1)
+    self.pos = np.random.uniform(-10.0,10.0,(50,3))
+    self.pos[:,2] = -np.abs(self.pos[:,2])
+    self.alpha = 2.0/3.0
+    self.c = 3.0
+    self.dip = 60.0
+    self.strike_width = np.array([-2.5,2.5])
+    self.dip_width = np.array([-4.0,0.0])
+    self.slip = np.array([1.0,0.5,0.25])
+
+  def test_dc3d_batch(self):
+    N = len(self.pos)
+    disp = np.zeros((N,3))
+    derr = np.zeros((N,3,3))
+    slippy.cdc3d.dc3d_batch(self.alpha,self.pos,self.c,self.dip,
+                            self.strike_width,self.dip_width,
+                            self.slip,disp,derr)
+    for i,p in enumerate(self.pos):
+      out = slippy.cdc3d.dc3d(self.alpha,p,self.c,self.dip,
+                              self.strike_width,self.dip_width,
+                              self.slip)
+      self.assertTrue(np.all(disp[i] == out[1]))
+      self.assertTrue(np.all(derr[i] == out[2].T))
+
+  def test_dc3d_batch_no_derr(self):
+    N = len(self.pos)
+    disp1 = np.zeros((N,3))
+    disp2 = np.zeros((N,3))
+    derr = np.zeros((N,3,3))
+    slippy.cdc3d.dc3d_batch(self.alpha,self.pos,self.c,self.dip,
+                            self.strike_width,self.dip_width,
+                            self.slip,disp1)
+    slippy.cdc3d.dc3d_batch(self.alpha,self.pos,self.c,self.dip,
+                            self.strike_width,self.dip_width,
+                            self.slip,disp2,derr)
+    self.assertTrue(np.all(disp1 == disp2))
+
+  def test_dc3d_unit_batch(self):
+    N = len(self.pos)
+    out = np.zeros((N,3,3))
+    slippy.cdc3d.dc3d_unit_batch(self.alpha,self.pos,self.c,self.dip,
+                                 self.strike_width,self.dip_width,out)
+    for j in range(3):
+      slip = np.zeros(3)
+      slip[j] = 1.0
+      disp = np.zeros((N,3))
+      slippy.cdc3d.dc3d_batch(self.alpha,self.pos,self.c,self.dip,
+                              self.strike_width,self.dip_width,
+                              slip,disp)
+      self.assertTrue(np.all(out[:,:,j] == disp))
+
+  def test_unit_slip_dislocations(self):
+    cython = slippy.okada.load_backend('cython')
+    numpy = slippy.okada.load_backend('numpy')
+    top_center = np.array([[0.0,0.0,-1.0],[2.0,1.0,-3.0]])
+    out1 = slippy.okada.unit_slip_dislocations(self.pos,top_center,
+                                               [5.0,4.0],[3.0,2.0],
+                                               [30.0,80.0],[60.0,20.0],
+                                               backend=cython)
+    out2 = slippy.okada.unit_slip_dislocations(self.pos,top_center,
+                                               [5.0,4.0],[3.0,2.0],
+                                               [30.0,80.0],[60.0,20.0],
+                                               backend=numpy)
+    self.assertEqual(out1.shape,(len(self.pos),2,3,3))
+    self.assertTrue(np.allclose(out1,out2,rtol=0.0,atol=1e-10))
+
+  def test_dislocation_integer_slip(self):
+    disp1,derr1 = slippy.okada.dislocation(self.pos,[1,0,0],
+                                           [0.0,0.0,-1.0],
+                                           5.0,3.0,30.0,60.0)
+    disp2,derr2 = slippy.okada.dislocation(self.pos,[1.0,0.0,0.0],
+                                           [0.0,0.0,-1.0],
+                                           5.0,3.0,30.0,60.0)
+    self.assertTrue(np.all(np.isclose(disp1,disp2)))
+    self.assertTrue(np.all(np.isclose(derr1,derr2)))
+
+  def test_dc3d_no_gradients(self):
+    out1 = slippy.cdc3d.dc3d(self.alpha,self.pos[0],self.c,self.dip,
+                             self.strike_width,self.dip_width,
+                             self.slip)
+    out2 = slippy.cdc3d.dc3d(self.alpha,self.pos[0],self.c,self.dip,
+                             self.strike_width,self.dip_width,
+                             self.slip,False)
+    self.assertTrue(np.all(out1[1] == out2[1]))
+    self.assertTrue(out2[2] is None)
+
+  def test_dislocation_no_gradients(self):
+    disp1,derr1 = slippy.okada.dislocation(self.pos,self.slip,
+                                           [1.0,2.0,-1.0],
+                                           5.0,3.0,30.0,60.0)
+    disp2,derr2 = slippy.okada.dislocation(self.pos,self.slip,
+                                           [1.0,2.0,-1.0],
+                                           5.0,3.0,30.0,60.0,
+                                           want_gradients=False)
+    self.assertTrue(np.all(disp1 == disp2))
+    self.assertTrue(derr2 is None)
+
+
+  def test_load_backend(self):
+    backend = slippy.okada.load_backend('numpy')
+    self.assertEqual(backend.name,'numpy')
+    self.assertTrue(backend.vectorized)
+    self.assertRaises(ValueError,slippy.okada.load_backend,'abc')
+    self.assertTrue('numpy' in slippy.okada.available_backends())
+    self.assertTrue('cython' in slippy.okada.available_backends())
+
+  def test_fortran_backend(self):
+    # fortran is registered whenever the f2py extension is importable
+    try:
+      import slippy.dc3d
+    except ImportError:
+      self.skipTest('the fortran extension is not built')
+
+    self.assertTrue('fortran' in slippy.okada.available_backends())
+    backend = slippy.okada.load_backend('fortran')
+    out1 = slippy.okada.dislocation(self.pos,self.slip,[0.0,0.0,-1.0],
+                                    5.0,3.0,30.0,60.0,backend=backend)
+    out2 = slippy.okada.dislocation(self.pos,self.slip,[0.0,0.0,-1.0],
+                                    5.0,3.0,30.0,60.0,
+                                    backend=slippy.okada.load_backend('cython'))
+    # DC3D is single precision
+    self.assertTrue(np.allclose(out1[0],out2[0],rtol=0.0,atol=1e-6))
+
+  def test_set_backend(self):
+    backend = slippy.okada.get_backend()
+    environ = dict(os.environ)
+    try:
+      self.assertEqual(slippy.okada.set_backend('numpy').name,'numpy')
+      self.assertEqual(slippy.okada.get_backend().name,'numpy')
+      os.environ['SLIPPY_OKADA_BACKEND'] = 'numpy'
+      self.assertEqual(slippy.okada.set_backend().name,'numpy')
+      os.environ['SLIPPY_OKADA_BACKEND'] = 'cython'
+      self.assertEqual(slippy.okada.set_backend('auto').name,'cython')
+      # the choice of slippy_bench_kernel is used when nothing else is
+      # given
+      del os.environ['SLIPPY_OKADA_BACKEND']
+      os.environ['XDG_CACHE_HOME'] = tempfile.mkdtemp()
+      self.assertEqual(slippy.okada.load_backend_choice(),None)
+      self.assertEqual(slippy.okada.set_backend().name,
+                       slippy.okada.available_backends()[0])
+      slippy.okada.save_backend_choice('numpy')
+      self.assertEqual(slippy.okada.load_backend_choice(),'numpy')
+      self.assertEqual(slippy.okada.set_backend().name,'numpy')
+      shutil.rmtree(os.environ['XDG_CACHE_HOME'])
+    finally:
+      os.environ.clear()
+      os.environ.update(environ)
+      slippy.okada.set_backend(backend.name)
+
+  def test_dislocation_backends(self):
+    out1 = slippy.okada.dislocation(self.pos,self.slip,[0.0,0.0,-1.0],
+                                    5.0,3.0,30.0,60.0,
+                                    backend=slippy.okada.load_backend('cython'))
+    out2 = slippy.okada.dislocation(self.pos,self.slip,[0.0,0.0,-1.0],
+                                    5.0,3.0,30.0,60.0,
+                                    backend=slippy.okada.load_backend('numpy'))
+    self.assertTrue(np.allclose(out1[0],out2[0],rtol=0.0,atol=1e-10))
+    self.assertTrue(np.allclose(out1[1],out2[1],rtol=0.0,atol=1e-10))
+
+  def test_benchmark_backends(self):
+    results = slippy.okada.benchmark_backends(['cython','numpy'],points=20,
+                                              patches=3,repeats=1)
+    self.assertEqual(list(results),['cython','numpy'])
+    self.assertEqual(results['cython']['max_error'],0.0)
+    self.assertTrue(results['numpy']['accurate'])
+    # the reference is used even when it is not benchmarked
+    results = slippy.okada.benchmark_backends(['numpy'],points=20,
+                                              patches=3,repeats=1,
+                                              reference='cython')
+    self.assertEqual(list(results),['numpy'])
+    self.assertTrue(results['numpy']['accurate'])
+
+  def test_unit_slip_point_sources(self):
+    x = np.zeros((200,3))
+    x[:,:2] = np.random.uniform(-100.0,100.0,(200,2))
+    top_center = np.array([[0.0,0.0,-1.0],[2.0,1.0,-3.0]])
+    args = (top_center,[5.0,4.0],[3.0,2.0],[30.0,80.0],[60.0,20.0])
+    out1 = slippy.okada.unit_slip_dislocations(x,*args)
+    out2 = slippy.okada.unit_slip_point_sources(x,*args)
+    error = slippy.okada.point_source_error(x,*args)
+    norm = np.linalg.norm((out1 - out2).reshape((200,2,9)),axis=2)
+    norm /= np.linalg.norm(out1.reshape((200,2,9)),axis=2)
+    self.assertTrue(np.all(norm <= error))
+    # the error is not estimated below the surface
+    x[0,2] = -1.0
+    error = slippy.okada.point_source_error(x,*args)
+    self.assertTrue(np.all(np.isinf(error[0])))
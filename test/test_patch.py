@@ -24,3 +24,57 @@ class Test(unittest.TestCase):
                                   [0.0,0.0,0.0]])
     self.assertTrue(np.all(np.isclose(corners_data,true_corners_data)))
 
+
+  def test_patch_set(self):
+    np.random.seed(1)
+    M = 5
+    pos = np.random.uniform(-10.0,10.0,(M,3))
+    pos[:,2] = -np.random.uniform(5.0,10.0,M)
+    length = np.random.uniform(1.0,4.0,M)
+    width = np.random.uniform(1.0,4.0,M)
+    strike = np.random.uniform(0.0,360.0,M)
+    dip = np.random.uniform(10.0,90.0,M)
+    P = slippy.patch.PatchSet(pos,length,width,strike,dip)
+    patches = [slippy.patch.Patch(*a) for a in zip(pos,length,width,strike,dip)]
+    x = np.random.uniform(0.0,1.0,(7,3))
+    y = np.random.uniform(-10.0,10.0,(7,3))
+    self.assertTrue(len(P) == M)
+    for i,p in enumerate(patches):
+      self.assertTrue(np.allclose(P.patch_to_user(x)[i],p.patch_to_user(x)))
+      self.assertTrue(np.allclose(P.user_to_patch(y)[i],p.user_to_patch(y)))
+      self.assertTrue(np.allclose(P.corners()[i],p.get_3d_polygon()))
+      self.assertTrue(np.allclose(P.polygons()[i],p.get_polygon().get_xy()))
+      self.assertTrue(np.allclose(P.top_centers()[i],
+                                  p.patch_to_user([0.5,1.0,0.0])))
+      self.assertTrue(np.allclose(P[i].patch_to_user(x),p.patch_to_user(x)))
+
+    self.assertTrue(np.allclose(
+      P.centroids(),np.mean(P.corners(),axis=1)))
+
+  def test_patch_set_discretize(self):
+    seg = slippy.patch.Patch([1.0,2.0,-1.0],10.0,5.0,30.0,60.0)
+    P = slippy.patch.PatchSet([seg.pos],[seg.length],[seg.width],
+                              [seg.strike],[seg.dip]).discretize(4,3)
+    sub_patches = seg.discretize(4,3)
+    self.assertTrue(len(P) == len(sub_patches))
+    for i,p in enumerate(sub_patches):
+      self.assertTrue(np.allclose(P.corners()[i],p.get_3d_polygon()))
+      self.assertTrue(np.isclose(P.length[i],p.length))
+      self.assertTrue(np.isclose(P.width[i],p.width))
+
+    Q = slippy.patch.PatchSet.from_patches(sub_patches)
+    self.assertTrue(np.allclose(P.geometry(),Q.geometry()))
+    R = slippy.patch.PatchSet.concatenate([P[:5],P[5:]])
+    self.assertTrue(np.allclose(P.geometry(),R.geometry()))
+    self.assertTrue(np.allclose(P[np.arange(12).repeat(2)].geometry(),
+                                P.geometry().repeat(2,axis=0)))
+
+  def test_shallow_edges(self):
+    seg = slippy.patch.Patch([0.0,0.0,0.0],10.0,5.0,90.0,45.0)
+    sub_patches = seg.discretize(4,3)
+    P = slippy.patch.PatchSet.from_patches(sub_patches)
+    fault_nums = np.zeros(len(P))
+    edges = slippy.patch.get_shallow_edges(P,fault_nums)
+    self.assertTrue(np.allclose(edges,[[[-5.0,0.0],[5.0,0.0]]]))
+    self.assertTrue(np.allclose(
+      edges,slippy.patch.get_shallow_edges(sub_patches,fault_nums)))
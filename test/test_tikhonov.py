@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+import slippy.tikhonov
+import numpy as np
+import scipy.sparse
+import unittest
+
+def loop_tikhonov_matrix(C,order,column_no):
+  ''' 
+  reference implementation which loops over the elements of C
+  '''
+  C = np.asarray(C)
+  if order == 0:
+    L = np.zeros((column_no,column_no))
+    for val in C.flat:
+      if val != -1:
+        L[val,val] = 1
+
+  if order == 1:
+    L = np.zeros((C.ndim*column_no,column_no))
+    Lrow = 0
+    for neighbors,i in slippy.tikhonov.ForwardNeighbors(C):
+      if i == -1:
+        continue
+      for k in neighbors:
+        if k == -1:
+          continue
+        L[Lrow,i] += -1
+        L[Lrow,k] += 1
+        Lrow += 1
+
+  if order == 2:
+    L = np.zeros((column_no,column_no))
+    for nbrs,i in slippy.tikhonov.Neighbors(C):
+      if i == -1:
+        continue
+      denom = len([n for n in nbrs if n != -1])
+      for k in nbrs:
+        if k == -1:
+          continue
+        L[i,i] += -1.0/denom
+        L[i,k] += 1.0/denom
+
+  return L[np.any(L != 0,axis=1)]
+
+
+def random_connectivity(shape):
+  ''' 
+  returns a connectivity matrix with shuffled values and broken 
+  connections
+  '''
+  size = int(np.prod(shape))
+  C = np.random.permutation(size)
+  C[np.random.uniform(0.0,1.0,size) < 0.2] = -1
+  return C.reshape(shape)
+
+
+class Test(unittest.TestCase):
+  def test_docstring_example(self):
+    L = slippy.tikhonov.tikhonov_matrix([[0,1],[2,3]],1)
+    soln = np.array([[-1.0, 0.0, 1.0, 0.0],
+                     [-1.0, 1.0, 0.0, 0.0],
+                     [ 0.0,-1.0, 0.0, 1.0],
+                     [ 0.0, 0.0,-1.0, 1.0]])
+    self.assertTrue(np.all(L == soln))
+
+  def test_against_loop(self):
+    np.random.seed(5)
+    for shape in [(7,),(4,5),(3,4,2)]:
+      C = random_connectivity(shape)
+      column_no = int(np.prod(shape)) + 2
+      for order in [0,1,2]:
+        L1 = slippy.tikhonov.tikhonov_matrix(C,order,column_no=column_no)
+        L2 = loop_tikhonov_matrix(C,order,column_no)
+        self.assertTrue(L1.shape == L2.shape)
+        self.assertTrue(np.allclose(L1,L2,rtol=0.0,atol=1e-15))
+
+  def test_sparse(self):
+    np.random.seed(6)
+    C = random_connectivity((6,4))
+    for order in [0,1,2]:
+      L1 = slippy.tikhonov.tikhonov_matrix(C,order,sparse=True)
+      L2 = slippy.tikhonov.tikhonov_matrix(C,order)
+      self.assertTrue(scipy.sparse.isspmatrix_csr(L1))
+      self.assertTrue(np.all(L1.toarray() == L2))
+
+  def test_empty(self):
+    L = slippy.tikhonov.tikhonov_matrix([[-1,-1]],2,column_no=3)
+    self.assertTrue(L.shape == (0,3))
+
+  def test_remove_zero_rows(self):
+    M = np.array([[0.0,0.0],
+                  [1.0,0.0],
+                  [0.0,0.0],
+                  [0.0,-2.0]])
+    soln = np.array([[1.0,0.0],
+                     [0.0,-2.0]])
+    out1 = slippy.tikhonov.remove_zero_rows(M)
+    self.assertTrue(np.all(out1 == soln))
+    # the explicitly stored zero in the third row should be removed
+    Ms = scipy.sparse.csr_matrix(([1.0,0.0,-2.0],([1,2,3],[0,0,1])),
+                                 shape=(4,2))
+    self.assertTrue(Ms.nnz == 3)
+    out2 = slippy.tikhonov.remove_zero_rows(Ms)
+    self.assertTrue(scipy.sparse.isspmatrix_csr(out2))
+    self.assertTrue(np.all(out2.toarray() == soln))
+
+  def test_remove_zero_rows_empty(self):
+    out = slippy.tikhonov.remove_zero_rows(np.zeros((3,2)))
+    self.assertTrue(out.shape == (0,2))
+
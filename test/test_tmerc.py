@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+import slippy.tmerc
+import slippy.xyz2geo
+import numpy as np
+import unittest
+
+class Test(unittest.TestCase):
+  def setUp(self):
+    np.random.seed(2)
+    self.lons = np.random.uniform(-100.0,-70.0,10000)
+    self.lats = np.random.uniform(20.0,60.0,10000)
+    self.bm = slippy.tmerc.create_default_basemap(self.lons,self.lats)
+
+  def test_round_trip(self):
+    x,y = slippy.tmerc.geo2xyz(self.lons,self.lats,self.bm.lon_0,
+                               self.bm.lat_0)
+    lons,lats = slippy.tmerc.xyz2geo(x,y,self.bm.lon_0,self.bm.lat_0)
+    self.assertTrue(np.allclose(lons,self.lons,rtol=0.0,atol=1e-11))
+    self.assertTrue(np.allclose(lats,self.lats,rtol=0.0,atol=1e-11))
+
+  def test_round_trip_cartesian(self):
+    # points within 3000 km of the origin
+    pos_cart = np.random.uniform(-3e6,3e6,(100,20,3))
+    pos_geo = slippy.tmerc.cartesian_to_geodetic(pos_cart,self.bm)
+    out = slippy.tmerc.geodetic_to_cartesian(pos_geo,self.bm)
+    self.assertTrue(out.shape == (100,20,3))
+    self.assertTrue(np.allclose(out,pos_cart,rtol=0.0,atol=1e-6))
+    self.assertTrue(np.all(out[...,2] == pos_cart[...,2]))
+
+  def test_origin(self):
+    x,y = slippy.tmerc.geo2xyz(self.bm.lon_0,self.bm.lat_0,
+                               self.bm.lon_0,self.bm.lat_0)
+    self.assertTrue(np.isclose(x,0.0,atol=1e-9))
+    self.assertTrue(np.isclose(y,0.0,atol=1e-9))
+
+  def test_meridian_arc(self):
+    # distance from the equator to 45 degrees north on the WGS84
+    # ellipsoid
+    x,y = slippy.tmerc.geo2xyz(10.0,45.0,10.0,0.0)
+    self.assertTrue(np.isclose(x,0.0,atol=1e-9))
+    self.assertTrue(np.isclose(y,4984944.378,atol=1e-3))
+
+  def test_local_scale(self):
+    # the scale factor is one along the central meridian, so a small
+    # step in longitude is the radius of the parallel times the angle
+    a = slippy.tmerc.SEMI_MAJOR_AXIS
+    e2 = slippy.tmerc._e2
+    lat = 37.0
+    N = a/np.sqrt(1.0 - e2*np.sin(np.deg2rad(lat))**2)
+    dlon = 1e-4
+    x,y = slippy.tmerc.geo2xyz(dlon,lat,0.0,lat)
+    self.assertTrue(np.isclose(x,N*np.cos(np.deg2rad(lat))*np.deg2rad(dlon),
+                               rtol=1e-8))
+
+  def test_flat_earth_agreement(self):
+    # the flat earth approximation is close near the origin
+    lons = self.bm.lon_0 + np.random.uniform(-0.1,0.1,100)
+    lats = self.bm.lat_0 + np.random.uniform(-0.1,0.1,100)
+    x1,y1 = slippy.tmerc.geo2xyz(lons,lats,self.bm.lon_0,self.bm.lat_0)
+    x2,y2 = slippy.xyz2geo.geo2xyz(lons,lats,self.bm.lon_0,self.bm.lat_0)
+    self.assertTrue(np.allclose(x1,x2,rtol=1e-2))
+    self.assertTrue(np.allclose(y1,y2,rtol=1e-2))
+
+  def test_longitude_wrapping(self):
+    x1,y1 = slippy.tmerc.geo2xyz(179.5,10.0,-179.5,10.0)
+    x2,y2 = slippy.tmerc.geo2xyz(-1.0,10.0,0.0,10.0)
+    self.assertTrue(np.isclose(x1,x2))
+    self.assertTrue(np.isclose(y1,y2))
@@ -47,3 +47,42 @@ class Test(unittest.TestCase):
     soln = np.array([0.0,1.0,0.0]) 
     self.assertTrue(np.all(np.isclose(T(point),soln)))
 
+
+  def test_stack(self):
+    np.random.seed(1)
+    K = 6
+    angle = np.random.uniform(0.0,2*np.pi,K)
+    trans = np.random.normal(0.0,1.0,(K,3))
+    stretch = np.random.uniform(1.0,2.0,(K,3))
+    T  = slippy.transform.point_stretch(stretch)
+    T += slippy.transform.point_rotation_x(angle)
+    T += slippy.transform.point_rotation_y(2*angle)
+    T += slippy.transform.point_rotation_z(3*angle)
+    T += slippy.transform.point_translation(trans)
+    self.assertTrue(isinstance(T,slippy.transform.TransformStack))
+    self.assertTrue(len(T) == K)
+    points = np.random.normal(0.0,1.0,(K,5,2,3))
+    out = T(points)
+    inv = T.inverse()(out)
+    shared = T(points[:1])
+    for k in range(K):
+      Tk  = slippy.transform.point_stretch(stretch[k])
+      Tk += slippy.transform.point_rotation_x(angle[k])
+      Tk += slippy.transform.point_rotation_y(2*angle[k])
+      Tk += slippy.transform.point_rotation_z(3*angle[k])
+      Tk += slippy.transform.point_translation(trans[k])
+      self.assertTrue(np.allclose(T[k].get_M(),Tk.get_M()))
+      self.assertTrue(np.allclose(out[k],Tk(points[k])))
+      self.assertTrue(np.allclose(shared[k],Tk(points[0])))
+      self.assertTrue(np.allclose(inv[k],points[k]))
+
+  def test_stack_identity(self):
+    angle = np.linspace(0.0,2*np.pi,5)
+    T  = slippy.transform.point_rotation_z(angle)
+    T += slippy.transform.point_translation([1.0,2.0,3.0])
+    T += slippy.transform.basis_translation([1.0,2.0,3.0])
+    T += slippy.transform.basis_rotation_z(angle)
+    self.assertTrue(np.allclose(T.get_M(),np.eye(4)))
+    T = slippy.transform.concatenate([T,slippy.transform.identity()])
+    self.assertTrue(T.get_M().shape == (6,4,4))
+    self.assertRaises(ValueError,slippy.transform.TransformStack,np.eye(4))
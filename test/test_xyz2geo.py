@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+import slippy.xyz2geo
+import numpy as np
+import unittest
+
+def geo2xyz_loop(lons,lats,lon0,lat0):
+  # element-wise reference implementation
+  x_array = np.zeros(np.shape(lons))
+  y_array = np.zeros(np.shape(lats))
+  for i in range(len(lons)):
+    x_array[i] = (lons[i]-lon0)*111000.0*(np.cos(np.deg2rad(lat0)))
+    y_array[i] = (lats[i]-lat0)*111000.0
+
+  return x_array,y_array
+
+def xyz2geo_loop(x,y,lon0,lat0):
+  lon_array = np.zeros(np.shape(x))
+  lat_array = np.zeros(np.shape(y))
+  for i in range(len(x)):
+    lon_array[i] = lon0 + (x[i]/(111000.0*np.cos(np.deg2rad(lat0))))
+    lat_array[i] = lat0 + (y[i]/111000.0)
+
+  return lon_array,lat_array
+
+class Test(unittest.TestCase):
+  def setUp(self):
+    np.random.seed(5)
+    self.lons = np.random.uniform(-90.0,-80.0,1000)
+    self.lats = np.random.uniform(35.0,45.0,1000)
+    self.bm = slippy.xyz2geo.create_default_basemap(self.lons,self.lats)
+
+  def test_geo2xyz_matches_loop(self):
+    x1,y1 = slippy.xyz2geo.geo2xyz(self.lons,self.lats,-85.0,40.0)
+    x2,y2 = geo2xyz_loop(self.lons,self.lats,-85.0,40.0)
+    self.assertTrue(np.all(x1 == x2))
+    self.assertTrue(np.all(y1 == y2))
+
+  def test_xyz2geo_matches_loop(self):
+    x = np.random.normal(0.0,1e5,1000)
+    y = np.random.normal(0.0,1e5,1000)
+    lon1,lat1 = slippy.xyz2geo.xyz2geo(x,y,-85.0,40.0)
+    lon2,lat2 = xyz2geo_loop(x,y,-85.0,40.0)
+    self.assertTrue(np.all(lon1 == lon2))
+    self.assertTrue(np.all(lat1 == lat2))
+
+  def test_scalar(self):
+    x,y = slippy.xyz2geo.geo2xyz(-84.0,41.0,-85.0,40.0)
+    self.assertTrue(np.shape(x) == ())
+    lon,lat = slippy.xyz2geo.xyz2geo(x,y,-85.0,40.0)
+    self.assertTrue(np.isclose(lon,-84.0))
+    self.assertTrue(np.isclose(lat,41.0))
+
+  def test_broadcast(self):
+    pos_geo = np.zeros((10,20,3))
+    pos_geo[...,0] = self.lons[:200].reshape((10,20))
+    pos_geo[...,1] = self.lats[:200].reshape((10,20))
+    pos_geo[...,2] = 1.0
+    pos_cart = slippy.xyz2geo.geodetic_to_cartesian(pos_geo,self.bm)
+    self.assertTrue(pos_cart.shape == (10,20,3))
+    x,y = geo2xyz_loop(self.lons[:200],self.lats[:200],
+                       self.bm.lon_0,self.bm.lat_0)
+    self.assertTrue(np.all(pos_cart[...,0].ravel() == x))
+    self.assertTrue(np.all(pos_cart[...,1].ravel() == y))
+    self.assertTrue(np.all(pos_cart[...,2] == 1.0))
+    out = slippy.xyz2geo.cartesian_to_geodetic(pos_cart,self.bm)
+    self.assertTrue(np.allclose(out,pos_geo,atol=1e-10))
+
+  def test_single_position(self):
+    pos_cart = slippy.xyz2geo.geodetic_to_cartesian([-84.0,41.0,0.0],
+                                                    self.bm)
+    self.assertTrue(pos_cart.shape == (3,))